@@ -0,0 +1,166 @@
+# asr_backends.py
+# Pluggable speech-to-text engines for voice_assistant.
+#
+#   whisper         openai-whisper, PyTorch fp32 on CPU (the original path)
+#   whisper-int8    same model with its Linear layers dynamically quantized to int8
+#   faster-whisper  CTranslate2 engine, int8 weights/compute on CPU
+#
+# Every backend takes an explicit intra-op thread count and a beam size
+# (1 = greedy) and exposes transcribe(audio) -> (text, lang) on a float32
+# 16 kHz array; transcribe_detailed(audio) also returns the engine's
+# language probabilities (en/hi/mr) for lang_id's tiebreak. Backends are
+# cached per process by their settings.
+
+import threading
+from abc import ABC, abstractmethod
+
+BACKENDS = ("whisper", "whisper-int8", "faster-whisper")
+PROB_LANGS = ("en", "hi", "mr")     # language probabilities kept for lang_id
+
+
+def set_torch_threads(threads):
+    """Pin PyTorch intra-op threads (and inter-op, if it is not too late to)."""
+    if not threads:
+        return
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass    # already set, or parallel work has started in this process
+
+
+class ASRBackend(ABC):
+    """
+    Base class of the engines; subclasses implement load() and
+    transcribe_detailed().
+    name: one of BACKENDS. model_size: tiny / base / small / medium ...
+    threads: intra-op CPU threads (None = library default).
+    beam_size: 1 = greedy decoding, >1 = beam search.
+    """
+    name = "base"
+
+    def __init__(self, model_size="tiny", threads=None, beam_size=1):
+        self.model_size = model_size
+        self.threads = threads
+        self.beam_size = max(1, int(beam_size or 1))
+        self.model = None
+
+    @abstractmethod
+    def load(self):
+        """Load the model into self.model; returns self."""
+
+    def transcribe(self, audio):
+        return self.transcribe_detailed(audio)[:2]
+
+    @abstractmethod
+    def transcribe_detailed(self, audio):
+        """(text, lang, {lang: probability} or None)."""
+
+    def describe(self):
+        decode = "greedy" if self.beam_size == 1 else f"beam={self.beam_size}"
+        return f"{self.name}:{self.model_size} ({decode}, threads={self.threads or 'default'})"
+
+
+class WhisperBackend(ASRBackend):
+    """openai-whisper on CPU; quantize=True applies int8 dynamic quantization."""
+    name = "whisper"
+
+    def __init__(self, model_size="tiny", threads=None, beam_size=1, quantize=False):
+        super().__init__(model_size, threads, beam_size)
+        self.quantize = quantize
+        if quantize:
+            self.name = "whisper-int8"
+
+    def load(self):
+        import whisper
+        set_torch_threads(self.threads)
+        model = whisper.load_model(self.model_size, device="cpu")
+        if self.quantize:
+            import torch
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        return self
+
+    def detect_language(self, audio):
+        """Whisper's language probabilities for the first 30 s of audio."""
+        import whisper
+        segment = whisper.pad_or_trim(audio)
+        n_mels = getattr(getattr(self.model, "dims", None), "n_mels", 80)
+        try:
+            mel = whisper.log_mel_spectrogram(segment, n_mels)
+        except TypeError:       # older openai-whisper: 80 mel bins only
+            mel = whisper.log_mel_spectrogram(segment)
+        _, probs = self.model.detect_language(mel)
+        return probs
+
+    def transcribe_detailed(self, audio):
+        options = {"fp16": False}
+        if self.beam_size > 1:
+            options["beam_size"] = self.beam_size
+        try:
+            probs = self.detect_language(audio)
+        except Exception as e:
+            print("[asr] Language detection failed:", e)
+            probs = None
+        if probs:
+            # the detection transcribe() would run itself; done once, here
+            options["language"] = max(probs, key=probs.get)
+        result = self.model.transcribe(audio, **options)
+        kept = {lang: float(probs.get(lang, 0.0)) for lang in PROB_LANGS} if probs else None
+        return result.get("text", "").strip(), result.get("language") or None, kept
+
+
+class FasterWhisperBackend(ASRBackend):
+    """faster-whisper (CTranslate2) with int8 compute on CPU."""
+    name = "faster-whisper"
+
+    def __init__(self, model_size="tiny", threads=None, beam_size=1, compute_type="int8"):
+        super().__init__(model_size, threads, beam_size)
+        self.compute_type = compute_type
+
+    def load(self):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(self.model_size, device="cpu", compute_type=self.compute_type,
+                                  cpu_threads=self.threads or 0, num_workers=1)
+        return self
+
+    def transcribe_detailed(self, audio):
+        segments, info = self.model.transcribe(audio, beam_size=self.beam_size)
+        text = "".join(s.text for s in segments).strip()   # generator: decoding happens here
+        lang = getattr(info, "language", None) or None
+        all_probs = dict(getattr(info, "all_language_probs", None) or ())
+        if not all_probs and lang:
+            all_probs = {lang: getattr(info, "language_probability", 1.0)}
+        kept = {l: float(all_probs.get(l, 0.0)) for l in PROB_LANGS} if all_probs else None
+        return text, lang, kept
+
+
+def make_backend(name="whisper", model_size="tiny", threads=None, beam_size=1):
+    """Unloaded backend instance for `name` (see BACKENDS)."""
+    if name == "whisper":
+        return WhisperBackend(model_size, threads, beam_size)
+    if name == "whisper-int8":
+        return WhisperBackend(model_size, threads, beam_size, quantize=True)
+    if name == "faster-whisper":
+        return FasterWhisperBackend(model_size, threads, beam_size)
+    raise ValueError(f"Unknown ASR backend {name!r} (choose from {', '.join(BACKENDS)})")
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name="whisper", model_size="tiny", threads=None, beam_size=1):
+    """Load a backend once per process (per settings) and reuse it."""
+    key = (name, model_size, threads, max(1, int(beam_size or 1)))
+    backend = _backends.get(key)
+    if backend is None:
+        with _backends_lock:   # concurrent first callers wait for one load
+            backend = _backends.get(key)
+            if backend is None:
+                backend = make_backend(name, model_size, threads, beam_size)
+                print("[asr] Loading", backend.describe())
+                backend.load()
+                _backends[key] = backend
+    return backend
@@ -0,0 +1,168 @@
+# asr_bench.py
+# Word error rate vs. latency for ASR backend configurations on recorded clips.
+#
+#   python asr_bench.py --clips clips/manifest.csv \
+#       --configs whisper:tiny:1 whisper-int8:small:1 faster-whisper:small:1 faster-whisper:medium:5 \
+#       --threads 4
+#
+# The manifest is a CSV with columns path, lang, text (reference transcript);
+# paths are relative to the manifest. A directory works too: every *.wav with
+# a same-named .txt next to it, language taken from the sub-directory name
+# (clips/hi/q01.wav + clips/hi/q01.txt). Each config is backend:model:beam
+# (beam 1 = greedy). Reports WER per language and mean / p95 latency and
+# real-time factor, so a larger model can be picked at the same latency.
+
+import argparse
+import csv
+import json
+import os
+import time
+import unicodedata
+
+import numpy as np
+
+from asr_backends import BACKENDS, make_backend
+from audio_io import load_audio
+
+SR = 16000
+
+
+def normalize_text(text):
+    """Lowercase, drop punctuation/symbols (keeps Devanagari vowel signs), split on whitespace."""
+    text = unicodedata.normalize("NFC", text or "").lower()
+    kept = "".join(" " if unicodedata.category(ch)[0] in "PS" else ch for ch in text)
+    return kept.split()
+
+
+def edit_distance(ref, hyp):
+    """Word-level Levenshtein distance."""
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1]
+
+
+def wer(pairs):
+    """Corpus WER over (reference, hypothesis) text pairs."""
+    errors = words = 0
+    for ref, hyp in pairs:
+        r, h = normalize_text(ref), normalize_text(hyp)
+        errors += edit_distance(r, h)
+        words += len(r)
+    return errors / words if words else 0.0
+
+
+def load_clips(source):
+    """-> list of {"path", "lang", "text", "audio", "duration_s"}."""
+    clips = []
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if not name.endswith(".wav"):
+                    continue
+                txt = os.path.join(root, name[:-4] + ".txt")
+                if not os.path.exists(txt):
+                    continue
+                with open(txt, "r", encoding="utf-8") as f:
+                    clips.append({"path": os.path.join(root, name),
+                                  "lang": os.path.basename(root), "text": f.read().strip()})
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                clips.append({"path": os.path.join(base, row["path"]),
+                              "lang": (row.get("lang") or "").strip(), "text": row["text"]})
+    for c in clips:
+        c["audio"] = load_audio(c["path"], SR)
+        c["duration_s"] = len(c["audio"]) / SR
+    return clips
+
+
+def parse_config(spec):
+    """'faster-whisper:small:5' -> (backend, model, beam)."""
+    parts = spec.split(":")
+    name = parts[0]
+    model = parts[1] if len(parts) > 1 and parts[1] else "tiny"
+    beam = int(parts[2]) if len(parts) > 2 and parts[2] else 1
+    if name not in BACKENDS:
+        raise SystemExit(f"Unknown backend {name!r} in {spec!r} (choose from {', '.join(BACKENDS)})")
+    return name, model, beam
+
+
+def bench_config(clips, name, model, beam, threads=None, warmup=1):
+    backend = make_backend(name, model, threads, beam)
+    t0 = time.perf_counter()
+    backend.load()
+    load_s = time.perf_counter() - t0
+    for c in clips[:warmup]:
+        backend.transcribe(c["audio"])
+
+    latencies, by_lang = [], {}
+    for c in clips:
+        t0 = time.perf_counter()
+        text, _ = backend.transcribe(c["audio"])
+        latencies.append(time.perf_counter() - t0)
+        by_lang.setdefault(c["lang"] or "all", []).append((c["text"], text))
+
+    lat = np.array(latencies)
+    audio_s = sum(c["duration_s"] for c in clips)
+    return {
+        "config": backend.describe(),
+        "backend": name, "model": model, "beam": beam, "threads": threads,
+        "load_s": round(load_s, 2),
+        "wer": round(wer([p for pairs in by_lang.values() for p in pairs]), 4),
+        "wer_by_lang": {lang: round(wer(pairs), 4) for lang, pairs in sorted(by_lang.items())},
+        "latency_mean_s": round(float(lat.mean()), 3),
+        "latency_p95_s": round(float(np.percentile(lat, 95)), 3),
+        "rtf": round(float(lat.sum()) / audio_s, 3) if audio_s else None,
+    }
+
+
+def format_results(results):
+    lines = [f"{'config':<48} {'WER':>6} {'mean s':>7} {'p95 s':>7} {'RTF':>6}  per-language WER"]
+    for r in sorted(results, key=lambda r: r["latency_mean_s"]):
+        langs = " ".join(f"{k}={v}" for k, v in r["wer_by_lang"].items())
+        lines.append(f"{r['config']:<48} {r['wer']:>6} {r['latency_mean_s']:>7} "
+                     f"{r['latency_p95_s']:>7} {r['rtf']:>6}  {langs}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASR backend WER / latency benchmark")
+    parser.add_argument("--clips", default="clips", help="manifest CSV or directory of wav+txt clips")
+    parser.add_argument("--configs", nargs="+",
+                        default=["whisper:tiny:1", "whisper-int8:small:1", "faster-whisper:small:1"],
+                        help="backend:model:beam entries")
+    parser.add_argument("--threads", type=int, default=None, help="intra-op CPU threads per engine")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--out", type=str, help="write results as JSON here")
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips)
+    if not clips:
+        raise SystemExit(f"No clips with reference transcripts found in {args.clips}")
+    print(f"[bench] {len(clips)} clip(s), {sum(c['duration_s'] for c in clips):.1f}s of audio")
+
+    results = []
+    for spec in args.configs:
+        name, model, beam = parse_config(spec)
+        try:
+            res = bench_config(clips, name, model, beam, args.threads, args.warmup)
+        except ImportError as e:
+            print(f"[bench] {spec}: skipped ({e})")
+            continue
+        results.append(res)
+        print(f"[bench] {res['config']}: WER {res['wer']} mean {res['latency_mean_s']}s "
+              f"(load {res['load_s']}s)")
+
+    print("\n" + format_results(results))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
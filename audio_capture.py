@@ -0,0 +1,287 @@
+# audio_capture.py
+# Streaming audio capture with voice-activity detection (VAD).
+# Audio is read in small frames into a ring buffer; the utterance ends as soon
+# as trailing silence is seen, so ASR can start without waiting a fixed duration.
+
+import queue
+import time
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+
+
+# ---------- RING BUFFER ----------
+class RingBuffer:
+    """Fixed-capacity float32 ring buffer; oldest samples are overwritten."""
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self._buf = np.zeros(self.capacity, dtype=np.float32)
+        self._pos = 0      # next write position
+        self._filled = 0   # number of valid samples
+
+    def __len__(self):
+        return self._filled
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        n = samples.size
+        if n >= self.capacity:
+            self._buf[:] = samples[-self.capacity:]
+            self._pos = 0
+            self._filled = self.capacity
+            return
+        end = self._pos + n
+        if end <= self.capacity:
+            self._buf[self._pos:end] = samples
+        else:
+            k = self.capacity - self._pos
+            self._buf[self._pos:] = samples[:k]
+            self._buf[:n - k] = samples[k:]
+        self._pos = end % self.capacity
+        self._filled = min(self.capacity, self._filled + n)
+
+    def read(self):
+        """Return buffered samples in chronological order (copy)."""
+        if self._filled < self.capacity:
+            return self._buf[:self._filled].copy()
+        return np.concatenate((self._buf[self._pos:], self._buf[:self._pos]))
+
+    def clear(self):
+        self._pos = 0
+        self._filled = 0
+
+
+# ---------- VAD ----------
+class EnergyVAD:
+    """
+    Energy-based VAD with an adaptive noise floor.
+    A frame is speech if its RMS level (dBFS) is `margin_db` above the running
+    noise floor and above `min_db`. The floor is seeded from the first
+    `calibration_frames` frames - the mean of those within `near_db` of the
+    quietest, so speech in the window does not raise it - and then tracks
+    non-speech frames, dropping at once to any quieter frame. When the window
+    closes, speech in it that the early floor could not judge is reported on
+    that frame (the capture pre-roll still holds the audio). A known
+    `noise_db` (e.g. from the previous utterance) skips the calibration.
+    """
+
+    def __init__(self, margin_db=10.0, min_db=-50.0, calibration_frames=10, adapt=0.05, noise_db=None,
+                 near_db=3.0):
+        self.margin_db = margin_db
+        self.min_db = min_db
+        self.calibration_frames = calibration_frames
+        self.adapt = adapt
+        self.near_db = near_db
+        self._seed_db = noise_db
+        self.reset()
+
+    @staticmethod
+    def level_db(frame):
+        frame = np.asarray(frame, dtype=np.float32)
+        rms = float(np.sqrt(np.mean(frame * frame))) if frame.size else 0.0
+        return 20.0 * np.log10(max(rms, 1e-10))
+
+    def _threshold(self):
+        return max(self.min_db, self.noise_db + self.margin_db)
+
+    def is_speech(self, frame):
+        db = self.level_db(frame)
+        if self._seen < self.calibration_frames:
+            # floor = mean of the calibration frames near the running minimum
+            self._calib.append(db)
+            self._seen += 1
+            low = min(self._calib)
+            near = [d for d in self._calib if d <= low + self.near_db]
+            self.noise_db = sum(near) / len(near)
+            speech = db > self._threshold() and self._seen > 1
+            if self._seen == self.calibration_frames and not self._flagged:
+                speech = any(d > self._threshold() for d in self._calib)
+            self._flagged = self._flagged or speech
+            return speech
+        speech = db > self._threshold()
+        if not speech:
+            self.noise_db = min(db, self.noise_db + self.adapt * (db - self.noise_db))
+        return speech
+
+    def reset(self):
+        self.noise_db = self._seed_db
+        self._seen = 0 if self._seed_db is None else self.calibration_frames
+        self._calib = []
+        self._flagged = False
+
+
+class WebRTCVAD:
+    """Model-based VAD using the optional `webrtcvad` package (10/20/30 ms frames)."""
+
+    def __init__(self, aggressiveness=2, fs=SAMPLE_RATE):
+        import webrtcvad
+        self._vad = webrtcvad.Vad(aggressiveness)
+        self.fs = fs
+
+    def is_speech(self, frame):
+        pcm = (np.clip(np.asarray(frame, dtype=np.float32), -1.0, 1.0) * 32767).astype(np.int16)
+        return self._vad.is_speech(pcm.tobytes(), self.fs)
+
+    def reset(self):
+        pass
+
+
+NOISE_TTL_S = 300.0          # a remembered noise floor is trusted this long
+_noise_floor = None          # (dBFS, time.monotonic()) from the last live utterance
+
+
+def remember_noise_floor(vad):
+    """Keep an energy VAD's tracked noise floor for the next make_vad(reuse_noise=True)."""
+    global _noise_floor
+    if getattr(vad, "noise_db", None) is not None:
+        _noise_floor = (vad.noise_db, time.monotonic())
+
+
+def cached_noise_floor(ttl=NOISE_TTL_S):
+    floor = _noise_floor
+    if floor is None or time.monotonic() - floor[1] > ttl:
+        return None
+    return floor[0]
+
+
+def make_vad(kind="energy", fs=SAMPLE_RATE, reuse_noise=False):
+    """
+    Build a VAD by name ("energy" or "webrtc"); falls back to energy.
+    reuse_noise: seed the energy VAD with the cached noise floor (if fresh)
+    instead of calibrating on the first frames of the utterance.
+    """
+    if kind == "webrtc":
+        try:
+            return WebRTCVAD(fs=fs)
+        except Exception as e:
+            print("[vad] webrtcvad unavailable, using energy VAD:", e)
+    return EnergyVAD(noise_db=cached_noise_floor() if reuse_noise else None)
+
+
+# ---------- SOURCES ----------
+class MicrophoneSource:
+    """Live microphone frames via sounddevice.InputStream (float32 mono)."""
+
+    def __init__(self, fs=SAMPLE_RATE, frame_ms=FRAME_MS):
+        self.fs = fs
+        self.frame_len = int(fs * frame_ms / 1000)
+        self._q = queue.Queue()
+        self._stream = None
+
+    def _callback(self, indata, frames, time_info, status):
+        self._q.put(indata[:, 0].copy())
+
+    def __enter__(self):
+        import sounddevice as sd
+        self._stream = sd.InputStream(samplerate=self.fs, channels=1, dtype="float32",
+                                      blocksize=self.frame_len, callback=self._callback)
+        self._stream.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        return False
+
+    def frames(self):
+        while True:
+            yield self._q.get()
+
+
+class FileSource:
+    """
+    Replays an audio file (or an in-memory array) as frames, so capture and
+    VAD can be exercised without a microphone. realtime=True paces frames
+    at the recording's speed.
+    """
+
+    def __init__(self, path=None, audio=None, fs=SAMPLE_RATE, frame_ms=FRAME_MS, realtime=False):
+        if audio is None:
+            import soundfile as sf
+            audio, fs = sf.read(path, dtype="float32", always_2d=True)
+            audio = audio.mean(axis=1)
+        self.audio = np.asarray(audio, dtype=np.float32).ravel()
+        self.fs = fs
+        self.frame_len = int(fs * frame_ms / 1000)
+        self.realtime = realtime
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def frames(self):
+        step = self.frame_len
+        period = step / float(self.fs)
+        for start in range(0, self.audio.size, step):
+            if self.realtime:
+                time.sleep(period)
+            yield self.audio[start:start + step]
+
+
+# ---------- CAPTURE ----------
+def capture_utterance(source, vad=None, max_duration=15.0, trailing_silence=0.8,
+                      preroll=0.3, min_speech=0.25, no_speech_timeout=5.0):
+    """
+    Read frames from `source` until one utterance has been captured.
+
+    The utterance starts at the first speech frame (plus `preroll` seconds of
+    audio kept in a ring buffer) and ends after `trailing_silence` seconds of
+    non-speech, or at `max_duration`. Returns (audio float32 array, info dict);
+    audio is empty if no speech was heard within `no_speech_timeout`.
+    """
+    vad = vad or EnergyVAD()
+    fs = source.fs
+    pre = RingBuffer(max(1, int(preroll * fs)))
+    chunks = []
+    started = False
+    speech_s = silence_s = heard_s = 0.0
+    t0 = time.perf_counter()
+
+    with source:
+        for frame in source.frames():
+            dur = len(frame) / float(fs)
+            heard_s += dur
+            speech = vad.is_speech(frame)
+            if not started:
+                pre.write(frame)
+                if speech:
+                    started = True
+                    chunks.append(pre.read())
+                    speech_s = dur
+                elif heard_s >= no_speech_timeout:
+                    break
+                continue
+
+            chunks.append(np.asarray(frame, dtype=np.float32))
+            if speech:
+                speech_s += dur
+                silence_s = 0.0
+            else:
+                silence_s += dur
+                if silence_s >= trailing_silence and speech_s >= min_speech:
+                    break
+            if heard_s >= max_duration:
+                break
+
+    audio = np.concatenate(chunks) if started else np.zeros(0, dtype=np.float32)
+    if silence_s and audio.size:
+        # drop most of the trailing silence, keep a short tail
+        keep = int(min(silence_s, 0.2) * fs)
+        cut = int(silence_s * fs) - keep
+        if 0 < cut < audio.size:
+            audio = audio[:-cut]
+    info = {
+        "speech": started,
+        "heard_s": round(heard_s, 3),
+        "utterance_s": round(audio.size / float(fs), 3),
+        "wall_s": round(time.perf_counter() - t0, 3),
+        "fs": fs,
+    }
+    return audio, info
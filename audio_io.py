@@ -0,0 +1,68 @@
+# audio_io.py
+# In-process audio decoding / resampling for the ASR path.
+# Whisper wants float32 mono at 16 kHz; handing it a file path makes it spawn
+# ffmpeg for every query. These helpers produce that buffer directly and only
+# fall back to ffmpeg for codecs soundfile (libsndfile) cannot read.
+
+import numpy as np
+
+ASR_SAMPLE_RATE = 16000
+
+
+def to_float32_mono(audio):
+    """Convert an int/float recording of shape (n,) or (n, channels) to float32 mono in [-1, 1]."""
+    audio = np.asarray(audio)
+    if np.issubdtype(audio.dtype, np.integer):     # scale before a channel mean makes it float64
+        scale = float(np.iinfo(audio.dtype).max) + 1.0
+        audio = audio.astype(np.float32) / np.float32(scale)
+    if audio.ndim == 2:
+        audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+    return audio.astype(np.float32, copy=False)
+
+
+def resample(audio, orig_sr, target_sr=ASR_SAMPLE_RATE):
+    """Resample float32 audio; polyphase (scipy) when available, else linear interpolation."""
+    if orig_sr == target_sr or audio.size == 0:
+        return audio
+    try:
+        from math import gcd
+        from scipy.signal import resample_poly
+        g = gcd(int(orig_sr), int(target_sr))
+        out = resample_poly(audio, int(target_sr) // g, int(orig_sr) // g)
+    except ImportError:
+        n_out = int(round(audio.size * float(target_sr) / orig_sr))
+        x_old = np.arange(audio.size, dtype=np.float64) / orig_sr
+        x_new = np.arange(n_out, dtype=np.float64) / target_sr
+        out = np.interp(x_new, x_old, audio)
+    return out.astype(np.float32)
+
+
+def _load_with_ffmpeg(path, sr):
+    """Fallback decoder: whisper's ffmpeg-based loader (one subprocess)."""
+    from whisper.audio import load_audio as whisper_load_audio
+    return whisper_load_audio(path, sr=sr)
+
+
+def load_audio(path, sr=ASR_SAMPLE_RATE):
+    """
+    Decode an audio file to float32 mono at `sr`.
+    Uses soundfile in-process; ffmpeg is used only if soundfile cannot
+    decode the file (e.g. mp3/m4a on older libsndfile).
+    """
+    try:
+        import soundfile as sf
+        data, file_sr = sf.read(path, dtype="float32", always_2d=True)
+    except Exception as e:
+        print(f"[audio] In-process decode failed ({e}); falling back to ffmpeg.")
+        return _load_with_ffmpeg(path, sr)
+    return resample(to_float32_mono(data), file_sr, sr)
+
+
+def as_asr_input(audio, sr=ASR_SAMPLE_RATE, source_sr=None):
+    """Accept a path or an array and return a float32 16 kHz buffer for ASR."""
+    if isinstance(audio, (str, bytes)) or hasattr(audio, "__fspath__"):
+        return load_audio(audio, sr=sr)
+    buf = to_float32_mono(audio)
+    if source_sr is not None:
+        buf = resample(buf, source_sr, sr)
+    return buf
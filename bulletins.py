@@ -0,0 +1,341 @@
+# bulletins.py
+# Bulk advisory bulletins (SMS / IVR text) for extension teams.
+#
+# Jobs are streamed - every intent x (district, crop) x language found in
+# the dataset (--cross: every district x every crop), or one or more per row
+# of a subscriber CSV - and rendered `--batch` at a time: one row lookup per
+# (district, crop) from a grouped index, one batched interval prediction for
+# the batch's rows, one dose search per row for fertilizer bulletins, then
+# templates.render_template. Output (JSONL or CSV) is appended batch by
+# batch, so memory stays bounded by the batch size and the in-flight window.
+#
+# After every written batch a checkpoint (<out>.ckpt) records how many jobs
+# are done and the output size; --resume truncates any partial batch and
+# continues from there. Random choices (dataset row, template) are seeded
+# from --seed and the job itself, and the dose search runs without its
+# latency budget, so a resumed or parallel run writes the same text as a
+# single uninterrupted one.
+#
+#   python bulletins.py --out bulletins.jsonl --workers 4
+#   python bulletins.py --subscribers subscribers.csv --out sms.csv --intents yield rainfall
+#   python bulletins.py --out bulletins.jsonl --resume
+#
+# Subscriber CSV: columns district, crop and optional lang, intent, id; any
+# other columns (phone, village ...) are copied to the output.
+
+import argparse
+import collections
+import csv
+import io
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+INTENTS = ("irrigation", "fertilizer", "pest", "sowing", "yield", "rainfall")
+LANGS = ("en", "hi", "mr")
+FIELDS = ("seq", "intent", "district", "crop", "lang", "text", "chars", "sms_parts")
+SUBSCRIBER_KEYS = ("district", "crop", "lang", "intent")
+
+
+# ---------- jobs ----------
+
+def dataset_pairs(cross=False):
+    """(district, crop) pairs present in the dataset, in first-seen order (cross: all combinations)."""
+    from templates import load_dataset
+    pairs, districts, crops = {}, {}, {}
+    for r in load_dataset():
+        d, c = r.get("district_name", "").strip(), r.get("crop", "").strip()
+        if d and c:
+            pairs.setdefault((d.lower(), c.lower()), (d, c))
+            districts.setdefault(d.lower(), d)
+            crops.setdefault(c.lower(), c)
+    if cross:
+        return list(itertools.product(districts.values(), crops.values()))
+    return list(pairs.values())
+
+
+def dataset_jobs(intents=INTENTS, langs=LANGS, cross=False):
+    """-> (total, iterator of jobs). A job is (intent, district, crop, lang, extra fields)."""
+    pairs = dataset_pairs(cross)
+    jobs = ((intent, d, c, lang, None) for d, c in pairs for intent in intents for lang in langs)
+    return len(pairs) * len(intents) * len(langs), jobs
+
+
+def subscriber_jobs(path, intents=INTENTS, langs=("en",)):
+    """
+    -> (None, iterator of jobs) streamed from a subscriber CSV. Rows without
+    intent / lang get one job per --intents / --langs value.
+    """
+    def gen():
+        with open(path, newline="", encoding="utf-8") as f:
+            for raw in csv.DictReader(f):
+                sub = {k.strip().lower(): (v or "").strip() for k, v in raw.items() if k}
+                extra = {k: v for k, v in sub.items() if k not in SUBSCRIBER_KEYS}
+                for intent in ([sub["intent"]] if sub.get("intent") else intents):
+                    for lang in ([sub["lang"]] if sub.get("lang") else langs):
+                        yield intent, sub.get("district", ""), sub.get("crop", ""), lang, extra
+    return None, gen()
+
+
+def batched(iterable, n):
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, n))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ---------- rendering (runs in workers) ----------
+
+_groups = (None, {})   # (dataset snapshot, {(district, crop): rows})
+
+
+def _group_rows():
+    """Rows grouped by (district, crop), rebuilt if the dataset snapshot changed."""
+    global _groups
+    from templates import load_dataset
+    data = load_dataset()
+    snapshot, groups = _groups
+    if snapshot is not data:
+        groups = collections.defaultdict(list)
+        for r in data:
+            groups[(r.get("district_name", "").strip().lower(), r.get("crop", "").strip().lower())].append(r)
+        _groups = (data, groups)
+    return groups
+
+
+def init_worker():
+    """Executor initializer: load the dataset, grouping and model once per process."""
+    import ml_connector
+    _group_rows()
+    try:
+        ml_connector.load_model()
+    except FileNotFoundError as e:
+        print("[bulletins] no model, heuristic yields:", e)
+
+
+def sms_parts(text):
+    """SMS segments: GSM-7 (ASCII here) 160 / 153 chars, else UCS-2 70 / 67."""
+    single, multi = (160, 153) if all(ord(ch) < 128 for ch in text) else (70, 67)
+    return 1 if len(text) <= single else -(-len(text) // multi)
+
+
+def _with_estimates(rows):
+    """Copies of rows missing a yield, with the model's yield / confidence from one batched call."""
+    need = [k for k, r in rows.items() if r is not None and not r.get("yield")]
+    if not need:
+        return rows
+    try:
+        from ml_connector import predict_interval_batch
+        pred, low, high, conf = predict_interval_batch([rows[k] for k in need])
+    except Exception as e:
+        print("[bulletins] model estimates unavailable:", e)
+        return rows
+    out = dict(rows)
+    for k, p, c in zip(need, pred, conf):
+        out[k] = dict(rows[k], **{"yield": str(round(float(p), 2)), "confidence": str(int(c))})
+    return out
+
+
+def render_batch(start, jobs, seed=0, dose=True):
+    """Jobs -> output records (seq = start + position), deterministic for a given seed."""
+    from templates import build_fill_values, find_best_row, render_template
+    groups = _group_rows()
+    rows = {}
+    for _, district, crop, _, _ in jobs:
+        key = (district.strip().lower(), crop.strip().lower())
+        if key not in rows:
+            rows[key] = find_best_row(groups.get(key, []), rng=random.Random(f"{seed}|{key}"))
+    rows = _with_estimates(rows)
+
+    advice = {}
+    records = []
+    for i, (intent, district, crop, lang, extra) in enumerate(jobs):
+        key = (district.strip().lower(), crop.strip().lower())
+        row = rows[key]
+        use_dose = False
+        if intent == "fertilizer" and row is not None and dose:
+            if key not in advice:
+                try:
+                    from fertilizer_optimizer import recommend_dose
+                    advice[key] = recommend_dose(row, budget_ms=float("inf"))   # full search: load-independent
+                except Exception as e:
+                    print("[bulletins] dose optimizer unavailable:", e)
+                    advice[key] = False
+            use_dose = advice[key]
+        vals = build_fill_values(row, district or None, crop or None, None, None, None, None,
+                                 None, None, None, None, lang)
+        rng = random.Random(f"{seed}|{intent}|{key}|{lang}|{(extra or {}).get('id', '')}")
+        text = render_template(intent, lang, row, vals, rng, dose=use_dose)
+        rec = dict(extra or {})
+        rec.update(seq=start + i, intent=intent, district=district, crop=crop, lang=lang, text=text,
+                   chars=len(text), sms_parts=sms_parts(text))
+        records.append(rec)
+    return records
+
+
+# ---------- output + checkpoints ----------
+
+class BulletinWriter:
+    """
+    Appends records as JSONL or CSV (binary file, so sizes are byte offsets
+    a checkpoint can truncate back to).
+    """
+
+    def __init__(self, path, fmt=None, fields=FIELDS, truncate_to=None):
+        self.path = path
+        self.fmt = fmt or ("csv" if path.endswith(".csv") else "jsonl")
+        self.fields = list(fields)
+        fresh = truncate_to is None or not os.path.exists(path)
+        self._f = open(path, "wb" if fresh else "r+b")
+        if fresh:
+            if self.fmt == "csv":
+                self._write_csv([dict(zip(self.fields, self.fields))])
+        else:
+            self._f.truncate(truncate_to)
+            self._f.seek(truncate_to)
+
+    def _write_csv(self, records):
+        buf = io.StringIO()
+        csv.DictWriter(buf, self.fields, extrasaction="ignore").writerows(records)
+        self._f.write(buf.getvalue().encode("utf-8"))
+
+    def write(self, records):
+        if self.fmt == "csv":
+            self._write_csv(records)
+        else:
+            self._f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"))
+
+    def sync(self):
+        """Flush to disk; returns the file size."""
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self):
+        self._f.close()
+
+
+def checkpoint_path(out):
+    return out + ".ckpt"
+
+
+def save_checkpoint(out, state):
+    tmp = checkpoint_path(out) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, checkpoint_path(out))
+
+
+def load_checkpoint(out, signature):
+    path = checkpoint_path(out)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("signature") != signature:
+        raise ValueError(f"{path} was written with different settings; remove it or drop --resume")
+    return state
+
+
+# ---------- driver ----------
+
+def generate(jobs, out, total=None, fields=FIELDS, workers=1, batch=256, seed=0, dose=True,
+             resume=False, signature=None, progress_every=10.0):
+    """
+    Render `jobs` into `out`, `batch` jobs per task on `workers` processes
+    (1 = in this process). Batches are written in job order; at most
+    2 x workers are in flight. Returns the number of records written.
+    """
+    state = load_checkpoint(out, signature) if resume else None
+    done = state["jobs"] if state else 0
+    if state:
+        print(f"[bulletins] resuming after {done} job(s) ({state['bytes']} bytes)")
+        jobs = itertools.islice(jobs, done, None)
+    writer = BulletinWriter(out, fields=fields, truncate_to=state["bytes"] if state else None)
+    t0 = last = time.perf_counter()
+    written = 0
+
+    def commit(records):
+        nonlocal done, written, last
+        writer.write(records)
+        done += len(records)
+        written += len(records)
+        save_checkpoint(out, {"signature": signature, "jobs": done, "bytes": writer.sync(),
+                              "updated": time.strftime("%Y-%m-%dT%H:%M:%S")})
+        now = time.perf_counter()
+        if now - last >= progress_every:
+            last = now
+            rate = written / (now - t0)
+            print(f"[bulletins] {done}{f'/{total}' if total else ''} jobs, {rate:.1f}/s")
+
+    try:
+        first = done
+        batches = ((first + i * batch, b) for i, b in enumerate(batched(jobs, batch)))
+        init_worker()   # forked workers inherit the loaded dataset and model
+        if workers <= 1:
+            for start, b in batches:
+                commit(render_batch(start, b, seed, dose))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                pending = collections.deque()
+                for start, b in batches:
+                    pending.append(pool.submit(render_batch, start, b, seed, dose))
+                    if len(pending) >= 2 * workers:
+                        commit(pending.popleft().result())
+                while pending:
+                    commit(pending.popleft().result())
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - t0
+    print(f"[bulletins] {written} bulletin(s) in {elapsed:.1f}s "
+          f"({written / elapsed if elapsed else 0:.1f}/s) -> {out}")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk advisory bulletin generator")
+    parser.add_argument("--out", required=True, help="output .jsonl or .csv")
+    parser.add_argument("--subscribers", type=str, help="subscriber CSV (default: all dataset district/crop pairs)")
+    parser.add_argument("--cross", action="store_true", help="every district x every crop, not just observed pairs")
+    parser.add_argument("--intents", nargs="+", default=list(INTENTS), choices=INTENTS)
+    parser.add_argument("--langs", nargs="+", default=None, choices=LANGS,
+                        help="default: en hi mr (subscribers without a lang column: en)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no_dose", action="store_true", help="skip the fertilizer dose optimizer")
+    parser.add_argument("--limit", type=int, help="stop after N jobs")
+    parser.add_argument("--resume", action="store_true", help="continue from <out>.ckpt")
+    args = parser.parse_args()
+
+    fields = list(FIELDS)
+    if args.subscribers:
+        langs = args.langs or ["en"]
+        total, jobs = subscriber_jobs(args.subscribers, args.intents, langs)
+        with open(args.subscribers, newline="", encoding="utf-8") as f:
+            header = [h.strip().lower() for h in next(csv.reader(f), [])]
+        fields = [h for h in header if h not in SUBSCRIBER_KEYS] + fields
+        st = os.stat(args.subscribers)
+        source = f"{os.path.abspath(args.subscribers)}:{st.st_size}:{int(st.st_mtime)}"
+    else:
+        langs = args.langs or list(LANGS)
+        total, jobs = dataset_jobs(args.intents, langs, args.cross)
+        source = "dataset" + (":cross" if args.cross else "")
+    if args.limit:
+        jobs = itertools.islice(jobs, args.limit)
+        total = min(total, args.limit) if total else None
+    signature = json.dumps({"source": source, "intents": args.intents, "langs": langs, "seed": args.seed,
+                            "dose": not args.no_dose, "limit": args.limit, "fields": fields})
+    print(f"[bulletins] {total if total is not None else 'streaming'} job(s) from {source}; "
+          f"{args.workers} worker(s), batch {args.batch}")
+    generate(jobs, args.out, total, fields, workers=args.workers, batch=args.batch, seed=args.seed,
+             dose=not args.no_dose, resume=args.resume, signature=signature)
+
+
+if __name__ == "__main__":
+    main()
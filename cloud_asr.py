@@ -0,0 +1,409 @@
+# cloud_asr.py
+# Remote speech-to-text client with connection reuse, timeouts and hedging.
+#
+#   CloudASRClient   one keep-alive HTTP(S) connection per thread and host
+#                    (stdlib http.client), connect/read timeouts, an overall
+#                    deadline, one retry on a stale connection and bounded
+#                    retries with backoff on 429/5xx.
+#                    provider "google": the Chromium speech API that
+#                    speech_recognition.recognize_google calls (FLAC or L16).
+#                    provider "http":   POST audio/wav, JSON {"text", "lang"}
+#                    back (self-hosted engines, the mock server below).
+#                    The Google key comes from key= or GOOGLE_SPEECH_API_KEY;
+#                    without one the client refuses to start (CloudASRError).
+#   HedgedASR        sends audio to the cloud client; if no answer arrives
+#                    within `hedge_after` seconds (or the request fails), local
+#                    Whisper starts on the same audio (in its own executor,
+#                    so hung cloud requests never delay it), and the first
+#                    non-empty transcript wins.
+#   MockASRServer    local stand-in (both protocols) with configurable
+#                    latency, jitter and failure rate.
+#
+#   python cloud_asr.py --mock --port 8765 --latency 0.4 --fail_rate 0.1
+#   python cloud_asr.py --url http://127.0.0.1:8765/transcribe --provider http --file input.wav
+
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import threading
+import time
+import wave
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import numpy as np
+
+from metrics import span
+
+GOOGLE_URL = "https://www.google.com/speech-api/v2/recognize"
+GOOGLE_KEY_ENV = "GOOGLE_SPEECH_API_KEY"
+SAMPLE_RATE = 16000
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class CloudASRError(Exception):
+    pass
+
+
+# ---------- audio encoding ----------
+
+def to_pcm16(audio):
+    audio = np.clip(np.asarray(audio, dtype=np.float32).ravel(), -1.0, 1.0)
+    return (audio * 32767.0).astype("<i2").tobytes()
+
+
+def encode_wav(audio, sr=SAMPLE_RATE):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(to_pcm16(audio))
+    return buf.getvalue()
+
+
+def encode_for_google(audio, sr=SAMPLE_RATE):
+    """(body, content type): FLAC if soundfile is installed, else raw 16-bit PCM."""
+    try:
+        import soundfile as sf
+        buf = io.BytesIO()
+        sf.write(buf, np.asarray(audio, dtype=np.float32), sr, format="FLAC", subtype="PCM_16")
+        return buf.getvalue(), f"audio/x-flac; rate={sr}"
+    except ImportError:
+        return to_pcm16(audio), f"audio/l16; rate={sr}"
+
+
+def decode_wav(data):
+    with wave.open(io.BytesIO(data), "rb") as w:
+        frames = w.readframes(w.getnframes())
+        sr = w.getframerate()
+    return np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32767.0, sr
+
+
+# ---------- client ----------
+
+class CloudASRClient:
+    """
+    transcribe(audio, lang) -> (text, lang) for float32 16 kHz audio.
+    Connections are kept alive per thread; a request never runs past
+    `deadline` seconds (connect_timeout / read_timeout bound each attempt).
+    provider "google" needs an API key (key= or $GOOGLE_SPEECH_API_KEY).
+    """
+
+    def __init__(self, url=GOOGLE_URL, provider="google", key=None, connect_timeout=2.0,
+                 read_timeout=6.0, deadline=8.0, retries=2, backoff=0.2):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {url}")
+        self.url = url
+        self.provider = provider
+        self.key = key or os.environ.get(GOOGLE_KEY_ENV)
+        if provider == "google":
+            if not self.key:
+                raise CloudASRError(f"no Google speech API key: pass key= or set {GOOGLE_KEY_ENV}")
+            if parts.scheme != "https":
+                print(f"[cloud-asr] warning: {url} is not https - the API key and audio are sent unencrypted")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self._scheme, self._host, self._port = parts.scheme, parts.hostname, parts.port
+        self._path = parts.path or "/"
+        self._query = parts.query
+        self._local = threading.local()
+        self.stats = {"requests": 0, "connections": 0, "retries": 0}
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            conn = self._local.conn = cls(self._host, self._port, timeout=self.connect_timeout)
+            self.stats["connections"] += 1
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def _request(self, lang, audio):
+        if self.provider == "google":
+            body, ctype = encode_for_google(audio)
+            query = urlencode({"client": "chromium", "lang": lang, "key": self.key, "pFilter": 0})
+        else:
+            body, ctype = encode_wav(audio), "audio/wav"
+            query = urlencode({"lang": lang})
+        if self._query:
+            query = self._query + "&" + query
+        return f"{self._path}?{query}", body, {"Content-Type": ctype, "Connection": "keep-alive"}
+
+    def _send(self, path, body, headers, remaining):
+        """One attempt -> (status, body). Reconnects once if a kept-alive connection went stale."""
+        while True:
+            conn = self._conn()
+            reused = conn.sock is not None
+            try:
+                if not reused:
+                    conn.timeout = min(self.connect_timeout, remaining)
+                    conn.connect()
+                conn.sock.settimeout(min(self.read_timeout, remaining))
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                if resp.will_close:
+                    self._drop()
+                return resp.status, data
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError,
+                    http.client.CannotSendRequest, http.client.ResponseNotReady):
+                self._drop()
+                if not reused:      # a fresh connection failing is a real error
+                    raise
+            except Exception:
+                self._drop()
+                raise
+
+    def transcribe(self, audio, lang="hi-IN"):
+        t0 = time.perf_counter()
+        path, body, headers = self._request(lang, audio)
+        delay = self.backoff
+        with span("cloud_asr"):
+            for attempt in range(self.retries + 1):
+                remaining = self.deadline - (time.perf_counter() - t0)
+                if remaining <= 0:
+                    raise CloudASRError(f"deadline of {self.deadline}s exceeded")
+                self.stats["requests"] += 1
+                try:
+                    status, data = self._send(path, body, headers, remaining)
+                except (OSError, http.client.HTTPException) as e:     # timeouts, refused / reset connections
+                    if attempt >= self.retries:
+                        raise CloudASRError(f"{type(e).__name__}: {e}") from e
+                    status, data = None, b""
+                if status == 200:
+                    return self._parse(data, lang)
+                if status is not None and status not in RETRY_STATUS:
+                    raise CloudASRError(f"HTTP {status}: {data[:200]!r}")
+                if attempt < self.retries:
+                    self.stats["retries"] += 1
+                    time.sleep(min(delay, max(0.0, self.deadline - (time.perf_counter() - t0))))
+                    delay *= 2
+            raise CloudASRError(f"HTTP {status} after {self.retries + 1} attempt(s)")
+
+    def _parse(self, data, lang):
+        text = data.decode("utf-8", errors="replace")
+        if self.provider != "google":
+            obj = json.loads(text or "{}")
+            return (obj.get("text") or "").strip(), obj.get("lang") or lang
+        # one JSON object per line; the first is usually {"result":[]}
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            for result in json.loads(line).get("result", []):
+                alts = result.get("alternative") or []
+                if alts and alts[0].get("transcript"):
+                    return alts[0]["transcript"].strip(), lang
+        return "", lang
+
+    def close(self):
+        self._drop()
+
+
+# ---------- hedging ----------
+
+class HedgedASR:
+    """
+    transcribe(audio, lang) -> (text, lang, source) with source "cloud" or
+    "local". The cloud request gets `hedge_after` seconds on its own; after
+    that (or as soon as it fails) `local` - a function audio -> (text, lang),
+    normally Whisper - runs too, and whichever returns a non-empty transcript
+    first is used. A late cloud answer is discarded (its socket times out).
+    Cloud requests and local runs use separate executors, so cloud requests
+    stuck until their deadline never queue the local fallback behind them.
+    """
+
+    def __init__(self, client, local, hedge_after=1.5, max_workers=4, local_workers=1):
+        self.client = client
+        self.local = local
+        self.hedge_after = hedge_after
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asr-hedge")
+        self._local_pool = ThreadPoolExecutor(max_workers=local_workers, thread_name_prefix="asr-local")
+        self.wins = {"cloud": 0, "local": 0}
+
+    def transcribe(self, audio, lang="hi-IN"):
+        cloud = self._pool.submit(self.client.transcribe, audio, lang)
+        futures = {cloud: "cloud"}
+        wait([cloud], timeout=self.hedge_after)
+        cloud_ok = cloud.done() and cloud.exception() is None
+        if cloud_ok and cloud.result()[0].strip():
+            self.wins["cloud"] += 1
+            return (*cloud.result(), "cloud")
+        if not cloud.done():
+            print(f"[cloud-asr] no cloud answer after {self.hedge_after:g}s; starting local ASR")
+        elif not cloud_ok:
+            print("[cloud-asr] cloud request failed:", cloud.exception(), "- using local ASR")
+        futures[self._local_pool.submit(self.local, audio)] = "local"
+
+        pending, errors, fallback = set(futures), [], None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is not None:
+                    errors.append(f.exception())
+                    continue
+                text, out_lang = f.result()
+                if text.strip():
+                    self.wins[futures[f]] += 1
+                    return text, out_lang, futures[f]
+                fallback = fallback or (text, out_lang, futures[f])
+        if fallback is not None:
+            return fallback
+        raise errors[-1]
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        self._local_pool.shutdown(wait=False)
+        self.client.close()
+
+
+# ---------- mock server ----------
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"     # keep-alive, like the real endpoint
+    disable_nagle_algorithm = True    # headers and body go out as separate writes
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        srv = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.requests_on_connection = getattr(self, "requests_on_connection", 0) + 1
+        with srv.lock:
+            srv.requests += 1
+            if self.requests_on_connection == 1:
+                srv.connections += 1
+            rng_val = srv.rng.random()
+            delay = max(0.0, srv.latency + srv.rng.uniform(-srv.jitter, srv.jitter))
+        time.sleep(delay)
+        if rng_val < srv.fail_rate:
+            return self._reply(503, b'{"error": "mock failure"}', "application/json")
+        url = urlsplit(self.path)
+        lang = parse_qs(url.query).get("lang", ["en"])[0]
+        text = srv.text
+        if url.path.endswith("/recognize"):
+            payload = '{"result":[]}\n' + json.dumps(
+                {"result": [{"alternative": [{"transcript": text, "confidence": 0.9}], "final": True}],
+                 "result_index": 0}, ensure_ascii=False) + "\n"
+            return self._reply(200, payload.encode("utf-8"), "application/json; charset=utf-8")
+        return self._reply(200, json.dumps({"text": text, "lang": lang, "bytes": len(body)},
+                                           ensure_ascii=False).encode("utf-8"), "application/json")
+
+    def _reply(self, status, data, ctype):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True      # the client timed out and went away
+
+
+class MockASRServer:
+    """
+    In-process stand-in for the cloud endpoint (use as a context manager).
+    Answers POST .../recognize (Google format) and any other path (JSON)
+    with `text` after latency +/- jitter seconds; fail_rate of requests get 503.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, text="Kolhapur wheat fertilizer", latency=0.2,
+                 jitter=0.0, fail_rate=0.0, seed=0):
+        self._httpd = ThreadingHTTPServer((host, port), _MockHandler)
+        self._httpd.daemon_threads = True
+        for k, v in dict(text=text, latency=latency, jitter=jitter, fail_rate=fail_rate,
+                         rng=random.Random(seed), lock=threading.Lock(), requests=0, connections=0).items():
+            setattr(self._httpd, k, v)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self):
+        return {"requests": self._httpd.requests, "connections": self._httpd.connections}
+
+    def configure(self, **settings):
+        with self._httpd.lock:
+            for k, v in settings.items():
+                setattr(self._httpd, k, v)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cloud ASR client / local mock server")
+    parser.add_argument("--mock", action="store_true", help="run the mock server in the foreground")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--fail_rate", type=float, default=0.0)
+    parser.add_argument("--text", type=str, default="Kolhapur wheat fertilizer")
+    parser.add_argument("--url", type=str, help="client: endpoint URL")
+    parser.add_argument("--provider", choices=["google", "http"], default="http")
+    parser.add_argument("--file", type=str, help="client: audio file to send")
+    parser.add_argument("--lang", type=str, default="hi-IN")
+    parser.add_argument("--repeat", type=int, default=3, help="client: requests to send (shows connection reuse)")
+    parser.add_argument("--timeout", type=float, default=6.0, help="client: read timeout / deadline (s)")
+    args = parser.parse_args()
+
+    if args.mock:
+        server = MockASRServer(port=args.port, text=args.text, latency=args.latency,
+                               jitter=args.jitter, fail_rate=args.fail_rate)
+        print(f"[cloud-asr] mock server on {server.url} (latency {args.latency}s, fail rate {args.fail_rate})")
+        try:
+            server._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if not args.url:
+        parser.error("give --mock or --url")
+    if args.file:
+        from audio_io import load_audio
+        audio = load_audio(args.file)
+    else:
+        audio = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    client = CloudASRClient(args.url, args.provider, read_timeout=args.timeout, deadline=args.timeout)
+    for i in range(args.repeat):
+        t0 = time.perf_counter()
+        try:
+            text, lang = client.transcribe(audio, args.lang)
+            print(f"[cloud-asr] {(time.perf_counter() - t0) * 1000:.0f} ms: {text!r} ({lang})")
+        except CloudASRError as e:
+            print(f"[cloud-asr] {(time.perf_counter() - t0) * 1000:.0f} ms: failed: {e}")
+    print("[cloud-asr] client stats:", client.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,121 @@
 # data_loader.py
 import pandas as pd
+import os
+import threading
+import dataset_connector
 
-# Load dataset once at startup
+# Storage backend: "pandas" (whole CSV in memory) or "sqlite" (indexed
+# on-disk table, see sqlite_store.py - for datasets too large for a frame).
+# A worker process can also install shared_store's columns (use_store()).
+BACKEND = os.environ.get("CROP_DATA_BACKEND", "pandas").strip().lower()
+
+# Dataset frame, loaded on first use
 DATA_PATH = "Final_Dataset_2.csv"
-df = pd.read_csv(DATA_PATH)
+df = None
+_store = None
+_df_lock = threading.Lock()
+
+# Query arguments -> dataset columns
+FILTER_COLUMNS = {"district": "District_Name", "crop": "Crop", "year": "Year", "month": "Month"}
+
+if BACKEND == "sqlite":
+    import sqlite_store
+    _store = sqlite_store.get_store()
+
+def _read_frame():
+    frame = pd.read_csv(DATA_PATH)
+
+    # Rows ingested since the last compaction (see dataset_ingest.py)
+    if os.path.exists(dataset_connector.DELTA_PATH):
+        frame = pd.concat([frame, pd.read_csv(dataset_connector.DELTA_PATH)], ignore_index=True)
+
+    # Clean columns if needed (strip spaces, lowercasing col names)
+    frame.columns = [c.strip() for c in frame.columns]
+    return frame
+
+def get_frame():
+    """The dataset frame, read from the CSV once per process unless one was installed."""
+    global df
+    if df is None:
+        with dataset_connector.load_lock(), _df_lock:   # not between an ingest's delta write and append
+            if df is None:
+                df = _read_frame()
+    return df
+
+def use_store(store):
+    """
+    Install a query backend with sqlite_store.SQLiteStore's query / latest /
+    average / append interface (e.g. shared_store.SharedColumns in a worker)
+    instead of the frame. A configured sqlite backend is kept.
+    """
+    global _store
+    with _df_lock:
+        if _store is None:
+            _store = store
+
+@dataset_connector.on_append
+def _append_to_df(new_rows):
+    """Pick up ingested rows: build the extended frame, then swap the global."""
+    global df
+    if _store is not None:
+        _store.append(new_rows)
+        return
+    if df is None:
+        return      # not loaded yet: the first get_frame() reads the delta file
+    extra = pd.DataFrame(list(new_rows))
+    extra.columns = [c.strip() for c in extra.columns]
+    for c in extra.columns:
+        if c in df.columns and pd.api.types.is_numeric_dtype(df[c]):
+            extra[c] = pd.to_numeric(extra[c], errors="coerce")
+    df = pd.concat([df, extra], ignore_index=True)
 
-# Clean columns if needed (strip spaces, lowercasing col names)
-df.columns = [c.strip() for c in df.columns]
+def _column(data, name):
+    """Actual column for `name` in the frame (case-insensitive), or None."""
+    lookup = {c.lower(): c for c in data.columns}
+    return lookup.get(str(name).strip().lower())
 
 def get_crop_data(district=None, crop=None, year=None, month=None):
     """
     Filter dataset by district, crop, year, month.
     Returns a subset dataframe (can be empty if no match).
+    Year / month are ignored when the dataset has no such columns.
     """
-    data = df.copy()
+    if _store is not None:
+        cols, rows = _store.query(district=district, crop=crop)
+        return pd.DataFrame.from_records(rows, columns=cols)
 
-    if district:
-        data = data[data["district"].str.lower() == district.lower()]
-    if crop and "crop" in data.columns:
-        data = data[data["crop"].str.lower() == crop.lower()]
-    if year and "year" in data.columns:
-        data = data[data["year"] == int(year)]
-    if month and "month" in data.columns:
-        data = data[data["month"] == int(month)]
+    data = get_frame()
+    for arg, value in (("district", district), ("crop", crop)):
+        col = _column(data, FILTER_COLUMNS[arg])
+        if value and col:
+            data = data[data[col].astype(str).str.strip().str.lower() == str(value).strip().lower()]
+    for arg, value in (("year", year), ("month", month)):
+        col = _column(data, FILTER_COLUMNS[arg])
+        if value and col:
+            data = data[data[col] == int(value)]
 
-    return data
+    return data.copy()
 
 def get_latest_value(district, column):
     """
     Get the most recent value for a given column in a district.
     """
+    if _store is not None:
+        return _store.latest(column, district=district)
     data = get_crop_data(district=district)
-    if data.empty or column not in data.columns:
+    col = _column(data, column)
+    if data.empty or col is None:
         return None
-    return data.iloc[-1][column]
+    return data.iloc[-1][col]
 
 def get_average(district, column):
     """
     Get average value for a column in a district.
     """
+    if _store is not None:
+        return _store.average(column, district=district)
     data = get_crop_data(district=district)
-    if data.empty or column not in data.columns:
+    col = _column(data, column)
+    if data.empty or col is None:
         return None
-    return round(data[column].astype(float).mean(), 2)
+    return round(pd.to_numeric(data[col], errors="coerce").mean(), 2)
@@ -1,91 +1,408 @@
 import csv
 import os
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+
+from metrics import timed
 
 # Path to your dataset (Final_Dataset_2.csv in same folder)
 DATASET_PATH = os.path.join(os.path.dirname(__file__), "Final_Dataset_2.csv")
 
-# Cache for loaded rows
-_dataset_cache = []
+# Append-only log of rows ingested since the last compaction (dataset_ingest.py)
+DELTA_PATH = os.path.splitext(DATASET_PATH)[0] + ".delta.csv"
 
-# dataset_connector.py (add at bottom)
+# Cache for loaded rows (filled once, under _load_lock). The lock is
+# re-entrant: dataset_ingest holds it across writing delta rows and
+# append_rows() (see load_lock()).
+_dataset_cache = []
+_load_lock = threading.RLock()
 
-# Simple dictionaries for translating placeholders
+# Translations for categorical values: field -> English value -> {lang: label}
 TRANSLATIONS = {
-    "hi": {
-        "district": {
-            "Jodhpur": "जोधपुर",
-            "Kolhapur": "कोल्हापुर",
-            "Pune": "पुणे",
-        },
-        "crop": {
-            "Bajra": "बाजरा",
-            "Maize": "मक्का",
-        },
-        "soil": {
-            "Pale Yellow": "फीका पीला",
-            "Light Brown": "हल्का भूरा",
-            "Yellow Brown": "पीला-भूरा",
-            "Sandy Brown": "रेतीला भूरा",
-            "Dark Brown": "गहरा भूरा",
-        },
+    "soil": {
+        "Black": {"hi": "काली", "mr": "काळी"},
+        "Red": {"hi": "लाल", "mr": "लाल"},
+        "Pale Yellow": {"hi": "फीका पीला", "mr": "फिकट पिवळा"},
+        "Light Brown": {"hi": "हल्का भूरा", "mr": "फिकट तपकिरी"},
+        "Medium Brown": {"hi": "मध्यम भूरा", "mr": "मध्यम तपकिरी"},
+        "Yellow Brown": {"hi": "पीला भूरा", "mr": "पिवळसर तपकिरी"},
+        "Sandy Brown": {"hi": "रेतीला भूरा", "mr": "वालुकामय तपकिरी"},
+        "Dark Brown": {"hi": "गहरा भूरा", "mr": "गडद तपकिरी"},
+        "Desert Sand": {"hi": "रेगिस्तानी रेत", "mr": "वाळवंटी वाळू"},
     },
-    "mr": {
-        "district": {
-            "Jodhpur": "जोधपूर",
-            "Kolhapur": "कोल्हापूर",
-            "Pune": "पुणे",
-        },
-        "crop": {
-            "Bajra": "बाजरी",
-            "Maize": "मका",
-        },
-        "soil": {
-            "Pale Yellow": "फिकट पिवळा",
-            "Light Brown": "फिकट तपकिरी",
-            "Yellow Brown": "पिवळट तपकिरी",
-            "Sandy Brown": "वालुकामय तपकिरी",
-            "Dark Brown": "गडद तपकिरी",
-        },
+    "district": {
+        "Jodhpur": {"hi": "जोधपुर", "mr": "जोधपूर"},
+        "Kolhapur": {"hi": "कोल्हापुर", "mr": "कोल्हापूर"},
+        "Satara": {"hi": "सातारा", "mr": "सातारा"},
+        "Pune": {"hi": "पुणे", "mr": "पुणे"},
+    },
+    "crop": {
+        "Bajra": {"hi": "बाजरा", "mr": "बाजरी"},
+        "Maize": {"hi": "मक्का", "mr": "मका"},
+        "Jowar": {"hi": "ज्वार", "mr": "ज्वारी"},
+        "Wheat": {"hi": "गेहूं", "mr": "गहू"},
+        "Rice": {"hi": "धान", "mr": "भात"},
+        "Sugarcane": {"hi": "गन्ना", "mr": "ऊस"},
+        "Cotton": {"hi": "कपास", "mr": "कापूस"},
+        "Soybean": {"hi": "सोयाबीन", "mr": "सोयाबीन"},
+        "Groundnut": {"hi": "मूंगफली", "mr": "भुईमूग"},
+        "Ginger": {"hi": "अदरक", "mr": "आले"},
+        "Turmeric": {"hi": "हल्दी", "mr": "हळद"},
+        "Chickpea": {"hi": "चना", "mr": "हरभरा"},
+        "Gram": {"hi": "चना", "mr": "हरभरा"},
+        "Tur": {"hi": "अरहर", "mr": "तूर"},
+        "Moong": {"hi": "मूंग", "mr": "मूग"},
+        "Urad": {"hi": "उड़द", "mr": "उडीद"},
+        "Masoor": {"hi": "मसूर", "mr": "मसूर"},
+        "Moth": {"hi": "मोठ", "mr": "मटकी"},
+        "Mustard": {"hi": "सरसों", "mr": "मोहरी"},
+        "Sesame": {"hi": "तिल", "mr": "तीळ"},
+        "Cumin": {"hi": "जीरा", "mr": "जिरे"},
+        "Guar": {"hi": "ग्वार", "mr": "गवार"},
+        "Isabgol": {"hi": "इसबगोल", "mr": "इसबगोल"},
+    },
+    "fertilizer": {
+        "DAP": {"hi": "डीएपी", "mr": "डीएपी"},
+        "Urea": {"hi": "यूरिया", "mr": "युरिया"},
+        "Compost": {"hi": "खाद", "mr": "खत"},
+        "MOP": {"hi": "एमओपी", "mr": "एमओपी"},
+        "SSP": {"hi": "एसएसपी", "mr": "एसएसपी"},
+        "NPK": {"hi": "एनपीके", "mr": "एनपीके"},
+        "FYM": {"hi": "गोबर खाद", "mr": "गोठ्यातील खत"},
+        "Vermicompost": {"hi": "वर्मी कम्पोस्ट", "mr": "वर्मी कम्पोस्ट"},
+        "Ammonium Sulphate": {"hi": "अमोनियम सल्फेट", "mr": "अमोनियम सल्फेट"},
+        "Magnesium Sulphate": {"hi": "मैग्नीशियम सल्फेट", "mr": "मॅग्नेशियम सल्फेट"},
+        "Zinc Sulphate": {"hi": "जिंक सल्फेट", "mr": "झिंक सल्फेट"},
+        "Ferrous Sulphate": {"hi": "फेरस सल्फेट", "mr": "फेरस सल्फेट"},
+        "Gypsum": {"hi": "जिप्सम", "mr": "जिप्सम"},
+        "Sulphur": {"hi": "गंधक", "mr": "गंधक"},
+        "White Potash": {"hi": "सफेद पोटाश", "mr": "पांढरे पोटॅश"},
+        "Chilated Micronutrient": {"hi": "चिलेटेड सूक्ष्म पोषक", "mr": "चिलेटेड सूक्ष्म अन्नद्रव्ये"},
     },
 }
 
-def localize_row(row_dict, lang_code="en"):
+LANGS = ("en", "hi", "mr")
+LOCALIZED_FIELDS = ("district", "crop", "soil", "fertilizer")
+
+
+class LabelTable:
     """
-    Translate district/crop/soil fields if lang_code is hi/mr.
+    code -> {en, hi, mr} labels for one categorical column, built once at load.
+    Values with no translation keep their English label and are listed in `missing`.
     """
-    lang = "hi" if str(lang_code).startswith("hi") else "mr" if str(lang_code).startswith("mr") else "en"
-    if lang == "en":
-        return row_dict  # no change
 
-    translated = dict(row_dict)
-    for field in ["district", "crop", "soil"]:
-        original = row_dict.get(field, "")
-        mapping = TRANSLATIONS.get(lang, {}).get(field, {})
-        if original in mapping:
-            translated[field] = mapping[original]
-    return translated
+    def __init__(self, field):
+        self.field = field
+        self.codes = {}     # English value -> code
+        self.labels = []    # code -> (en, hi, mr)
+        self.missing = set()
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.labels)
+            key = str(value).strip()
+            tr = TRANSLATIONS.get(self.field, {}).get(key) or _translate_grade(key)
+            if tr is None:
+                tr = {}
+                self.missing.add(value)
+            self.labels.append(tuple(tr.get(lang, value) if lang != "en" else value for lang in LANGS))
+        return code
+
+
+def _translate_grade(value):
+    """'19:19:19 NPK' style grades: numbers stay, the NPK suffix is localized."""
+    parts = str(value).split()
+    if len(parts) == 2 and parts[1] in TRANSLATIONS["fertilizer"] and ":" in parts[0]:
+        suffix = TRANSLATIONS["fertilizer"][parts[1]]
+        return {lang: f"{parts[0]} {label}" for lang, label in suffix.items()}
+    return None
+
+
+def translate_value(field, value, lang="en"):
+    """Label for one categorical value in lang (English value if untranslated)."""
+    if lang not in ("hi", "mr"):
+        return value
+    key = str(value).strip()
+    tr = TRANSLATIONS.get(field, {}).get(key) or (_translate_grade(key) if field == "fertilizer" else None)
+    return (tr or {}).get(lang, value)
+
+
+class LocalizedRow(Mapping):
+    """
+    Read-only view of one normalized dataset row in one language.
+    Categorical fields resolve through the label tables (an index lookup);
+    everything else comes from the shared normalized row. Nothing is copied.
+    """
+    __slots__ = ("_i", "_lang")
+
+    def __init__(self, index, lang="en"):
+        self._i = index
+        self._lang = LANGS.index(lang) if lang in LANGS else 0
+
+    @property
+    def lang(self):
+        return LANGS[self._lang]
+
+    def with_lang(self, lang):
+        return LocalizedRow(self._i, lang)
+
+    def dataset_row(self):
+        """The underlying dataset row (CSV column names, English values)."""
+        return load_dataset()[self._i]
+
+    def __getitem__(self, key):
+        normalized, codes, tables = _localization
+        table = tables.get(key)
+        if table is not None:
+            return table.labels[codes[key][self._i]][self._lang]
+        if key in ESTIMATE_FIELDS:
+            est = row_estimate(self._i)
+            if est is not None:
+                return est[key]
+        return normalized[self._i][key]
+
+    def __iter__(self):
+        return iter(_localization[0][self._i])
+
+    def __len__(self):
+        return len(_localization[0][self._i])
+
+    def __repr__(self):
+        return f"LocalizedRow({dict(self)!r})"
+
+
+# Built by load_dataset(): normalized rows, per-field int32 code arrays and
+# label tables, replaced as one tuple
+_localization = ([], {}, {})
+
+
+def build_localization(rows):
+    """(normalized rows, {field: int32 codes}, label tables) for rows."""
+    tables = {f: LabelTable(f) for f in LOCALIZED_FIELDS}
+    normalized = [normalize_row(row) for row in rows]
+    codes = {f: np.fromiter((tables[f].encode(nr[f]) for nr in normalized), dtype=np.int32,
+                            count=len(normalized))
+             for f in LOCALIZED_FIELDS}
+    return normalized, codes, tables
 
-def load_dataset():
-    """Load the CSV once into memory."""
-    global _dataset_cache
-    if _dataset_cache:
-        return _dataset_cache
 
+def _use_localization(localization):
+    global _localization
+    _localization = localization
+    report = coverage_report()
+    if report:
+        print("[dataset] Untranslated values (shown in English):",
+              "; ".join(f"{f}: {', '.join(sorted(v))}" for f, v in report.items()))
+
+
+# Model yield / interval estimates per row, replacing normalize_row's
+# heuristic yield / confidence: (model, pred, low, high, conf) arrays, NaN =
+# not predicted yet. Rows are predicted when first looked up (loading the
+# dataset never needs the model); the arrays belong to one model and are
+# dropped when another one is installed.
+ESTIMATE_FIELDS = ("yield", "yield_range", "confidence")
+_estimates = None
+_estimates_lock = threading.Lock()
+_no_model_reported = False
+
+
+def _current_model():
+    """The loaded model, or None (reported once) if there is no trained model."""
+    global _no_model_reported
     try:
-        with open(DATASET_PATH, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            _dataset_cache = [row for row in reader]
+        from ml_connector import get_model_and_encoder
+        return get_model_and_encoder()[0]
     except Exception as e:
-        print(f"[ERROR] Could not load dataset: {e}")
-        _dataset_cache = []
+        if not _no_model_reported:
+            _no_model_reported = True
+            print("[dataset] Model estimates unavailable, using heuristic yield:", e)
+        return None
+
+
+def _estimate_arrays(model, n):
+    """This model's estimate arrays, at least n long (NaN-padded for appended rows)."""
+    global _estimates
+    est = _estimates
+    if est is None or est[0] is not model or len(est[1]) < n:
+        with _estimates_lock:
+            est = _estimates
+            if est is None or est[0] is not model:
+                est = (model,) + tuple(np.full(n, np.nan) for _ in range(4))
+            elif len(est[1]) < n:
+                est = (model,) + tuple(np.concatenate([a, np.full(n - len(a), np.nan)]) for a in est[1:])
+            _estimates = est
+    return est
+
+
+def warm_estimates(indices=None):
+    """
+    Predict every row in indices (default: all) that has no estimate yet for
+    the current model, in one batched call. Returns (pred, low, high, conf)
+    arrays over all rows, or None without a model.
+    """
+    model = _current_model()
+    if model is None:
+        return None
+    rows = load_dataset()
+    est = _estimate_arrays(model, len(rows))
+    idx = np.arange(len(rows)) if indices is None else np.asarray(indices, dtype=np.int64)
+    missing = idx[np.isnan(est[1][idx])]
+    if missing.size:
+        from ml_connector import predict_interval_batch
+        pred, low, high, conf = predict_interval_batch([rows[i] for i in missing])
+        for arr, values in zip(est[1:], (pred, low, high, conf)):
+            arr[missing] = values
+    return est[1:]
+
+
+def use_estimates(pred, low, high, conf):
+    """Install estimates computed elsewhere for the current model (e.g. shared_store columns)."""
+    global _estimates
+    model = _current_model()
+    if model is not None:
+        with _estimates_lock:
+            _estimates = (model, pred, low, high, conf)
+
+
+def row_estimate(i):
+    """{yield, yield_range, confidence} strings from the model for dataset row i, or None."""
+    est = warm_estimates([i])
+    if est is None or np.isnan(est[0][i]):
+        return None
+    pred, low, high, conf = (float(a[i]) for a in est)
+    return {"yield": f"{pred:.2f} quintals/acre", "yield_range": f"{low:.2f}-{high:.2f}",
+            "confidence": str(int(conf))}
+
+
+def coverage_report():
+    """field -> sorted list of dataset values with no hi/mr translation."""
+    return {f: sorted(t.missing) for f, t in _localization[2].items() if t.missing}
 
-    return _dataset_cache
+
+def localize_row(row, lang="en"):
+    """
+    Return row in lang (en/hi/mr). Rows from lookup_dataset are LocalizedRow
+    views and are re-targeted without copying; plain dicts are translated.
+    """
+    if isinstance(row, LocalizedRow):
+        return row.with_lang(lang)
+    if lang not in ("hi", "mr"):
+        return row  # English = default
+    new_row = dict(row)
+    for field in LOCALIZED_FIELDS:
+        tr = TRANSLATIONS[field].get(row.get(field))
+        if tr:
+            new_row[field] = tr.get(lang, row[field])
+    return new_row
+
+
+def read_rows(path):
+    """Rows of a CSV file as dicts ([] if the file does not exist)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [row for row in csv.DictReader(f)]
 
 
-def lookup_dataset(intent, district=None, crop=None):
+def load_lock():
+    """
+    The dataset load lock. First loads of the CSV + delta log (here, in
+    data_loader and templates) hold it, and so does dataset_ingest across
+    writing delta rows and appending them in memory, so every reader sees
+    an ingested row exactly once: from the delta file or through on_append.
+    """
+    return _load_lock
+
+
+def load_dataset():
+    """Load the CSV (plus any not-yet-compacted delta rows) once into memory."""
+    global _dataset_cache
+    rows = _dataset_cache
+    if rows:
+        return rows
+
+    with _load_lock:
+        if _dataset_cache:
+            return _dataset_cache   # loaded by a concurrent caller
+        try:
+            with open(DATASET_PATH, "r", encoding="utf-8") as f:
+                reader = csv.DictReader(f)
+                rows = [row for row in reader]
+            rows += read_rows(DELTA_PATH)
+        except Exception as e:
+            print(f"[ERROR] Could not load dataset: {e}")
+            rows = []
+
+        # localization first, then publish the rows: a reader that sees rows
+        # can always resolve LocalizedRow indices
+        _use_localization(build_localization(rows))
+        _dataset_cache = rows
+    return rows
+
+
+_append_lock = threading.Lock()
+_append_listeners = []
+
+
+def on_append(callback):
+    """Register callback(new_rows) run after rows are appended in memory."""
+    _append_listeners.append(callback)
+    return callback
+
+
+def append_rows(rows):
+    """
+    Append new rows to the in-memory dataset without a reload. New lists of
+    normalized rows / label codes are built and swapped in as one
+    _localization tuple before the extended row list is published, so a
+    concurrent reader never sees a row whose localization is missing, and a
+    reader iterating an old list never sees it change. Label tables only
+    ever gain codes (existing codes keep their labels). Listeners update
+    their own caches.
+    """
+    global _dataset_cache, _localization
+    rows = list(rows)
+    if not rows:
+        return 0
+    load_dataset()
+    normalized = [normalize_row(row) for row in rows]
+    with _append_lock:
+        norm_rows, codes, tables = _localization
+        new_codes = {f: np.concatenate([codes[f], np.array([tables[f].encode(nr[f]) for nr in normalized],
+                                                           dtype=np.int32)])
+                     for f in LOCALIZED_FIELDS}
+        _localization = (list(norm_rows) + normalized, new_codes, tables)
+        _dataset_cache = list(_dataset_cache) + rows
+    for callback in list(_append_listeners):
+        try:
+            callback(rows)
+        except Exception as e:
+            print("[dataset] append listener failed:", e)
+    return len(rows)
+
+
+def use_rows(rows, localization=None):
+    """
+    Install an already-loaded row sequence (e.g. shared_store.SharedRows in a
+    worker process) instead of parsing the CSV. localization: the rows'
+    build_localization() result if it was built elsewhere (shared_store's
+    parent), else it is built here.
+    """
+    global _dataset_cache
+    with _load_lock:
+        _use_localization(localization or build_localization(rows))
+        _dataset_cache = rows
+
+
+@timed("lookup_dataset")
+def lookup_dataset(intent, district=None, crop=None, lang="en"):
     """
     Look up dataset values for district & crop.
-    Returns dict with placeholders for templates.
+    Returns a read-only mapping of template placeholders, already localized
+    to lang (see LocalizedRow), or {} if the dataset is empty.
     """
     rows = load_dataset()
 
@@ -93,23 +410,23 @@ def lookup_dataset(intent, district=None, crop=None):
     crop = (crop or "").strip().lower()
 
     # 1. Exact match: district + crop
-    for row in rows:
+    for i, row in enumerate(rows):
         if (row.get("District_Name", "").strip().lower() == district and
                 row.get("Crop", "").strip().lower() == crop):
-            return normalize_row(row)
+            return LocalizedRow(i, lang)
 
     # 2. Match by district only
-    for row in rows:
+    for i, row in enumerate(rows):
         if row.get("District_Name", "").strip().lower() == district:
-            return normalize_row(row)
+            return LocalizedRow(i, lang)
 
     # 3. Match by crop only
-    for row in rows:
+    for i, row in enumerate(rows):
         if row.get("Crop", "").strip().lower() == crop:
-            return normalize_row(row)
+            return LocalizedRow(i, lang)
 
     # 4. Default → first row
-    return normalize_row(rows[0]) if rows else {}
+    return LocalizedRow(0, lang) if rows else {}
 def safe_value(val, default):
     if not val or str(val).strip().upper() in ("N/A", "NA", "UNKNOWN", "NULL", "NONE", "0"):
         return default
@@ -143,7 +460,7 @@ def normalize_row(row):
     yield_estimate = round((rainfall * 0.02) + (nitrogen + phosphorus + potassium) / 100, 2)
     yield_text = f"{yield_estimate} quintals/acre" if yield_estimate > 0 else "Data not available"
 
-    # --- Confidence ---
+    # --- Confidence (fallback; replaced by the model's interval, see row_estimate) ---
     if 100 <= nitrogen <= 200 and 10 <= phosphorus <= 30 and 150 <= potassium <= 300:
         confidence = "High"
     elif nitrogen and phosphorus and potassium:
@@ -168,55 +485,3 @@ def normalize_row(row):
     "confidence": safe_value(confidence, "Medium"),
 }
 
-
-
-
-TRANSLATIONS = {
-    "soil": {
-        "Pale Yellow": {"hi": "फीका पीला", "mr": "फिकट पिवळा"},
-        "Light Brown": {"hi": "हल्का भूरा", "mr": "फिकट तपकिरी"},
-        "Yellow Brown": {"hi": "पीला भूरा", "mr": "पिवळसर तपकिरी"},
-        "Sandy Brown": {"hi": "रेतीला भूरा", "mr": "वालुकामय तपकिरी"},
-        "Dark Brown": {"hi": "गहरा भूरा", "mr": "गडद तपकिरी"},
-    },
-    "district": {
-        "Jodhpur": {"hi": "जोधपुर", "mr": "जोधपूर"},
-        "Kolhapur": {"hi": "कोल्हापुर", "mr": "कोल्हापूर"},
-        "Satara": {"hi": "सातारा", "mr": "सातारा"},
-    },
-    "crop": {
-        "Bajra": {"hi": "बाजरा", "mr": "बाजरी"},
-        "Maize": {"hi": "मक्का", "mr": "मका"},
-        "Jowar": {"hi": "ज्वार", "mr": "ज्वारी"},
-    },
-    "fertilizer": {
-        "DAP": {"hi": "डीएपी", "mr": "डीएपी"},
-        "Urea": {"hi": "यूरिया", "mr": "युरिया"},
-        "Compost": {"hi": "खाद", "mr": "खत"},
-        "MOP": {"hi": "एमओपी", "mr": "एमओपी"},
-        "FYM": {"hi": "गोबर खाद", "mr": "गोठ्यातील खत"},
-        "Vermicompost": {"hi": "वर्मी कम्पोस्ट", "mr": "वर्मी कम्पोस्ट"},
-    },
-}
-
-def localize_row(row, lang="en"):
-    """Return localized copy of row according to lang (en/hi/mr)."""
-    if lang not in ("hi", "mr"):
-        return row  # English = default
-    
-    new_row = row.copy()
-    # soil
-    if row.get("soil") in TRANSLATIONS["soil"]:
-        new_row["soil"] = TRANSLATIONS["soil"][row["soil"]].get(lang, row["soil"])
-    # district
-    if row.get("district") in TRANSLATIONS["district"]:
-        new_row["district"] = TRANSLATIONS["district"][row["district"]].get(lang, row["district"])
-    # crop
-    if row.get("crop") in TRANSLATIONS["crop"]:
-        new_row["crop"] = TRANSLATIONS["crop"][row["crop"]].get(lang, row["crop"])
-    # fertilizer
-    if row.get("fertilizer") in TRANSLATIONS["fertilizer"]:
-        new_row["fertilizer"] = TRANSLATIONS["fertilizer"][row["fertilizer"]].get(lang, row["fertilizer"])
-    
-    return new_row
-
@@ -0,0 +1,325 @@
+# dataset_ingest.py
+# Append-only incremental updates for the soil-test dataset.
+#
+# New rows are validated, appended (and fsynced) to a delta log next to the
+# main CSV, then applied in memory: dataset_connector rows/localization,
+# data_loader.df and voice_assistant's known lists are extended through
+# dataset_connector.on_append listeners - no restart, no full reload.
+# A background compactor folds the delta log into the main CSV.
+#
+# Readers use snapshot(): an immutable view (row count, vocabularies and
+# per-(district, crop) aggregates) swapped in atomically after each batch.
+#
+#   python dataset_ingest.py --watch inbox/        # ingest CSVs dropped here
+#   python dataset_ingest.py --add new_rows.csv     # one-off ingest
+#   python dataset_ingest.py --compact
+
+import argparse
+import csv
+import os
+import shutil
+import threading
+import time
+
+import dataset_connector
+
+NUMERIC_COLUMNS = ("Nitrogen", "Phosphorus", "Potassium", "pH", "Rainfall", "Temperature")
+REQUIRED_COLUMNS = ("District_Name", "Crop")
+
+
+def _header(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return next(csv.reader(f))
+
+
+class Snapshot:
+    """
+    Immutable dataset summary: row count, version, district/crop vocabularies
+    and per-(district, crop) count + numeric sums. extend() returns a new
+    Snapshot; only the touched aggregate entries are rebuilt.
+    """
+    __slots__ = ("version", "n_rows", "districts", "crops", "aggregates")
+
+    def __init__(self, version, n_rows, districts, crops, aggregates):
+        self.version = version
+        self.n_rows = n_rows
+        self.districts = districts      # frozenset
+        self.crops = crops              # frozenset
+        self.aggregates = aggregates    # (district, crop) -> (count, {col: (sum, n)})
+
+    @classmethod
+    def empty(cls):
+        return cls(0, 0, frozenset(), frozenset(), {})
+
+    def extend(self, rows):
+        aggs = dict(self.aggregates)
+        districts, crops = set(self.districts), set(self.crops)
+        for r in rows:
+            d = (r.get("District_Name") or "").strip()
+            c = (r.get("Crop") or "").strip()
+            districts.add(d)
+            crops.add(c)
+            count, sums = aggs.get((d, c), (0, {}))
+            sums = dict(sums)
+            for col in NUMERIC_COLUMNS:
+                try:
+                    v = float(r.get(col, ""))
+                except (TypeError, ValueError):
+                    continue
+                s, n = sums.get(col, (0.0, 0))
+                sums[col] = (s + v, n + 1)
+            aggs[(d, c)] = (count + 1, sums)
+        return Snapshot(self.version + 1, self.n_rows + len(rows),
+                        frozenset(districts), frozenset(crops), aggs)
+
+    def mean(self, district, crop, column):
+        entry = self.aggregates.get((district, crop))
+        if not entry or column not in entry[1]:
+            return None
+        s, n = entry[1][column]
+        return round(s / n, 2) if n else None
+
+
+class DatasetIngestor:
+    """
+    ingest(rows) -> appends to the delta log and applies rows in memory.
+    compact() folds the delta log into the main CSV (atomic replace).
+    start_compactor() runs compact() in a background thread when the delta
+    log reaches `compact_every` rows or `compact_interval` seconds.
+    """
+
+    def __init__(self, csv_path=None, delta_path=None, compact_every=500, compact_interval=600):
+        self.csv_path = csv_path or dataset_connector.DATASET_PATH
+        self.delta_path = delta_path or dataset_connector.DELTA_PATH
+        self.header = _header(self.csv_path)
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self._lock = threading.Lock()     # serializes writers (ingest / compact)
+        self._pending = len(dataset_connector.read_rows(self.delta_path))
+        self._stop = threading.Event()
+        self._compactor = None
+        self._recover()
+        rows = dataset_connector.load_dataset()
+        self._snapshot = Snapshot.empty().extend(rows)
+
+    # ---------- readers ----------
+    def snapshot(self):
+        """Current immutable Snapshot (a single reference read)."""
+        return self._snapshot
+
+    # ---------- writers ----------
+    def validate(self, row):
+        """Return a row with exactly the dataset columns, or raise ValueError."""
+        clean = {}
+        for col in self.header:
+            v = row.get(col, "")
+            clean[col] = "" if v is None else str(v).strip()
+        for col in REQUIRED_COLUMNS:
+            if not clean.get(col):
+                raise ValueError(f"missing {col}")
+        for col in NUMERIC_COLUMNS:
+            if col in clean and clean[col]:
+                try:
+                    float(clean[col])
+                except ValueError:
+                    raise ValueError(f"{col} is not numeric: {clean[col]!r}")
+        return clean
+
+    def ingest(self, rows):
+        """Validate, append to the delta log, apply in memory. Returns (accepted, rejected)."""
+        accepted, rejected = [], []
+        for r in rows:
+            try:
+                accepted.append(self.validate(r))
+            except ValueError as e:
+                rejected.append((r, str(e)))
+        if not accepted:
+            return 0, rejected
+        # the load lock too: a reader's first load must not land between the
+        # delta write and append_rows(), or it would count these rows twice
+        with self._lock, dataset_connector.load_lock():
+            new_file = not os.path.exists(self.delta_path)
+            with open(self.delta_path, "a", newline="", encoding="utf-8") as f:
+                w = csv.DictWriter(f, fieldnames=self.header, lineterminator="\n")
+                if new_file:
+                    w.writeheader()
+                w.writerows(accepted)
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending += len(accepted)
+            dataset_connector.append_rows(accepted)
+            self._snapshot = self._snapshot.extend(accepted)
+        print(f"[ingest] +{len(accepted)} row(s), {len(rejected)} rejected "
+              f"(snapshot v{self._snapshot.version}, {self._snapshot.n_rows} rows)")
+        return len(accepted), rejected
+
+    def ingest_file(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return self.ingest(list(csv.DictReader(f)))
+
+    # ---------- compaction ----------
+    def _compacting_path(self):
+        return self.delta_path + ".compacting"
+
+    def _merge(self, compacting):
+        tmp = self.csv_path + ".tmp"
+        shutil.copyfile(self.csv_path, tmp)
+        extra = dataset_connector.read_rows(compacting)
+        with open(tmp, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            missing_newline = False
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                missing_newline = f.read(1) != b"\n"
+        with open(tmp, "a", newline="", encoding="utf-8") as f:
+            if missing_newline:
+                f.write("\n")
+            # LF rows, like the main CSV (csv's default terminator is CRLF)
+            csv.DictWriter(f, fieldnames=self.header, lineterminator="\n").writerows(
+                {k: r.get(k, "") for k in self.header} for r in extra)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.csv_path)
+        os.remove(compacting)
+        return len(extra)
+
+    def _recover(self):
+        """Finish (or discard) a compaction interrupted by a crash."""
+        compacting = self._compacting_path()
+        if not os.path.exists(compacting):
+            return
+        if os.path.getmtime(self.csv_path) > os.path.getmtime(compacting):
+            os.remove(compacting)      # main CSV already contains these rows
+        else:
+            self._merge(compacting)
+
+    def compact(self):
+        """Fold the delta log into the main CSV. In-memory data is unaffected."""
+        # a first load during the merge would see the rows in neither file
+        with self._lock, dataset_connector.load_lock():
+            if not os.path.exists(self.delta_path):
+                return 0
+            compacting = self._compacting_path()
+            os.replace(self.delta_path, compacting)   # new ingests start a fresh delta
+            self._pending = 0
+            n = self._merge(compacting)
+        print(f"[ingest] compacted {n} row(s) into {os.path.basename(self.csv_path)}")
+        return n
+
+    def start_compactor(self, poll=5.0):
+        def loop():
+            last = time.monotonic()
+            while not self._stop.wait(poll):
+                due = self._pending >= self.compact_every or \
+                    (self._pending and time.monotonic() - last >= self.compact_interval)
+                if due:
+                    try:
+                        self.compact()
+                    except Exception as e:
+                        print("[ingest] compaction failed:", e)
+                    last = time.monotonic()
+        self._compactor = threading.Thread(target=loop, name="dataset-compactor", daemon=True)
+        self._compactor.start()
+        return self._compactor
+
+    def stop(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+
+
+class InboxWatcher:
+    """
+    Polls a directory for new *.csv files, ingests each once it has stopped
+    growing, then moves it to <inbox>/processed (or <inbox>/rejected).
+    """
+
+    def __init__(self, ingestor, inbox, interval=2.0):
+        self.ingestor = ingestor
+        self.inbox = inbox
+        self.interval = interval
+        self._sizes = {}
+        self._stop = threading.Event()
+        self._thread = None
+        for sub in ("processed", "rejected"):
+            os.makedirs(os.path.join(inbox, sub), exist_ok=True)
+
+    def poll_once(self):
+        ingested = 0
+        for entry in sorted(os.scandir(self.inbox), key=lambda e: e.name):
+            if not entry.is_file() or not entry.name.endswith(".csv"):
+                continue
+            size = entry.stat().st_size
+            if self._sizes.get(entry.path) != size:
+                self._sizes[entry.path] = size   # still being written; check next poll
+                continue
+            self._sizes.pop(entry.path, None)
+            try:
+                n, rejected = self.ingestor.ingest_file(entry.path)
+                ingested += n
+                dest = "processed"
+                for row, err in rejected[:5]:
+                    print(f"[ingest] {entry.name}: rejected row ({err})")
+            except Exception as e:
+                print(f"[ingest] {entry.name}: failed ({e})")
+                dest = "rejected"
+            os.replace(entry.path, os.path.join(self.inbox, dest, entry.name))
+        return ingested
+
+    def start(self):
+        def loop():
+            while not self._stop.wait(self.interval):
+                self.poll_once()
+        self._thread = threading.Thread(target=loop, name="dataset-inbox", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_ingestor = None
+
+
+def get_ingestor():
+    global _ingestor
+    if _ingestor is None:
+        _ingestor = DatasetIngestor()
+    return _ingestor
+
+
+def ingest(rows):
+    """Module-level convenience: ingest rows into the default dataset."""
+    return get_ingestor().ingest(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental dataset ingest")
+    parser.add_argument("--add", nargs="*", default=[], help="CSV files to ingest once")
+    parser.add_argument("--watch", type=str, help="inbox directory to poll for new CSVs")
+    parser.add_argument("--interval", type=float, default=2.0)
+    parser.add_argument("--compact", action="store_true", help="fold the delta log into the main CSV")
+    args = parser.parse_args()
+
+    ing = get_ingestor()
+    for path in args.add:
+        ing.ingest_file(path)
+    if args.watch:
+        watcher = InboxWatcher(ing, args.watch, interval=args.interval)
+        ing.start_compactor()
+        watcher.start()
+        print(f"[ingest] watching {args.watch} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            watcher.stop()
+            ing.stop()
+    if args.compact:
+        ing.compact()
+
+
+if __name__ == "__main__":
+    main()
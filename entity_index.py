@@ -0,0 +1,189 @@
+# entity_index.py
+# Fuzzy lookup of district / crop names in (mis)recognized transcripts.
+#
+# Names and aliases (Latin and Devanagari) are folded - case, vowel length
+# (ी/ि, ू/ु), nukta, chandrabindu, doubled Latin letters and a few spelling
+# digraphs (ee/ea -> i, oo/ou -> u, w -> v, ph -> f) - and put in a character
+# bigram inverted index. A transcript's word spans (1..max_words words) are
+# looked up there: candidates must share the first letter and enough bigrams
+# for the edit bound (count filter), and only those are verified with a
+# banded Levenshtein. The bound grows with name length (0 edits up to 4
+# letters, 1 up to 6, 2 up to 9, then 3); names of 4+ letters also match the
+# start of a longer word, for suffixed forms like "कोल्हापूरमध्ये". Common
+# query words passed as stopwords ("what", "पाणी" ...) are never fuzzy-matched.
+#
+#   idx = EntityIndex.build([("district", "Kolhapur", ["kolhapur", "कोल्हापूर"]), ...])
+#   idx.find("Kolapur soyabin khat", "district")   # -> EntityMatch(district Kolhapur ...)
+
+import re
+import unicodedata
+
+_DEVANAGARI_FOLD = str.maketrans({"ी": "ि", "ू": "ु", "ँ": "ं", "़": None, "ॅ": None,
+                                  "‌": None, "‍": None})
+_LATIN_DIGRAPHS = (("ee", "i"), ("ea", "i"), ("oo", "u"), ("ou", "u"), ("ph", "f"), ("w", "v"))
+_DOUBLED = re.compile(r"([a-z])\1+")
+_WORD = re.compile(r"[a-z0-9ऀ-ॣ०-ॿ]+")
+
+
+def fold(text):
+    """Lowercased, spelling-folded form used for indexing and matching."""
+    t = unicodedata.normalize("NFC", text or "").lower().translate(_DEVANAGARI_FOLD)
+    for src, dst in _LATIN_DIGRAPHS:
+        t = t.replace(src, dst)
+    return _DOUBLED.sub(r"\1", t)
+
+
+def tokenize(text):
+    return _WORD.findall(fold(text))
+
+
+def max_edits(n):
+    """Edit-distance bound for a (folded) name of n characters."""
+    return 0 if n <= 4 else 1 if n <= 6 else 2 if n <= 9 else 3
+
+
+def bigrams(s, pad_end=True):
+    s = "^" + s + ("$" if pad_end else "")
+    return {s[i:i + 2] for i in range(len(s) - 1)}
+
+
+def bounded_distance(a, b, k, prefix=False):
+    """
+    Levenshtein distance a -> b if it is <= k, else k + 1 (banded, exits
+    early). prefix=True: distance from a to the closest prefix of b.
+    """
+    big = k + 1
+    n = len(a)
+    if prefix:
+        b = b[:n + k]
+    m = len(b)
+    if (abs(n - m) > k) if not prefix else (m < n - k):
+        return big
+    prev = [j if j <= k else big for j in range(m + 1)]
+    for i in range(1, n + 1):
+        lo, hi = max(1, i - k), min(m, i + k)
+        cur = [big] * (m + 1)
+        cur[0] = i if i <= k else big
+        ai = a[i - 1]
+        for j in range(lo, hi + 1):
+            d = prev[j - 1] + (ai != b[j - 1])
+            if prev[j] + 1 < d:
+                d = prev[j] + 1
+            if cur[j - 1] + 1 < d:
+                d = cur[j - 1] + 1
+            cur[j] = d
+        if min(cur[lo - 1:hi + 1]) > k:
+            return big
+        prev = cur
+    d = min(prev[max(0, n - k):]) if prefix else prev[m]
+    return d if d <= k else big
+
+
+class EntityMatch:
+    """kind ("district"/"crop"), canonical name, matched alias, transcript span, edit distance."""
+    __slots__ = ("kind", "canonical", "alias", "span", "distance")
+
+    def __init__(self, kind, canonical, alias, span, distance):
+        self.kind = kind
+        self.canonical = canonical
+        self.alias = alias
+        self.span = span
+        self.distance = distance
+
+    def __repr__(self):
+        return f"EntityMatch({self.kind} {self.canonical!r} <- {self.span!r}, distance {self.distance})"
+
+
+class EntityIndex:
+    """
+    Bigram inverted index over folded aliases. add() / build() fill it;
+    find(text, kind) returns the best EntityMatch (fewest edits, then the
+    longest alias) or None; find_all(text) does every kind in one pass.
+    stopwords: words that only ever match exactly.
+    """
+
+    def __init__(self, max_words=3, min_prefix_len=4, stopwords=()):
+        self.max_words = max_words
+        self.min_prefix_len = min_prefix_len
+        self.stopwords = {w for s in stopwords for w in tokenize(s)}
+        self._alias_words = 1       # longest alias, in words: spans never need to be longer
+        self._aliases = []          # (folded alias, kind, canonical, k, n_grams)
+        self._seen = set()
+        self._postings = {}         # bigram -> [alias id]
+        self._exact = {}            # folded alias -> [alias id]
+
+    @classmethod
+    def build(cls, entries, **kwargs):
+        """entries: iterable of (kind, canonical, [aliases]) - the canonical name is indexed too."""
+        idx = cls(**kwargs)
+        for kind, canonical, aliases in entries:
+            for alias in [canonical, *aliases]:
+                idx.add(alias, canonical, kind)
+        return idx
+
+    def __len__(self):
+        return len(self._aliases)
+
+    def add(self, alias, canonical, kind):
+        key = " ".join(tokenize(alias))
+        if not key or (key, kind) in self._seen:
+            return
+        self._seen.add((key, kind))
+        self._alias_words = max(self._alias_words, key.count(" ") + 1)
+        grams = bigrams(key)
+        i = len(self._aliases)
+        self._aliases.append((key, kind, canonical, max_edits(len(key)), len(grams)))
+        self._exact.setdefault(key, []).append(i)
+        for g in grams:
+            self._postings.setdefault(g, []).append(i)
+
+    def _spans(self, text):
+        words = tokenize(text)
+        for n in range(1, min(self.max_words, self._alias_words) + 1):
+            for s in range(len(words) - n + 1):
+                yield " ".join(words[s:s + n])
+
+    def _lookup(self, span, kinds, best):
+        for i in self._exact.get(span, ()):
+            key, kind, canonical, _, _ = self._aliases[i]
+            if kind in kinds:
+                self._offer(best, EntityMatch(kind, canonical, key, span, 0))
+        if span in self.stopwords:
+            return
+        counts = {}
+        postings = self._postings
+        for g in bigrams(span, pad_end=False):
+            for i in postings.get(g, ()):
+                counts[i] = counts.get(i, 0) + 1
+        first = span[0]
+        for i, shared in counts.items():
+            key, kind, canonical, k, n_grams = self._aliases[i]
+            if kind not in kinds or k == 0 or key[0] != first:   # k == 0: exact only (above)
+                continue
+            prefix = len(key) >= self.min_prefix_len and len(span) > len(key)
+            # each edit destroys at most 2 of the alias's bigrams (+1: the "$" gram in prefix mode)
+            if shared < n_grams - 2 * k - 1:
+                continue
+            current = best.get(kind)
+            if current is not None and current.distance == 0:
+                continue
+            d = bounded_distance(key, span, k, prefix=prefix)
+            if d <= k:
+                self._offer(best, EntityMatch(kind, canonical, key, span, d))
+
+    @staticmethod
+    def _offer(best, m):
+        cur = best.get(m.kind)
+        if cur is None or (m.distance, -len(m.alias)) < (cur.distance, -len(cur.alias)):
+            best[m.kind] = m
+
+    def find_all(self, text, kinds=("district", "crop")):
+        """{kind: EntityMatch} for every kind found in `text`."""
+        best = {}
+        kinds = set(kinds)
+        for span in self._spans(text):
+            self._lookup(span, kinds, best)
+        return best
+
+    def find(self, text, kind):
+        return self.find_all(text, (kind,)).get(kind)
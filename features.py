@@ -0,0 +1,246 @@
+# features.py
+# Versioned feature encoder shared by train_model.py and ml_connector.
+#
+# Maps dataset rows (any of the key spellings used in this repo: CSV columns,
+# templates' lowercased keys, normalize_row placeholders) or columnar blocks to
+# the model's feature matrix in one vectorized pass: numeric columns with
+# mean imputation, categoricals one-hot (or ordinal) encoded. Saved as JSON
+# next to the model and schema-checked against it at load time.
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+ENCODER_VERSION = 1
+
+NUMERIC_FEATURES = ("Nitrogen", "Phosphorus", "Potassium", "pH", "Rainfall", "Temperature")
+CATEGORICAL_FEATURES = ("District_Name", "Crop", "Fertilizer", "Soil_color")
+
+# Canonical column -> keys accepted in input rows (first match wins)
+FIELD_ALIASES = {
+    "Nitrogen": ("Nitrogen", "nitrogen", "n"),
+    "Phosphorus": ("Phosphorus", "phosphorus", "phosphorous", "p"),
+    "Potassium": ("Potassium", "potassium", "k"),
+    "pH": ("pH", "ph", "p_h"),
+    "Rainfall": ("Rainfall", "rainfall"),
+    "Temperature": ("Temperature", "temperature"),
+    "District_Name": ("District_Name", "district_name", "district"),
+    "Crop": ("Crop", "crop"),
+    "Fertilizer": ("Fertilizer", "fertilizer"),
+    "Soil_color": ("Soil_color", "Soil_Color", "soil_color", "soil"),
+}
+
+
+class SchemaError(ValueError):
+    """Encoder and model (or saved file) disagree about the feature layout."""
+
+
+def _lookup(row, column):
+    for key in FIELD_ALIASES.get(column, (column,)):
+        v = row.get(key)
+        if v is not None and v != "":
+            return v
+    return None
+
+
+def _to_float_array(values):
+    out = np.empty(len(values), dtype=np.float64)
+    for i, v in enumerate(values):
+        try:
+            out[i] = float(v)
+        except (TypeError, ValueError):
+            out[i] = np.nan
+    return out
+
+
+class FeatureEncoder:
+    """
+    numeric: ordered numeric column names.
+    categories: {column: [values]} in encoding order.
+    means: {numeric column: training mean} used to impute missing values.
+    encoding: "onehot" (default) or "ordinal" (one float code per column, -1 = unknown).
+    """
+
+    def __init__(self, numeric=NUMERIC_FEATURES, categories=None, means=None, encoding="onehot"):
+        self.version = ENCODER_VERSION
+        self.numeric = tuple(numeric)
+        self.categories = {c: list(v) for c, v in (categories or {}).items()}
+        self.means = dict(means or {})
+        self.encoding = encoding
+        self._index = {c: {v: i for i, v in enumerate(vals)} for c, vals in self.categories.items()}
+
+    # ---------- fitting ----------
+    @classmethod
+    def fit(cls, rows, numeric=NUMERIC_FEATURES, categorical=CATEGORICAL_FEATURES, encoding="onehot"):
+        block = cls.rows_to_columns(rows, list(numeric) + list(categorical))
+        categories = {c: sorted({str(v).strip() for v in block[c] if v is not None}) for c in categorical}
+        means = {}
+        for c in numeric:
+            col = _to_float_array(block[c])
+            means[c] = float(np.nanmean(col)) if np.isfinite(col).any() else 0.0
+        return cls(numeric, categories, means, encoding)
+
+    # ---------- schema ----------
+    @property
+    def feature_names(self):
+        names = list(self.numeric)
+        for c, vals in self.categories.items():
+            if self.encoding == "ordinal":
+                names.append(c)
+            else:
+                names += [f"{c}={v}" for v in vals]
+        return names
+
+    @property
+    def n_features(self):
+        return len(self.feature_names)
+
+    def schema_hash(self):
+        payload = json.dumps([self.version, self.encoding, self.feature_names], ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+    def check(self, model):
+        """Raise SchemaError unless the model expects exactly this feature layout."""
+        n = getattr(model, "n_features_in_", None)
+        if n is not None and n != self.n_features:
+            raise SchemaError(f"model expects {n} features, encoder produces {self.n_features} "
+                              f"(schema {self.schema_hash()})")
+        names = getattr(model, "feature_names_in_", None)
+        if names is not None and list(names) != self.feature_names:
+            raise SchemaError("model feature names differ from encoder schema")
+
+    # ---------- transform ----------
+    @staticmethod
+    def rows_to_columns(rows, columns):
+        """List of row mappings -> {canonical column: list of raw values}."""
+        return {c: [_lookup(r, c) for r in rows] for c in columns}
+
+    def transform(self, rows):
+        """Rows (dicts / mappings, any supported key spelling) -> 2D float64 matrix."""
+        if hasattr(rows, "get"):
+            rows = [rows]
+        cols = list(self.numeric) + list(self.categories)
+        return self.transform_columns(self.rows_to_columns(rows, cols))
+
+    def transform_columns(self, block):
+        """
+        Columnar block {column: array-like} -> feature matrix. Numeric columns
+        may already be float arrays (no per-value parsing then).
+        """
+        n = None
+        for c in list(self.numeric) + list(self.categories):
+            if c in block:
+                n = len(block[c])
+                break
+        if n is None:
+            raise SchemaError("block has none of the encoder's columns")
+
+        X = np.zeros((n, self.n_features), dtype=np.float64)
+        for j, c in enumerate(self.numeric):
+            raw = block.get(c)
+            if raw is None:
+                col = np.full(n, np.nan)
+            elif isinstance(raw, np.ndarray) and raw.dtype.kind in "fiu":
+                col = raw.astype(np.float64, copy=False)
+            else:
+                col = _to_float_array(raw)
+            X[:, j] = np.where(np.isnan(col), self.means.get(c, 0.0), col)
+
+        offset = len(self.numeric)
+        rows_idx = np.arange(n)
+        for c, vals in self.categories.items():
+            index = self._index[c]
+            raw = block.get(c)
+            if raw is None:
+                codes = np.full(n, -1, dtype=np.int64)
+            elif isinstance(raw, np.ndarray) and raw.dtype.kind in "iu":
+                codes = raw.astype(np.int64, copy=False)   # pre-encoded with this encoder
+            else:
+                codes = np.fromiter((index.get(str(v).strip(), -1) if v is not None else -1 for v in raw),
+                                    dtype=np.int64, count=n)
+            if self.encoding == "ordinal":
+                X[:, offset] = codes
+                offset += 1
+            else:
+                known = codes >= 0
+                X[rows_idx[known], offset + codes[known]] = 1.0
+                offset += len(vals)
+        return X
+
+    def _category_block(self, column):
+        """(first matrix column, width) of one categorical column's encoding."""
+        offset = len(self.numeric)
+        for c, vals in self.categories.items():
+            width = 1 if self.encoding == "ordinal" else len(vals)
+            if c == column:
+                return offset, width
+            offset += width
+        raise KeyError(column)
+
+    def category_codes(self, X, column):
+        """Recover int codes (-1 unknown) for one categorical column from an encoded matrix."""
+        offset, width = self._category_block(column)
+        block = X[:, offset:offset + width]
+        if self.encoding == "ordinal":
+            return block[:, 0].astype(np.int64)
+        codes = block.argmax(axis=1)
+        return np.where(block.max(axis=1) > 0, codes, -1)
+
+    def set_category(self, X, column, codes):
+        """Overwrite one categorical column of an encoded matrix in place with int codes (-1 unknown)."""
+        offset, width = self._category_block(column)
+        codes = np.broadcast_to(np.asarray(codes, dtype=np.int64), (X.shape[0],))
+        if self.encoding == "ordinal":
+            X[:, offset] = codes
+            return X
+        X[:, offset:offset + width] = 0.0
+        known = np.flatnonzero(codes >= 0)
+        X[known, offset + codes[known]] = 1.0
+        return X
+
+    def encode_category(self, column, values):
+        """Values -> int codes (-1 unknown), for building pre-encoded blocks."""
+        index = self._index[column]
+        return np.array([index.get(str(v).strip(), -1) for v in values], dtype=np.int64)
+
+    # ---------- persistence ----------
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "encoding": self.encoding,
+            "numeric": list(self.numeric),
+            "categories": self.categories,
+            "means": self.means,
+            "feature_names": self.feature_names,
+            "schema_hash": self.schema_hash(),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        if d.get("version") != ENCODER_VERSION:
+            raise SchemaError(f"encoder version {d.get('version')} != supported {ENCODER_VERSION}")
+        enc = cls(d["numeric"], d["categories"], d.get("means"), d.get("encoding", "onehot"))
+        if d.get("feature_names") and d["feature_names"] != enc.feature_names:
+            raise SchemaError("saved feature_names do not match rebuilt schema")
+        return enc
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def encoder_path(model_path):
+    """best_model.joblib -> best_model.features.json"""
+    return os.path.splitext(model_path)[0] + ".features.json"
+
+
+def residuals_path(model_path):
+    """best_model.joblib -> best_model.residuals.json (per-crop residual quantiles)"""
+    return os.path.splitext(model_path)[0] + ".residuals.json"
@@ -0,0 +1,306 @@
+# fertilizer_optimizer.py
+# NPK dose optimizer for fertilizer advice.
+#
+# For a dataset row (district / crop / measured soil N, P, K) it searches
+# product doses (kg/acre) that maximize the predicted yield gain net of
+# fertilizer cost. Each search generation - a coarse grid, then finer grids
+# around the best candidates - is written into one encoded matrix and scored
+# with a single batched model call; the search stops early when the latency
+# budget is spent.
+#
+# The search never takes soil N/P/K past the levels recorded for that crop in
+# that district (LIMIT_QUANTILE of the dataset rows; the crop's rows overall
+# when the district has too few): beyond them the model extrapolates, and a
+# model that is monotone in N/P/K would always "prefer" the largest dose.
+# A best dose that sits on one of these limits (or on max_dose) is reported
+# as limited (DoseAdvice.limited), not as an optimum.
+#
+# Nutrient contents are the product grades (N-P2O5-K2O %); added nutrient is
+# dose x 2.471 (acre -> ha) x content, on the same scale as the soil-test
+# columns. Prices are indicative Rs/kg and Rs/quintal - pass prices= /
+# crop_price= for local rates.
+#
+#   python fertilizer_optimizer.py Kolhapur Wheat --products Urea DAP MOP
+
+import argparse
+import itertools
+import threading
+import time
+
+import numpy as np
+
+import ml_connector
+from dataset_connector import load_dataset, lookup_dataset, on_append, translate_value
+from features import _lookup, _to_float_array
+
+ACRE_TO_HA = 2.471
+
+# product -> (N %, P2O5 %, K2O %)
+NUTRIENT_CONTENT = {
+    "Urea": (46, 0, 0),
+    "DAP": (18, 46, 0),
+    "MOP": (0, 0, 60),
+    "SSP": (0, 16, 0),
+    "Ammonium Sulphate": (20.6, 0, 0),
+    "10:26:26 NPK": (10, 26, 26),
+    "12:32:16 NPK": (12, 32, 16),
+    "19:19:19 NPK": (19, 19, 19),
+    "18:46:00 NPK": (18, 46, 0),
+}
+
+# Indicative retail prices, Rs/kg
+PRODUCT_PRICES = {
+    "Urea": 5.9,
+    "DAP": 27.0,
+    "MOP": 34.0,
+    "SSP": 10.0,
+    "Ammonium Sulphate": 20.0,
+    "10:26:26 NPK": 29.5,
+    "12:32:16 NPK": 29.0,
+    "19:19:19 NPK": 100.0,
+    "18:46:00 NPK": 27.0,
+}
+
+# Indicative farm-gate prices, Rs/quintal
+CROP_PRICES = {
+    "Wheat": 2275, "Rice": 2183, "Maize": 2090, "Jowar": 3180, "Bajra": 2500,
+    "Cotton": 6620, "Sugarcane": 315, "Groundnut": 6377, "Soybean": 4600,
+    "Chickpea": 5440, "Gram": 5440, "Tur": 7000, "Moong": 8558, "Urad": 6950,
+    "Masoor": 6425, "Mustard": 5650, "Sesame": 8635, "Cumin": 20000,
+    "Ginger": 4000, "Turmeric": 7000, "Guar": 5000, "Moth": 5000, "Isabgol": 12000,
+}
+DEFAULT_CROP_PRICE = 2500
+
+DEFAULT_PRODUCTS = ("Urea", "DAP", "MOP")
+UNITS = {"en": "kg/acre", "hi": "किलो/एकड़", "mr": "किलो/एकर"}
+NUTRIENT_COLUMNS = ("Nitrogen", "Phosphorus", "Potassium")
+
+# Upper soil N/P/K the search may reach: this quantile of the recorded rows
+# for the crop + district (crop only below MIN_LIMIT_ROWS rows)
+LIMIT_QUANTILE = 0.95
+MIN_LIMIT_ROWS = 20
+
+_limits_cache = {}    # (crop, district) -> array of N, P, K limits
+_limits_lock = threading.Lock()
+
+
+def nutrient_limits(crop, district=None):
+    """Highest typical soil N, P, K recorded for crop (in district); inf if unknown."""
+    key = (str(crop or "").strip().lower(), str(district or "").strip().lower())
+    limits = _limits_cache.get(key)
+    if limits is None:
+        rows = [r for r in load_dataset() if str(_lookup(r, "Crop") or "").strip().lower() == key[0]]
+        local = [r for r in rows if str(_lookup(r, "District_Name") or "").strip().lower() == key[1]]
+        rows = local if len(local) >= MIN_LIMIT_ROWS else rows
+        limits = np.full(len(NUTRIENT_COLUMNS), np.inf)
+        for j, c in enumerate(NUTRIENT_COLUMNS):
+            values = _to_float_array([_lookup(r, c) for r in rows])
+            values = values[np.isfinite(values)]
+            if values.size:
+                limits[j] = float(np.quantile(values, LIMIT_QUANTILE))
+        with _limits_lock:
+            _limits_cache[key] = limits
+    return limits
+
+
+@on_append
+def _reset_limits(new_rows):
+    """Ingested rows can move the recorded ranges: recompute on next use."""
+    with _limits_lock:
+        _limits_cache.clear()
+
+
+class DoseAdvice:
+    """
+    doses: {product: kg/acre} (zero doses dropped). base_yield / yield:
+    predicted quintals/acre without / with the doses. cost: Rs/acre.
+    net: yield gain x crop price - cost (Rs/acre). gain_per_100: quintals of
+    extra yield per Rs 100 spent. limited: search limits the dose sits on
+    (nutrient names at their recorded level, "<product> max dose") - the
+    model would take more, so this is a ceiling, not an optimum.
+    evaluated / generations / elapsed_ms: search effort.
+    """
+
+    def __init__(self, doses, base_yield, yield_, cost, crop_price, evaluated, generations, elapsed_ms,
+                 limited=()):
+        self.doses = {p: d for p, d in doses.items() if d > 0}
+        self.limited = tuple(limited)
+        self.base_yield = base_yield
+        self.yield_ = yield_
+        self.cost = cost
+        self.gain = yield_ - base_yield
+        self.net = self.gain * crop_price - cost
+        self.gain_per_100 = 100.0 * self.gain / cost if cost > 0 else 0.0
+        self.evaluated = evaluated
+        self.generations = generations
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def primary(self):
+        """Product supplying the largest dose (None if nothing is recommended)."""
+        return max(self.doses, key=self.doses.get) if self.doses else None
+
+    def dose_text(self, lang="en"):
+        unit = UNITS.get(lang, UNITS["en"])
+        return " + ".join(f"{translate_value('fertilizer', p, lang)} {d:g} {unit}"
+                          for p, d in sorted(self.doses.items(), key=lambda kv: -kv[1]))
+
+    def fill_values(self, lang="en"):
+        """Placeholders for templates.TEMPLATES["fertilizer_dose"]."""
+        return {
+            "dose": self.dose_text(lang),
+            "dose_cost": f"{self.cost:.0f}",
+            "dose_gain": f"{self.gain:.2f}",
+            "dose_yield": f"{self.yield_:.2f}",
+            "dose_net": f"{self.net:.0f}",
+        }
+
+    def __repr__(self):
+        limit = f", at search limit: {', '.join(self.limited)}" if self.limited else ""
+        return (f"DoseAdvice({self.dose_text() or 'no extra fertilizer'}, yield {self.base_yield:.2f}"
+                f"->{self.yield_:.2f}, cost Rs {self.cost:.0f}, net Rs {self.net:.0f}{limit}, "
+                f"{self.evaluated} candidates in {self.elapsed_ms:.1f} ms)")
+
+
+class DoseOptimizer:
+    """
+    Coarse-to-fine grid search over product doses, one batched prediction per
+    generation. The base row is encoded once; candidates only rewrite the
+    N/P/K columns and the Fertilizer category of a copy of it. Candidates
+    that would take soil N/P/K past nutrient_limits() are not considered.
+    """
+
+    def __init__(self, products=DEFAULT_PRODUCTS, max_dose=150.0, levels=6, keep=4,
+                 generations=4, step_round=5.0, prices=None):
+        unknown = [p for p in products if p not in NUTRIENT_CONTENT]
+        if unknown:
+            raise KeyError(f"No nutrient content for {', '.join(unknown)}")
+        self.products = list(products)
+        self.max_dose = float(max_dose)
+        self.levels = levels
+        self.keep = keep
+        self.generations = generations
+        self.step_round = step_round
+        price_table = dict(PRODUCT_PRICES, **(prices or {}))
+        self.prices = np.array([price_table[p] for p in self.products], dtype=np.float64)
+        # kg/acre of product -> soil-test nutrient units (kg/ha)
+        self.content = np.array([NUTRIENT_CONTENT[p] for p in self.products], dtype=np.float64) \
+            * ACRE_TO_HA / 100.0
+
+    def _score(self, model, encoder, x_base, cols, fert_codes, doses):
+        X = np.repeat(x_base[None, :], len(doses), axis=0)
+        X[:, cols] += doses @ self.content
+        dosed = doses.max(axis=1) > 0      # undosed rows keep the row's own fertilizer
+        if dosed.any():
+            sub = X[dosed]
+            encoder.set_category(sub, "Fertilizer", fert_codes[doses[dosed].argmax(axis=1)])
+            X[dosed] = sub
+        return model.predict(X)
+
+    def _caps(self, allowed):
+        """Per-product dose ceiling: max_dose, or less where a nutrient reaches its limit alone."""
+        caps = np.full(len(self.products), self.max_dose)
+        for j, content in enumerate(self.content):
+            supplied = content > 0
+            if supplied.any():
+                caps[j] = min(self.max_dose, float(np.min(allowed[supplied] / content[supplied])))
+        return caps
+
+    def optimize(self, row, crop_price=None, budget_ms=150.0):
+        t0 = time.perf_counter()
+        model, encoder = ml_connector.get_model_and_encoder()
+        x_base = encoder.transform([row])[0]
+        cols = [encoder.numeric.index(c) for c in NUTRIENT_COLUMNS]
+        fert_codes = encoder.encode_category("Fertilizer", self.products)
+        crop = _lookup(row, "Crop") or ""
+        if crop_price is None:
+            crop_price = CROP_PRICES.get(str(crop).strip(), DEFAULT_CROP_PRICE)
+        # nutrient headroom up to the recorded levels (none if already above)
+        allowed = np.maximum(nutrient_limits(crop, _lookup(row, "District_Name")) - x_base[cols], 0.0)
+        caps = self._caps(allowed)
+
+        def feasible(doses):
+            return np.all(doses @ self.content <= allowed + 1e-9, axis=1)
+
+        base_yield = float(model.predict(x_base[None, :])[0])
+        k = len(self.products)
+        step = caps / (self.levels - 1)
+        candidates = np.array(list(itertools.product(*(np.linspace(0, c, self.levels) for c in caps))))
+        candidates = np.unique(candidates[feasible(candidates)], axis=0)
+        evaluated, generations = 0, 0
+        best_doses, best_yield, best_net = np.zeros(k), base_yield, 0.0
+
+        while True:
+            yields = self._score(model, encoder, x_base, cols, fert_codes, candidates)
+            net = (yields - base_yield) * crop_price - candidates @ self.prices
+            evaluated += len(candidates)
+            generations += 1
+            i = int(net.argmax())
+            if net[i] > best_net:
+                best_doses, best_yield, best_net = candidates[i], float(yields[i]), float(net[i])
+            elapsed = (time.perf_counter() - t0) * 1000
+            if generations >= self.generations or elapsed >= budget_ms or step.max() <= self.step_round:
+                break
+            # next generation: finer grid around the best few candidates
+            step /= 2.0
+            elite = candidates[np.argsort(net)[::-1][:self.keep]]
+            offsets = np.array(list(itertools.product(*((-s, 0.0, s) for s in step))))
+            nxt = np.clip((elite[:, None, :] + offsets[None, :, :]).reshape(-1, k), 0, caps)
+            nxt = np.unique(np.round(nxt, 6), axis=0)
+            candidates = nxt[feasible(nxt)]
+
+        doses = np.round(best_doses / self.step_round) * self.step_round
+        if not feasible(doses[None, :])[0]:
+            doses = np.floor(best_doses / self.step_round) * self.step_round
+        if np.any(doses != best_doses):
+            # re-score the rounded (practical) dose once
+            best_yield = float(self._score(model, encoder, x_base, cols, fert_codes, doses[None, :])[0])
+        cost = float(doses @ self.prices)
+        return DoseAdvice(dict(zip(self.products, doses.tolist())), base_yield, best_yield, cost,
+                          crop_price, evaluated, generations, (time.perf_counter() - t0) * 1000,
+                          self._limited(doses, allowed))
+
+    def _limited(self, doses, allowed):
+        """Search limits the (rounded) dose sits on: one more rounding step would cross them."""
+        if not doses.any():
+            return ()
+        added = doses @ self.content
+        margin = self.step_round * self.content.max(axis=0)
+        limited = [c for c, a, room, m in zip(NUTRIENT_COLUMNS, added, allowed, margin)
+                   if a > 0 and room - a < m]
+        limited += [f"{p} max dose" for p, d in zip(self.products, doses) if d > self.max_dose - self.step_round]
+        return limited
+
+
+_optimizers = {}
+
+
+def recommend_dose(row, products=DEFAULT_PRODUCTS, crop_price=None, budget_ms=150.0, **options):
+    """DoseAdvice for a dataset row, reusing one optimizer per product set."""
+    key = (tuple(products), tuple(sorted(options.items())))
+    opt = _optimizers.get(key)
+    if opt is None:
+        opt = _optimizers.setdefault(key, DoseOptimizer(products, **options))   # optimizers are stateless
+    return opt.optimize(row, crop_price=crop_price, budget_ms=budget_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fertilizer dose optimizer")
+    parser.add_argument("district")
+    parser.add_argument("crop")
+    parser.add_argument("--products", nargs="+", default=list(DEFAULT_PRODUCTS),
+                        help=f"from: {', '.join(NUTRIENT_CONTENT)}")
+    parser.add_argument("--max_dose", type=float, default=150.0, help="kg/acre per product")
+    parser.add_argument("--crop_price", type=float, help="Rs/quintal (default: indicative table)")
+    parser.add_argument("--budget_ms", type=float, default=150.0)
+    args = parser.parse_args()
+
+    row = lookup_dataset("fertilizer", args.district, args.crop, lang="en")
+    ml_connector.load_model()
+    advice = recommend_dose(row, args.products, crop_price=args.crop_price,
+                            budget_ms=args.budget_ms, max_dose=args.max_dose)
+    print("[dose]", advice)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# lang_id.py
+# Fast language identification for the en / hi / mr case.
+#   1. Unicode-script fast path: Latin-only text -> en.
+#   2. Devanagari text -> Marathi-vs-Hindi marker lexicon (word -> log-odds),
+#      built once from the template bank and intent keywords.
+#   3. Ambiguous score -> ASR language probabilities / guess as tiebreaker.
+#   4. Still ambiguous -> langdetect (seeded, so it is deterministic); without
+#      langdetect, Marathi-only letters (ळ, ऱ) decide, else Hindi.
+
+import math
+import re
+
+SUPPORTED = ("en", "hi", "mr")
+
+_DEVANAGARI = re.compile(r"[ऀ-ॿ]")
+_LATIN = re.compile(r"[A-Za-z]")
+_DEVANAGARI_WORD = re.compile(r"[ऀ-ॿ]+")
+_MARATHI_LETTERS = re.compile(r"[ळऱ]")     # in Marathi spelling, (nearly) never in Hindi
+
+# Function words that separate the two languages regardless of topic
+MARATHI_MARKERS = ("आहे", "आहेत", "मध्ये", "काय", "किती", "कसे", "कशी", "साठी", "चा", "ची", "चे",
+                   "नाही", "आणि", "करा", "पाऊस", "पाणी", "खत", "माझ्या", "मला", "कोणते", "होईल")
+HINDI_MARKERS = ("है", "हैं", "में", "क्या", "कितना", "कितनी", "कैसे", "लिए", "की", "के",
+                 "नहीं", "और", "करें", "बारिश", "पानी", "खाद", "मेरे", "मुझे", "कौन", "होगा")
+MARKER_WEIGHT = 3.0
+
+# Common in both languages: never scored, whatever the templates say
+# ("का" is the Hindi genitive but also the Marathi yes/no question particle)
+AMBIGUOUS_WORDS = ("का",)
+
+NAMES = {"english": "en", "hindi": "hi", "marathi": "mr"}
+
+
+def normalize_lang(code, default="en"):
+    """Map 'hi-IN', 'mr_IN', 'Marathi', 'EN' ... to en/hi/mr (else `default`)."""
+    if not code:
+        return default
+    c = str(code).strip().lower()
+    if c in NAMES:
+        return NAMES[c]
+    primary = re.split(r"[-_]", c, maxsplit=1)[0]
+    return primary if primary in SUPPORTED else default
+
+
+def build_lexicon(templates=None, keywords=(), alpha=0.5, min_weight=1.0):
+    """
+    Word -> log-odds weight (positive = Marathi, negative = Hindi).
+    Document frequencies come from the hi/mr template lists; `keywords` (any
+    iterable of words, e.g. flattened INTENT_KEYWORDS) are only added when the
+    templates say which language they belong to.
+    """
+    hi_df, mr_df = {}, {}
+    n_hi = n_mr = 0
+    for per_lang in (templates or {}).values():
+        for text in per_lang.get("hi", []):
+            n_hi += 1
+            for w in set(_DEVANAGARI_WORD.findall(text)):
+                hi_df[w] = hi_df.get(w, 0) + 1
+        for text in per_lang.get("mr", []):
+            n_mr += 1
+            for w in set(_DEVANAGARI_WORD.findall(text)):
+                mr_df[w] = mr_df.get(w, 0) + 1
+
+    lex = {}
+    if n_hi and n_mr:
+        for w in set(hi_df) | set(mr_df):
+            p_mr = (mr_df.get(w, 0) + alpha) / (n_mr + 2 * alpha)
+            p_hi = (hi_df.get(w, 0) + alpha) / (n_hi + 2 * alpha)
+            weight = math.log(p_mr / p_hi)
+            if abs(weight) >= min_weight:
+                lex[w] = weight
+    for kw in keywords:
+        for w in _DEVANAGARI_WORD.findall(kw):
+            if w in lex:
+                continue
+            if w in mr_df and w not in hi_df:
+                lex[w] = min_weight
+            elif w in hi_df and w not in mr_df:
+                lex[w] = -min_weight
+    for w in MARATHI_MARKERS:
+        lex[w] = MARKER_WEIGHT
+    for w in HINDI_MARKERS:
+        lex[w] = -MARKER_WEIGHT
+    for w in AMBIGUOUS_WORDS:
+        lex.pop(w, None)
+    return lex
+
+
+class LanguageIdentifier:
+    """
+    identify(text, asr_lang=None, asr_probs=None) -> (lang, source)
+    source is one of "script", "lexicon", "asr", "langdetect", "default".
+    asr_probs: {lang: probability} from the ASR engine (asr_backends
+    transcribe_detailed), used before its single language guess.
+    """
+
+    def __init__(self, templates=None, keywords=(), margin=1.0):
+        self.lexicon = build_lexicon(templates, keywords)
+        self.margin = margin
+
+    def script_counts(self, text):
+        return len(_DEVANAGARI.findall(text)), len(_LATIN.findall(text))
+
+    def marathi_score(self, text):
+        """Sum of lexicon weights over Devanagari words (positive = Marathi)."""
+        lex = self.lexicon
+        return sum(lex.get(w, 0.0) for w in _DEVANAGARI_WORD.findall(text))
+
+    def identify(self, text, asr_lang=None, asr_probs=None):
+        text = text or ""
+        deva, latin = self.script_counts(text)
+        if not deva and not latin:
+            return normalize_lang(asr_lang, "en"), "default"
+        if latin and deva < 0.3 * (deva + latin):
+            return "en", "script"
+
+        score = self.marathi_score(text)
+        if score >= self.margin:
+            return "mr", "lexicon"
+        if score <= -self.margin:
+            return "hi", "lexicon"
+
+        # ambiguous Devanagari: ASR tiebreak
+        if asr_probs:
+            p_mr = asr_probs.get("mr", 0.0)
+            p_hi = asr_probs.get("hi", 0.0)
+            if p_mr != p_hi:
+                return ("mr" if p_mr > p_hi else "hi"), "asr"
+        asr = normalize_lang(asr_lang, None)
+        if asr in ("hi", "mr"):
+            return asr, "asr"
+        if score:
+            return ("mr" if score > 0 else "hi"), "lexicon"
+        lang = self._langdetect(text)
+        if lang:
+            return lang, "langdetect"
+        return ("mr" if _MARATHI_LETTERS.search(text) else "hi"), "script"
+
+    @staticmethod
+    def _langdetect(text):
+        """hi / mr from langdetect, or None (not installed, or another language)."""
+        try:
+            from langdetect import DetectorFactory, detect
+            DetectorFactory.seed = 0
+            lang = normalize_lang(detect(text), None)
+        except Exception:
+            lang = None
+        return lang if lang in ("hi", "mr") else None
@@ -0,0 +1,497 @@
+# loadtest.py
+# Concurrent load generator for the reply path (optionally with ASR).
+#
+# Replays a corpus of transcripts (and optionally WAVs) through
+# [ASR ->] detect_intent -> generate_reply, either closed-loop (N clients
+# sending back-to-back) or open-loop (Poisson arrivals at --rate per second;
+# latency is measured from the scheduled arrival, so queueing counts).
+# Reports throughput and latency percentiles per concurrency level, samples
+# CPU and RSS once a second, and saves everything as JSON for comparison.
+#
+#   python loadtest.py --concurrency 1 2 4 8 16 --duration 20
+#   python loadtest.py --rate 20 --concurrency 8 --asr stub --asr_rtf 0.2
+#   python loadtest.py --executor process --concurrency 2 4 8
+#   python loadtest.py --compare loadtest_results/a.json loadtest_results/b.json
+#   python loadtest.py --cold_start 32 --asr stub   # N first requests at once on cold caches
+#
+# Corpus: a text file (one transcript per line, optionally "lang<TAB>text") or
+# a CSV with columns text, lang and optional wav (path relative to the CSV).
+
+import argparse
+import csv
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from metrics import REGISTRY
+
+RESULTS_DIR = "loadtest_results"
+
+DEFAULT_CORPUS = [
+    ("en", "Kolhapur wheat fertilizer"),
+    ("en", "what is the yield of maize in jodhpur"),
+    ("en", "how much water does soybean need in satara"),
+    ("en", "pest problem in jowar at kolhapur"),
+    ("hi", "जोधपुर में बाजरा के लिए कौन सी खाद"),
+    ("hi", "कोल्हापुर में गेहूं की उपज कितनी होगी"),
+    ("hi", "सातारा में बारिश कितनी है"),
+    ("mr", "सातारा मध्ये पाऊस किती आहे"),
+    ("mr", "कोल्हापूर मध्ये गहू साठी खत कोणते"),
+    ("mr", "मका उत्पन्न किती येईल"),
+]
+
+
+# ---------- corpus ----------
+def load_corpus(path=None, sr=16000):
+    """-> list of {"text", "lang", "audio" (float32 or None), "duration_s"}."""
+    items = []
+    if not path:
+        items = [{"lang": lang, "text": text, "wav": None} for lang, text in DEFAULT_CORPUS]
+    elif path.endswith(".csv"):
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                wav = (row.get("wav") or "").strip()
+                items.append({"text": row.get("text") or "", "lang": (row.get("lang") or "").strip() or None,
+                              "wav": os.path.join(base, wav) if wav else None})
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                lang, text = line.split("\t", 1) if "\t" in line else (None, line)
+                items.append({"text": text, "lang": lang, "wav": None})
+    for it in items:
+        wav = it.pop("wav")
+        it["audio"], it["duration_s"] = None, 0.0
+        if wav:
+            from audio_io import load_audio
+            it["audio"] = load_audio(wav, sr)
+            it["duration_s"] = len(it["audio"]) / sr
+    return items
+
+
+# ---------- request handler (runs in executor threads or processes) ----------
+class StubASR:
+    """
+    Stand-in ASR engine: takes duration x rtf (at least min_s) and returns the
+    corpus transcript. spin=False sleeps (models an offloaded/remote engine),
+    spin=True burns CPU (models a local engine holding the GIL).
+    """
+
+    def __init__(self, rtf=0.2, spin=False, min_s=0.05, default_duration_s=3.0):
+        self.rtf = rtf
+        self.spin = spin
+        self.min_s = min_s
+        self.default_duration_s = default_duration_s
+
+    def __call__(self, item):
+        wait = max(self.min_s, (item["duration_s"] or self.default_duration_s) * self.rtf)
+        if self.spin:
+            end = time.perf_counter() + wait
+            while time.perf_counter() < end:
+                pass
+        else:
+            time.sleep(wait)
+        return item["text"], item["lang"]
+
+
+class EngineASR:
+    """Real engine from asr_backends ("whisper:tiny", "faster-whisper:small" ...)."""
+
+    def __init__(self, spec, threads=None):
+        name, _, model = spec.partition(":")
+        from voice_assistant import get_asr_backend
+        self.engine = get_asr_backend(model or "tiny", name, threads)
+
+    def __call__(self, item):
+        if item["audio"] is None:
+            return item["text"], item["lang"]
+        text, lang = self.engine.transcribe(item["audio"])
+        return text, lang or item["lang"]
+
+
+_asr = None
+
+
+def init_worker(asr_spec=None, asr_rtf=0.2, asr_spin=False, threads=None):
+    """Executor initializer: build the ASR stage and warm the dataset/model caches."""
+    global _asr
+    if asr_spec == "stub":
+        _asr = StubASR(asr_rtf, asr_spin)
+    elif asr_spec:
+        _asr = EngineASR(asr_spec, threads)
+    from voice_assistant import detect_intent, generate_reply
+    generate_reply(detect_intent("yield wheat"), "en", "Kolhapur wheat yield")
+
+
+def handle(item):
+    """One request. Returns (service_s, asr_s)."""
+    from voice_assistant import detect_intent, generate_reply
+    t0 = time.perf_counter()
+    text, lang = item["text"], item["lang"]
+    asr_s = 0.0
+    if _asr is not None:
+        text, lang = _asr(item)
+        asr_s = time.perf_counter() - t0
+    generate_reply(detect_intent(text), lang_code=lang, user_text=text)
+    return time.perf_counter() - t0, asr_s
+
+
+# ---------- resource sampling ----------
+def _proc_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class ResourceSampler:
+    """
+    Samples CPU % (100 = one core) and RSS once per `interval` seconds, plus
+    the completed-request count. Uses psutil when installed (then worker
+    processes are included); otherwise os.times() / /proc for this process.
+    """
+
+    def __init__(self, counter, interval=1.0):
+        self.counter = counter
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+        try:
+            import psutil
+            self._proc = psutil.Process()
+        except ImportError:
+            self._proc = None
+
+    def _read(self):
+        if self._proc is not None:
+            procs = [self._proc] + self._proc.children(recursive=True)
+            cpu = rss = 0.0
+            for p in procs:
+                try:
+                    t = p.cpu_times()
+                    cpu += t.user + t.system
+                    rss += p.memory_info().rss / 2 ** 20
+                except Exception:
+                    pass
+            return cpu, rss
+        t = os.times()
+        return t.user + t.system, _proc_rss_mb()
+
+    def _loop(self):
+        t_start = last_t = time.perf_counter()
+        last_cpu, _ = self._read()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            cpu, rss = self._read()
+            self.samples.append({
+                "t_s": round(now - t_start, 2),
+                "cpu_pct": round(100.0 * (cpu - last_cpu) / (now - last_t), 1),
+                "rss_mb": round(rss, 1),
+                "completed": self.counter(),
+            })
+            last_t, last_cpu = now, cpu
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="loadtest-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+
+# ---------- load generation ----------
+class LevelRun:
+    """Latency records for one concurrency / rate level."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.service = []
+        self.asr = []
+        self.errors = 0
+
+    def record(self, latency, service, asr):
+        with self.lock:
+            self.latencies.append(latency)
+            self.service.append(service)
+            self.asr.append(asr)
+
+    def error(self):
+        with self.lock:
+            self.errors += 1
+
+    def completed(self):
+        return len(self.latencies)
+
+
+def _closed_loop(executor, items, clients, deadline, run, seed):
+    def client(k):
+        rng = random.Random(seed + k)
+        while time.perf_counter() < deadline:
+            item = items[rng.randrange(len(items))]
+            t0 = time.perf_counter()
+            try:
+                service, asr = executor.submit(handle, item).result()
+                run.record(time.perf_counter() - t0, service, asr)
+            except Exception:
+                run.error()
+    threads = [threading.Thread(target=client, args=(k,), daemon=True) for k in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def _open_loop(executor, items, rate, deadline, run, seed):
+    rng = random.Random(seed)
+    pending = []
+    t_next = time.perf_counter()
+    while t_next < deadline:
+        delay = t_next - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        scheduled = t_next
+        fut = executor.submit(handle, items[rng.randrange(len(items))])
+
+        def done(f, scheduled=scheduled):
+            try:
+                service, asr = f.result()
+                run.record(time.perf_counter() - scheduled, service, asr)
+            except Exception:
+                run.error()
+        fut.add_done_callback(done)
+        pending.append(fut)
+        t_next += rng.expovariate(rate)
+    for f in pending:
+        try:
+            f.result()
+        except Exception:
+            pass
+
+
+def _pct(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 2) if values else None
+
+
+def run_level(items, concurrency, duration, rate=None, executor_kind="thread", warmup=2.0,
+              asr=None, asr_rtf=0.2, asr_spin=False, threads=None, seed=0):
+    """Warm up, then drive load for `duration` seconds; returns the level's result dict."""
+    pool_cls = ProcessPoolExecutor if executor_kind == "process" else ThreadPoolExecutor
+    with pool_cls(max_workers=concurrency, initializer=init_worker,
+                  initargs=(asr, asr_rtf, asr_spin, threads)) as executor:
+        drive = (lambda dl, run: _open_loop(executor, items, rate, dl, run, seed)) if rate else \
+                (lambda dl, run: _closed_loop(executor, items, concurrency, dl, run, seed))
+        if warmup > 0:
+            drive(time.perf_counter() + warmup, LevelRun())
+        REGISTRY.reset()
+        run = LevelRun()
+        sampler = ResourceSampler(run.completed).start()
+        t0 = time.perf_counter()
+        drive(t0 + duration, run)
+        wall = time.perf_counter() - t0
+        samples = sampler.stop()
+
+    lat = run.latencies
+    cpu = [s["cpu_pct"] for s in samples]
+    return {
+        "concurrency": concurrency,
+        "rate_rps": rate,
+        "mode": "open" if rate else "closed",
+        "executor": executor_kind,
+        "completed": run.completed(),
+        "errors": run.errors,
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(run.completed() / wall, 2) if wall else 0.0,
+        "latency_ms": {"mean": round(float(np.mean(lat)) * 1000, 2) if lat else None,
+                       "p50": _pct(lat, 50), "p90": _pct(lat, 90), "p99": _pct(lat, 99),
+                       "max": round(max(lat) * 1000, 2) if lat else None},
+        "service_ms": {"p50": _pct(run.service, 50), "p99": _pct(run.service, 99)},
+        "asr_ms": {"p50": _pct(run.asr, 50)} if asr else None,
+        "cpu_pct_mean": round(float(np.mean(cpu)), 1) if cpu else None,
+        "rss_mb_max": max((s["rss_mb"] for s in samples), default=None),
+        "stages": REGISTRY.summary() if executor_kind == "thread" else {},
+        "samples": samples,
+    }
+
+
+def scaling_efficiency(levels):
+    """
+    Closed-loop throughput at each concurrency / (concurrency x throughput at
+    the lowest tested concurrency, scaled). 1.0 = linear scaling.
+    """
+    closed = [lv for lv in levels if not lv["rate_rps"] and lv["throughput_rps"]]
+    if not closed:
+        return {}
+    ref = min(closed, key=lambda lv: lv["concurrency"])
+    per_client = ref["throughput_rps"] / ref["concurrency"]
+    return {lv["concurrency"]: round(lv["throughput_rps"] / (lv["concurrency"] * per_client), 2)
+            for lv in closed}
+
+
+def format_levels(levels):
+    eff = scaling_efficiency(levels)
+    lines = [f"{'conc':>5} {'rate':>6} {'done':>7} {'err':>4} {'rps':>8} {'scale':>6} {'p50 ms':>8} "
+             f"{'p90 ms':>8} {'p99 ms':>8} {'cpu %':>7} {'rss MB':>8}"]
+    for lv in levels:
+        lat = lv["latency_ms"]
+        scale = eff.get(lv["concurrency"]) if not lv["rate_rps"] else None
+        lines.append(f"{lv['concurrency']:>5} {lv['rate_rps'] or '-':>6} {lv['completed']:>7} "
+                     f"{lv['errors']:>4} {lv['throughput_rps']:>8} {scale or '-':>6} {lat['p50'] or 0:>8} "
+                     f"{lat['p90'] or 0:>8} {lat['p99'] or 0:>8} {lv['cpu_pct_mean'] or 0:>7} "
+                     f"{lv['rss_mb_max'] or 0:>8}")
+    return "\n".join(lines)
+
+
+def cold_start(items, n, asr=None, asr_rtf=0.2, asr_spin=False, threads=None):
+    """
+    Release `n` threads at once (behind a barrier) into the first requests of
+    a fresh process, so every lazy cache is filled concurrently. Returns
+    {"requests", "errors": [repr...], "wall_ms", "model_loads"}.
+    """
+    import ml_connector
+    global _asr
+    _asr = None
+    if asr == "stub":
+        _asr = StubASR(asr_rtf, asr_spin)
+    elif asr:
+        _asr = EngineASR(asr, threads)
+    loads = []
+    real_load = ml_connector.load_encoder   # called once per actual model load
+
+    def counting_load(*a, **kw):
+        loads.append(threading.get_ident())
+        return real_load(*a, **kw)
+
+    ml_connector.load_encoder = counting_load
+    barrier = threading.Barrier(n)
+    errors = []
+
+    def first_request(k):
+        barrier.wait()
+        try:
+            handle(items[k % len(items)])
+        except Exception as e:
+            errors.append(repr(e))
+
+    workers = [threading.Thread(target=first_request, args=(k,)) for k in range(n)]
+    t0 = time.perf_counter()
+    try:
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    finally:
+        ml_connector.load_encoder = real_load
+    return {"requests": n, "errors": errors, "wall_ms": round((time.perf_counter() - t0) * 1000, 1),
+            "model_loads": len(loads)}
+
+
+def max_concurrency_within(levels, slo_ms):
+    """Highest tested concurrency whose p99 latency meets the SLO (None if none does)."""
+    ok = [lv["concurrency"] for lv in levels
+          if lv["latency_ms"]["p99"] is not None and lv["latency_ms"]["p99"] <= slo_ms and not lv["errors"]]
+    return max(ok) if ok else None
+
+
+def compare(paths):
+    """Side-by-side throughput / p99 per concurrency level for saved runs."""
+    runs = []
+    for p in paths:
+        with open(p, "r", encoding="utf-8") as f:
+            runs.append((os.path.basename(p), json.load(f)))
+    keys = sorted({(lv["concurrency"], lv["rate_rps"] or 0) for _, r in runs for lv in r["levels"]})
+    header = f"{'conc':>5} {'rate':>6}  " + "  ".join(f"{name[:24]:>24}" for name, _ in runs)
+    lines = [header, f"{'':>13}" + "  ".join(f"{'rps / p99 ms':>24}" for _ in runs)]
+    for conc, rate in keys:
+        cells = []
+        for _, r in runs:
+            lv = next((l for l in r["levels"] if l["concurrency"] == conc and (l["rate_rps"] or 0) == rate), None)
+            cells.append(f"{lv['throughput_rps']:>11} / {lv['latency_ms']['p99'] or 0:>10}" if lv else f"{'-':>24}")
+        lines.append(f"{conc:>5} {rate or '-':>6}  " + "  ".join(cells))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the reply path")
+    parser.add_argument("--corpus", type=str, help="transcripts .txt or .csv (text, lang, wav)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--rate", type=float, help="open-loop arrivals per second (default: closed loop)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--asr", type=str, help="'stub' or backend:model (e.g. whisper:tiny)")
+    parser.add_argument("--asr_rtf", type=float, default=0.2, help="stub ASR real-time factor")
+    parser.add_argument("--asr_spin", action="store_true", help="stub ASR burns CPU instead of sleeping")
+    parser.add_argument("--threads", type=int, help="intra-op threads for a real ASR engine")
+    parser.add_argument("--slo_ms", type=float, default=1000.0, help="p99 target for the summary line")
+    parser.add_argument("--label", type=str, default="run")
+    parser.add_argument("--out", type=str, help=f"results JSON (default: {RESULTS_DIR}/<time>_<label>.json)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", nargs="+", help="print saved result files side by side and exit")
+    parser.add_argument("--cold_start", type=int, metavar="N",
+                        help="fire N simultaneous first requests on cold caches and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        print(compare(args.compare))
+        return
+
+    items = load_corpus(args.corpus)
+    if args.cold_start:
+        res = cold_start(items, args.cold_start, args.asr, args.asr_rtf, args.asr_spin, args.threads)
+        print(f"[load] cold start: {res['requests']} concurrent first requests in {res['wall_ms']} ms, "
+              f"{res['model_loads']} model load(s), {len(res['errors'])} error(s)")
+        for e in sorted(set(res["errors"])):
+            print("  ", e)
+        return
+    print(f"[load] {len(items)} corpus item(s); {args.executor} executor; "
+          f"{'open loop @ %.1f rps' % args.rate if args.rate else 'closed loop'}")
+    levels = []
+    for c in args.concurrency:
+        lv = run_level(items, c, args.duration, rate=args.rate, executor_kind=args.executor,
+                       warmup=args.warmup, asr=args.asr, asr_rtf=args.asr_rtf,
+                       asr_spin=args.asr_spin, threads=args.threads, seed=args.seed)
+        levels.append(lv)
+        print(f"[load] concurrency {c}: {lv['throughput_rps']} rps, "
+              f"p50 {lv['latency_ms']['p50']} ms, p99 {lv['latency_ms']['p99']} ms, errors {lv['errors']}")
+
+    print("\n" + format_levels(levels))
+    knee = max_concurrency_within(levels, args.slo_ms)
+    print(f"\n[load] max concurrency with p99 <= {args.slo_ms:g} ms: {knee or 'none tested'}")
+
+    result = {
+        "label": args.label,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k != "compare"},
+        "max_concurrency_within_slo": knee,
+        "scaling_efficiency": scaling_efficiency(levels),
+        "levels": levels,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{args.label}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print("[load] results ->", out)
+
+
+if __name__ == "__main__":
+    main()
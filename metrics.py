@@ -0,0 +1,224 @@
+# metrics.py
+# Lightweight per-stage latency instrumentation.
+# Wrap a stage with `with span("asr"):` or `@timed("asr")`; durations are
+# aggregated into per-stage histograms (p50/p95/p99) and can be exported as
+# JSON lines (one event per span) and a Prometheus text file for a local scraper.
+# Spans timed in a worker process are collected there (collect_spans()) and
+# merged into the parent's registry (merge_spans()).
+
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_SAMPLES = 2048  # per stage, for exact quantiles over recent spans
+
+
+class Histogram:
+    """Bucketed counts for export plus a bounded sample window for quantiles."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last = +Inf
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self._samples = []
+        self._next = 0
+
+    def observe(self, seconds, error=False):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+        if len(self._samples) < MAX_SAMPLES:
+            self._samples.append(seconds)
+        else:
+            self._samples[self._next] = seconds
+            self._next = (self._next + 1) % MAX_SAMPLES
+
+    def quantile(self, q):
+        if not self._samples:
+            return 0.0
+        s = sorted(self._samples)
+        return s[min(len(s) - 1, int(q * len(s)))]
+
+    def summary(self):
+        s = sorted(self._samples)
+        pick = (lambda q: s[min(len(s) - 1, int(q * len(s)))]) if s else (lambda q: 0.0)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "sum_s": round(self.total, 6),
+            "mean_s": round(self.total / self.count, 6) if self.count else 0.0,
+            "p50_s": round(pick(0.50), 6),
+            "p95_s": round(pick(0.95), 6),
+            "p99_s": round(pick(0.99), 6),
+        }
+
+
+class Registry:
+    """Thread-safe collection of stage histograms with optional JSONL event sink."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hists = {}
+        self._jsonl = None
+
+    def set_jsonl(self, path):
+        """Append one JSON line per span to `path` (None disables)."""
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+            self._jsonl = open(path, "a", encoding="utf-8") if path else None
+
+    def observe(self, stage, seconds, error=False, **labels):
+        with self._lock:
+            h = self._hists.get(stage)
+            if h is None:
+                h = self._hists[stage] = Histogram()
+            h.observe(seconds, error)
+            if self._jsonl is not None:
+                event = {"ts": round(time.time(), 6), "stage": stage,
+                         "seconds": round(seconds, 6), "error": error}
+                event.update(labels)
+                self._jsonl.write(json.dumps(event, ensure_ascii=False) + "\n")
+                self._jsonl.flush()
+
+    def summary(self):
+        with self._lock:
+            return {name: h.summary() for name, h in sorted(self._hists.items())}
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+
+    def to_prometheus(self, prefix="crop_assistant"):
+        """Render all histograms in Prometheus text exposition format."""
+        name = f"{prefix}_stage_seconds"
+        lines = [f"# HELP {name} Latency of voice assistant pipeline stages.",
+                 f"# TYPE {name} histogram"]
+        quant = [f"# HELP {prefix}_stage_quantile_seconds Recent-window latency quantiles.",
+                 f"# TYPE {prefix}_stage_quantile_seconds gauge"]
+        errs = [f"# HELP {prefix}_stage_errors_total Spans that raised.",
+                f"# TYPE {prefix}_stage_errors_total counter"]
+        with self._lock:
+            for stage, h in sorted(self._hists.items()):
+                cum = 0
+                for le, c in zip(h.buckets, h.counts):
+                    cum += c
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cum}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.total:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+                for q in (0.5, 0.95, 0.99):
+                    quant.append(f'{prefix}_stage_quantile_seconds{{stage="{stage}",quantile="{q}"}} '
+                                 f'{h.quantile(q):.6f}')
+                errs.append(f'{prefix}_stage_errors_total{{stage="{stage}"}} {h.errors}')
+        return "\n".join(lines + quant + errs) + "\n"
+
+    def write_prometheus(self, path, prefix="crop_assistant"):
+        """Atomically (tmp + rename) write the Prometheus text file."""
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus(prefix))
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+
+# Optional per-stage hook (stage -> context manager), installed by profiling.py
+_stage_hook = None
+
+# Per-thread list receiving every observed span while collect_spans() is active
+_collecting = threading.local()
+
+
+def set_stage_hook(hook):
+    """Install (or clear with None) a context-manager factory run around every span."""
+    global _stage_hook
+    _stage_hook = hook
+
+
+@contextmanager
+def span(stage, registry=None, **labels):
+    """Time the enclosed block as one observation of `stage`."""
+    reg = registry or REGISTRY
+    hook = _stage_hook
+    t0 = time.perf_counter()
+    error = False
+    try:
+        with (hook(stage) if hook is not None else nullcontext()):
+            yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        seconds = time.perf_counter() - t0
+        reg.observe(stage, seconds, error, **labels)
+        events = getattr(_collecting, "events", None)
+        if events is not None:
+            events.append((stage, seconds, error, labels))
+
+
+def timed(stage, registry=None):
+    """Decorator form of span()."""
+    def deco(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage, registry):
+                return func(*args, **kwargs)
+        # one code object per stage, so cProfile keeps the wrappers apart
+        # (one shared `wrapper` node would sit in a cycle with every stage)
+        wrapper.__code__ = wrapper.__code__.replace(co_name=f"timed[{stage}]")
+        return wrapper
+    return deco
+
+
+@contextmanager
+def collect_spans():
+    """
+    Yield a list that receives (stage, seconds, error, labels) for every span
+    the calling thread observes in the block, e.g. to return a worker
+    process's timings with its result.
+    """
+    prev = getattr(_collecting, "events", None)
+    events = _collecting.events = []
+    try:
+        yield events
+    finally:
+        _collecting.events = prev
+
+
+def merge_spans(events, registry=None, **labels):
+    """Observe spans collected elsewhere (collect_spans) in this process's registry."""
+    reg = registry or REGISTRY
+    for stage, seconds, error, span_labels in events:
+        reg.observe(stage, seconds, error, **{**span_labels, **labels})
+
+
+def export(out_dir, registry=None):
+    """Write summary JSON and Prometheus text into out_dir; returns the summary."""
+    reg = registry or REGISTRY
+    os.makedirs(out_dir, exist_ok=True)
+    reg.write_prometheus(os.path.join(out_dir, "metrics.prom"))
+    summary = reg.summary()
+    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def format_summary(summary):
+    """Human-readable table of per-stage percentiles (milliseconds)."""
+    rows = [f"{'stage':<26}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for stage, s in summary.items():
+        rows.append(f"{stage:<26}{s['count']:>6}{s['p50_s'] * 1000:>10.1f}"
+                    f"{s['p95_s'] * 1000:>10.1f}{s['p99_s'] * 1000:>10.1f}")
+    return "\n".join(rows)
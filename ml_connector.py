@@ -1,37 +1,145 @@
 # ml_connector.py
 import joblib
+import json
 import numpy as np
 import os
+import threading
+
+from features import FeatureEncoder, encoder_path, residuals_path
+from metrics import timed
 
 MODEL_PATH = "best_model.joblib"   # adjust path if needed
-_model = None
+INTERVAL_COVERAGE = 0.8             # central prediction-interval coverage
+
+# (model, encoder, residuals) loaded together and replaced as one tuple, so a
+# reader never pairs a model with another model's encoder. residuals: per-crop
+# residual quantiles for non-ensemble models (or None).
+_state = None
+_state_lock = threading.Lock()
+
+def _load_state(path=MODEL_PATH):
+    """Load once per process; concurrent first callers wait instead of loading twice."""
+    global _state
+    state = _state
+    if state is None:
+        with _state_lock:
+            state = _state
+            if state is None:
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"Trained ML model not found at {path}")
+                model = joblib.load(path)
+                encoder = load_encoder(path)
+                encoder.check(model)
+                state = _state = (model, encoder, _read_residuals(path, encoder))
+    return state
 
 def load_model(path=MODEL_PATH):
-    global _model
-    if _model is None:
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"Trained ML model not found at {path}")
-        _model = joblib.load(path)
-    return _model
+    """Load the model and its feature encoder (saved next to it by train_model.py)."""
+    return _load_state(path)[0]
+
+def _read_residuals(model_path, encoder):
+    """Per-crop out-of-fold residual quantiles as arrays: (levels, table[n_crops + 1, n_levels])."""
+    path = residuals_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    crops = encoder.categories.get("Crop", [])
+    by_crop = data.get("crops", {})
+    table = np.array([by_crop.get(c, data["global"]) for c in crops] + [data["global"]], dtype=np.float64)
+    return np.asarray(data["levels"], dtype=np.float64), table
+
+def load_encoder(model_path=MODEL_PATH):
+    enc_path = encoder_path(model_path)
+    if not os.path.exists(enc_path):
+        raise FileNotFoundError(f"Feature encoder not found at {enc_path} (retrain with train_model.py)")
+    return FeatureEncoder.load(enc_path)
 
+def get_encoder():
+    return _load_state()[1]
+
+def get_model_and_encoder():
+    """(model, encoder) from one consistent snapshot."""
+    model, encoder, _ = _load_state()
+    return model, encoder
+
+def set_model(model, encoder=None, model_path=MODEL_PATH):
+    """Install an already-loaded model (e.g. mmap-loaded from shared memory)."""
+    global _state
+    encoder = encoder or load_encoder(model_path)
+    encoder.check(model)
+    state = (model, encoder, _read_residuals(model_path, encoder))
+    with _state_lock:
+        _state = state
+
+@timed("predict_yield")
 def predict_yield(row):
     """
-    row: dict from dataset (already normalized keys).
+    row: dict from dataset (CSV columns, templates' lowercase keys or
+    normalize_row placeholders - the encoder resolves all of them).
     Returns: float predicted yield (quintals/acre).
     """
-    model = load_model()
-
-    # Extract features from row (must match training!)
-    # Use order: numeric + categorical columns as used in training
-    # Example minimal features (adapt for your dataset):
-    features = [
-        float(row.get("rainfall", 0) or 0),
-        float(row.get("temperature", 25) or 25),
-        float(row.get("nitrogen", 0) or 0),
-        float(row.get("phosphorous", 0) or 0),
-        float(row.get("potassium", 0) or 0),
-    ]
-
-    X = np.array([features])  # 2D array
-    pred = model.predict(X)[0]
-    return round(float(pred), 2)
+    return round(float(predict_yield_batch([row])[0]), 2)
+
+def predict_yield_batch(rows):
+    """Predict for many rows in one vectorized encode + one model call."""
+    model, encoder = get_model_and_encoder()
+    return model.predict(encoder.transform(rows))
+
+def predict_columns(block):
+    """Predict for a columnar block {column: array}, e.g. scenario sweeps."""
+    model, encoder = get_model_and_encoder()
+    return model.predict(encoder.transform_columns(block))
+
+def _tree_members(model):
+    """Fitted sub-estimators of a bagged tree ensemble (RandomForest/ExtraTrees), else None."""
+    members = getattr(model, "estimators_", None)
+    if isinstance(members, list) and len(members) > 1 and hasattr(members[0], "predict"):
+        return members
+    return None
+
+def interval_from_matrix(X, coverage=INTERVAL_COVERAGE, state=None):
+    """
+    (pred, low, high) for an encoded matrix.
+    Tree ensembles: quantiles over per-tree predictions (the mean of which is
+    the forest's prediction, so no separate predict call). Other models: one
+    gather of precomputed per-crop residual quantiles added to the prediction.
+    """
+    model, encoder, residuals = state or _load_state()
+    alpha = (1.0 - coverage) / 2.0
+    members = _tree_members(model)
+    if members is not None:
+        X32 = np.asarray(X, dtype=np.float32)
+        per_tree = np.stack([m.predict(X32) for m in members])
+        pred = per_tree.mean(axis=0)
+        low, high = np.quantile(per_tree, [alpha, 1.0 - alpha], axis=0)
+        return pred, low, high
+    pred = model.predict(X)
+    if residuals is None:
+        return pred, pred.copy(), pred.copy()
+    levels, table = residuals
+    lo_i = int(np.abs(levels - alpha).argmin())
+    hi_i = int(np.abs(levels - (1.0 - alpha)).argmin())
+    codes = encoder.category_codes(X, "Crop")
+    rows = np.where(codes >= 0, codes, table.shape[0] - 1)
+    return pred, pred + table[rows, lo_i], pred + table[rows, hi_i]
+
+def confidence_from_interval(pred, low, high):
+    """Interval half-width relative to the prediction -> confidence % (1-99)."""
+    pred = np.asarray(pred, dtype=np.float64)
+    half = (np.asarray(high) - np.asarray(low)) / 2.0
+    rel = half / np.maximum(np.abs(pred), 1e-6)
+    return np.clip(np.rint(100.0 * (1.0 - rel)), 1, 99).astype(int)
+
+def predict_interval_batch(rows, coverage=INTERVAL_COVERAGE):
+    """Rows -> (pred, low, high, confidence %) arrays in one batched call."""
+    state = _load_state()
+    pred, low, high = interval_from_matrix(state[1].transform(rows), coverage, state)
+    return pred, low, high, confidence_from_interval(pred, low, high)
+
+@timed("predict_yield_interval")
+def predict_yield_with_interval(row, coverage=INTERVAL_COVERAGE):
+    """Single row -> {"yield", "low", "high", "confidence"} (quintals/acre, %)."""
+    pred, low, high, conf = predict_interval_batch([row], coverage)
+    return {"yield": round(float(pred[0]), 2), "low": round(float(low[0]), 2),
+            "high": round(float(high[0]), 2), "confidence": int(conf[0])}
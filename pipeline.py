@@ -0,0 +1,166 @@
+# pipeline.py
+# Asyncio/queue-based stage pipeline for the kiosk loop.
+# Each stage runs its (blocking) function in its own worker - a thread, or a
+# process for CPU-heavy work like ASR - and stages are connected by bounded
+# asyncio queues, so capturing query N+1 overlaps with speaking reply N while
+# a slow stage applies backpressure instead of letting work pile up.
+
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+_STOP = object()   # end-of-stream sentinel
+SKIP = object()    # a stage may return SKIP to drop an item
+
+
+class Stage:
+    """
+    One pipeline step.
+    func: blocking callable item -> item (or SKIP).
+    kind: "thread" or "process" (process needs a picklable, module-level func;
+          `initializer`/`initargs` run once per worker process, e.g. to load a model).
+    maxsize: bound of this stage's input queue.
+    """
+
+    def __init__(self, name, func, kind="thread", workers=1, maxsize=2,
+                 initializer=None, initargs=()):
+        self.name = name
+        self.func = func
+        self.kind = kind
+        self.workers = workers
+        self.maxsize = maxsize
+        self.initializer = initializer
+        self.initargs = initargs
+        self.processed = 0
+        self.busy_s = 0.0
+        self.max_depth = 0
+        self.queue = None
+        self.executor = None
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        if self.kind == "process":
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                initializer=self.initializer,
+                                                initargs=self.initargs)
+        else:
+            if self.initializer:
+                self.initializer(*self.initargs)
+            self.executor = ThreadPoolExecutor(max_workers=self.workers,
+                                               thread_name_prefix=f"stage-{self.name}")
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def stats(self):
+        depth = self.queue.qsize() if self.queue is not None else 0
+        return {
+            "stage": self.name,
+            "depth": depth,
+            "max_depth": self.max_depth,
+            "capacity": self.maxsize,
+            "processed": self.processed,
+            "busy_s": round(self.busy_s, 3),
+        }
+
+
+class Pipeline:
+    """
+    source: blocking callable returning the next item, or None when done
+            (e.g. capture one utterance); it runs in its own thread.
+    stages: list of Stage; the last stage's results are discarded.
+    """
+
+    def __init__(self, source, stages, on_stats=None, stats_every=0):
+        self.source = Stage("source", source, maxsize=0)
+        self.stages = list(stages)
+        self.on_stats = on_stats
+        self.stats_every = stats_every
+
+    def queue_depths(self):
+        return {s.name: s.queue.qsize() if s.queue is not None else 0 for s in self.stages}
+
+    def stats(self):
+        return [self.source.stats()] + [s.stats() for s in self.stages]
+
+    async def _produce(self, loop):
+        out = self.stages[0].queue if self.stages else None
+        while True:
+            t0 = time.perf_counter()
+            item = await loop.run_in_executor(self.source.executor, self.source.func)
+            self.source.busy_s += time.perf_counter() - t0
+            if item is None:
+                break
+            self.source.processed += 1
+            if out is not None:
+                await out.put(item)   # blocks when stage 0 is full -> backpressure
+                self.stages[0].max_depth = max(self.stages[0].max_depth, out.qsize())
+        if out is not None:
+            for _ in range(self.stages[0].workers):
+                await out.put(_STOP)
+
+    async def _work(self, loop, idx, done):
+        stage = self.stages[idx]
+        nxt = self.stages[idx + 1] if idx + 1 < len(self.stages) else None
+        while True:
+            item = await stage.queue.get()
+            if item is _STOP:
+                break
+            t0 = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(stage.executor, stage.func, item)
+            except Exception as e:
+                print(f"[pipeline] stage {stage.name} failed:", e)
+                result = SKIP
+            stage.busy_s += time.perf_counter() - t0
+            stage.processed += 1
+            if nxt is not None and result is not SKIP:
+                await nxt.queue.put(result)
+                nxt.max_depth = max(nxt.max_depth, nxt.queue.qsize())
+        # last worker of this stage forwards the stop signal downstream
+        done[idx] += 1
+        if done[idx] == stage.workers and nxt is not None:
+            for _ in range(nxt.workers):
+                await nxt.queue.put(_STOP)
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.stats_every)
+            self.on_stats(self.stats())
+
+    async def run(self):
+        """Run until the source returns None and all items have drained."""
+        loop = asyncio.get_running_loop()
+        self.source.start()
+        for s in self.stages:
+            s.start()
+        done = [0] * len(self.stages)
+        tasks = [asyncio.create_task(self._produce(loop))]
+        for i, s in enumerate(self.stages):
+            tasks += [asyncio.create_task(self._work(loop, i, done)) for _ in range(s.workers)]
+        reporter = None
+        if self.on_stats and self.stats_every:
+            reporter = asyncio.create_task(self._report())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            for s in [self.source] + self.stages:
+                s.shutdown()
+        if self.on_stats:
+            self.on_stats(self.stats())
+        return self.stats()
+
+
+def run_pipeline(source, stages, **kwargs):
+    """Synchronous entry point: build and run a Pipeline, return final stats."""
+    return asyncio.run(Pipeline(source, stages, **kwargs).run())
+
+
+def format_stats(stats):
+    """One-line summary: name[depth/capacity, processed] for each stage."""
+    return "  ".join(f"{s['stage']}[{s['depth']}/{s['capacity']} q, {s['processed']} done, "
+                     f"{s['busy_s']}s busy]" for s in stats)
@@ -0,0 +1,249 @@
+# profiling.py
+# Opt-in per-stage profiling: cProfile + tracemalloc around every metrics span.
+#
+#   with profile("profile_out"):
+#       generate_filled_template("yield", lang="hi", district="Satara")
+#
+# writes, per top-level stage:
+#   <stage>.pstats      - cProfile stats (python -m pstats / snakeviz)
+#   <stage>.collapsed   - flamegraph.pl / speedscope collapsed stacks (microseconds)
+#   <stage>.alloc.txt   - top net allocations by source line (tracemalloc)
+# Nested spans (e.g. find_best_row inside generate_filled_template) are
+# attributed to the outermost stage, so its profile shows the full breakdown.
+
+import cProfile
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import metrics
+
+TOP_ALLOCATIONS = 25
+MAX_STACK_DEPTH = 64
+MIN_STACK_SHARE = 0.001     # subtrees under this share of the total time are collapsed
+MAX_STACK_PATHS = 20000     # call-graph paths walked per stage before collapsing the rest
+
+
+class StageProfiler:
+    """Collects cProfile and tracemalloc data per stage; install with start()."""
+
+    def __init__(self, out_dir="profile", trace_memory=True, frames=10):
+        self.out_dir = out_dir
+        self.trace_memory = trace_memory
+        self.frames = frames
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles = {}   # stage -> [cProfile.Profile, ...] (one per thread)
+        self._allocs = {}     # stage -> {source line: [size_diff, count_diff]}
+        self._calls = {}      # stage -> number of profiled spans
+        self._started_tracemalloc = False
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracemalloc = True
+        metrics.set_stage_hook(self.stage)
+        return self
+
+    def stop(self):
+        metrics.set_stage_hook(None)
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    # ---------- per-stage hook ----------
+    def _profile_for(self, stage):
+        profs = getattr(self._local, "profiles", None)
+        if profs is None:
+            profs = self._local.profiles = {}
+        prof = profs.get(stage)
+        if prof is None:
+            prof = profs[stage] = cProfile.Profile()
+            with self._lock:
+                self._profiles.setdefault(stage, []).append(prof)
+        return prof
+
+    @contextmanager
+    def stage(self, name):
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            # nested span: already covered by the outer stage's profile
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+
+        self._local.depth = 1
+        before = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        prof = self._profile_for(name)
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            self._local.depth = 0
+            if before is not None:
+                self._record_allocs(name, before, tracemalloc.take_snapshot())
+            with self._lock:
+                self._calls[name] = self._calls.get(name, 0) + 1
+
+    def _record_allocs(self, name, before, after):
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, __file__)]
+        diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+        with self._lock:
+            acc = self._allocs.setdefault(name, {})
+            for d in diff:
+                if not d.size_diff:
+                    continue
+                key = str(d.traceback[0])
+                slot = acc.setdefault(key, [0, 0])
+                slot[0] += d.size_diff
+                slot[1] += d.count_diff
+
+    # ---------- output ----------
+    def stats(self, stage):
+        profs = self._profiles.get(stage) or []
+        st = None
+        for p in profs:
+            if st is None:
+                st = pstats.Stats(p)
+            else:
+                st.add(p)
+        return st
+
+    def write(self, out_dir=None):
+        """Write pstats / collapsed / alloc files for every stage; returns the paths."""
+        out_dir = out_dir or self.out_dir
+        os.makedirs(out_dir, exist_ok=True)
+        written = []
+        with self._lock:
+            stages = list(self._profiles)
+        for stage in stages:
+            st = self.stats(stage)
+            if st is None:
+                continue
+            base = os.path.join(out_dir, stage)
+            st.dump_stats(base + ".pstats")
+            with open(base + ".collapsed", "w", encoding="utf-8") as f:
+                for stack, us in collapsed_stacks(st, root=stage):
+                    f.write(f"{stack} {us}\n")
+            written += [base + ".pstats", base + ".collapsed"]
+            allocs = self._allocs.get(stage)
+            if allocs:
+                top = sorted(allocs.items(), key=lambda kv: -abs(kv[1][0]))[:TOP_ALLOCATIONS]
+                with open(base + ".alloc.txt", "w", encoding="utf-8") as f:
+                    f.write(f"# net allocations over {self._calls.get(stage, 0)} span(s) of {stage}\n")
+                    for line, (size, count) in top:
+                        f.write(f"{size / 1024:+10.1f} KiB {count:+8d} blocks  {line}\n")
+                written.append(base + ".alloc.txt")
+        return written
+
+    def report(self, limit=8):
+        """Short text summary: top cumulative functions per stage."""
+        out = []
+        for stage in sorted(self._profiles):
+            st = self.stats(stage)
+            if st is None:
+                continue
+            out.append(f"== {stage} ({self._calls.get(stage, 0)} call(s), {st.total_tt:.3f}s) ==")
+            rows = sorted(st.stats.items(), key=lambda kv: -kv[1][3])[:limit]
+            for (fname, line, func), (cc, nc, tt, ct, _) in rows:
+                out.append(f"  {ct:8.4f}s cum {tt:8.4f}s self {nc:>7} calls  "
+                           f"{os.path.basename(fname)}:{line}({func})")
+        return "\n".join(out)
+
+
+def _label(func):
+    fname, line, name = func
+    if fname == "~":
+        return name.strip("<>").replace(" ", "_")
+    return f"{name} ({os.path.basename(fname)}:{line})".replace(";", ",").replace(" ", "_")
+
+
+def collapsed_stacks(st, root=None, min_share=MIN_STACK_SHARE, max_paths=MAX_STACK_PATHS):
+    """
+    Approximate collapsed stacks from a cProfile call graph: each function's
+    self time is split over its callers in proportion to per-edge cumulative
+    time, walking down from the roots - functions entered from outside the
+    profile, for the share of their (primitive) calls that came from there -
+    and the result is scaled to the profile's total time. Yields ("a;b;c", microseconds).
+    The number of simple paths grows exponentially with the graph (a cold
+    import profiles thousands of functions), so a subtree whose attributed
+    time is below min_share of the total, or any subtree once max_paths paths
+    have been walked, is collapsed into a single frame carrying its time.
+    """
+    raw = st.stats
+    children = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge[3]))
+    roots = []
+    for f, (cc, _, _, _, callers) in raw.items():
+        outside = cc - sum(e[0] for c, e in callers.items() if c in raw)
+        if outside > 0:
+            roots.append((f, outside / cc))
+    labels = {f: _label(f) for f in raw}
+    total = sum(v[2] for v in raw.values())
+    min_time = min_share * total
+    out = {}
+    walked = [0]
+
+    def add(stack, secs):
+        key = ";".join(stack)
+        out[key] = out.get(key, 0.0) + secs
+
+    def walk(func, path, share, seen):
+        walked[0] += 1
+        tt, ct = raw[func][2], raw[func][3]
+        stack = path + [labels[func]]
+        if tt > 0 and share > 0:
+            add(stack, tt * share)
+        if ct <= 0:
+            return
+        for child, edge_ct in children.get(func, ()):
+            if child in seen:
+                continue
+            child_ct = raw[child][3]
+            if child_ct <= 0:
+                continue
+            child_share = share * min(1.0, edge_ct / child_ct)
+            if (child_share * child_ct < min_time or walked[0] >= max_paths
+                    or len(stack) + 1 >= MAX_STACK_DEPTH):
+                add(stack + [labels[child]], child_share * child_ct)
+                continue
+            walk(child, stack, child_share, seen | {child})
+
+    prefix = [root] if root else []
+    for r, share in roots:
+        walk(r, prefix, share, {r})
+    # recursion through several callers (imports) makes edge times overlap:
+    # scale so the stacks add up to the profile's total time
+    attributed = sum(out.values())
+    scale = total / attributed if attributed > 0 else 0.0
+    for stack, secs in sorted(out.items()):
+        us = int(round(secs * scale * 1e6))
+        if us > 0:
+            yield stack, us
+
+
+@contextmanager
+def profile(out_dir="profile", trace_memory=True, verbose=True):
+    """
+    Profile every instrumented stage run inside the block (library users of
+    templates / ml_connector / dataset_connector). Files are written on exit.
+    """
+    prof = StageProfiler(out_dir, trace_memory=trace_memory).start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+        paths = prof.write()
+        if verbose:
+            print(prof.report())
+            print(f"[profile] wrote {len(paths)} file(s) to {out_dir}")
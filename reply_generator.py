@@ -1,11 +1,12 @@
 # reply_generator.py
-import random
-from templates import TEMPLATES
+from templates import TEMPLATES, get_rng
 from data_loader import get_latest_value, get_average
+from dataset_connector import lookup_dataset
 
-def generate_reply(intent, lang, district="Nagpur", crop="Wheat"):
+def generate_reply(intent, lang, district="Nagpur", crop="Wheat", rng=None):
     """
     Generate a reply based on intent, language, dataset, and templates.
+    rng: random.Random for this request (default: the calling thread's own).
     """
     if intent not in TEMPLATES:
         return "❌ Unknown intent."
@@ -13,16 +14,18 @@ def generate_reply(intent, lang, district="Nagpur", crop="Wheat"):
         return "❌ Language not supported."
 
     # Pick a random template for variety
-    template = random.choice(TEMPLATES[intent][lang])
+    template = (rng or get_rng()).choice(TEMPLATES[intent][lang])
 
     # Collect dataset values
-    rainfall = get_average(district, "PrecipitationSumInches") or "N/A"
-    soil = get_latest_value(district, "SoilType") or "Loamy"
+    rainfall = get_average(district, "Rainfall") or "N/A"
+    soil = get_latest_value(district, "Soil_Color") or "Loamy"
     fertilizer = "Urea"  # Placeholder → could map from dataset later
     pest = "Aphids"      # Placeholder
     season = "Kharif"    # Placeholder
-    yield_pred = random.randint(15, 30)  # Dummy prediction
-    confidence = round(random.uniform(0.7, 0.95), 2)
+    # Model yield + interval-based confidence (see ml_connector.predict_interval_batch)
+    row = lookup_dataset(intent, district, crop, lang)
+    yield_pred = str(row.get("yield", "N/A")).replace(" quintals/acre", "")
+    confidence = row.get("confidence", "N/A")
 
     # Replace placeholders in the template
     reply = template.format(
@@ -33,8 +36,8 @@ def generate_reply(intent, lang, district="Nagpur", crop="Wheat"):
         fertilizer=fertilizer,
         pest=pest,
         season=season,
-  
-        confidence=confidence
+        confidence=confidence,
+        **{"yield": yield_pred}
     )
 
     return reply
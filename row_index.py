@@ -0,0 +1,331 @@
+# row_index.py
+# Nearest-neighbour lookup of dataset rows on numeric agronomic features.
+# Pure-Python KD-tree (no pandas / numpy), one tree per (district, crop) partition
+# and queried feature subset, so every tree level prunes.
+
+import heapq
+import math
+import threading
+
+NUMERIC_FEATURES = ("rainfall", "temperature", "nitrogen", "phosphorus", "potassium", "ph")
+
+# Query keyword aliases -> canonical feature name
+FEATURE_ALIASES = {
+    "rain": "rainfall",
+    "temp": "temperature",
+    "n": "nitrogen",
+    "phosphorous": "phosphorus",
+    "p": "phosphorus",
+    "k": "potassium",
+    "p_h": "ph",
+}
+
+
+def to_float(val):
+    """Parse a dataset/query value as float; None if not numeric."""
+    if val is None:
+        return None
+    try:
+        f = float(str(val).strip())
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(f) or math.isinf(f):
+        return None
+    return f
+
+
+def _norm(s):
+    return (s or "").strip().lower()
+
+
+class KDTree:
+    """
+    KD-tree over equal-length float tuples.
+    Each node is (point, payload, axis, left, right). Nodes are never
+    modified: inserted() returns a new tree sharing all untouched nodes.
+    """
+
+    def __init__(self, points, payloads):
+        self.dims = len(points[0]) if points else 0
+        items = list(zip(points, payloads))
+        self.size = len(items)
+        self.built_size = self.size      # balanced part; the rest came from inserted()
+        self.root = self._build(items, 0)
+
+    def inserted(self, points, payloads):
+        """New tree with the extra points added (path copying; self is unchanged)."""
+        tree = KDTree.__new__(KDTree)
+        tree.dims = self.dims or (len(points[0]) if points else 0)
+        tree.built_size = self.built_size
+        tree.size = self.size
+        root = self.root
+        for point, payload in zip(points, payloads):
+            root = tree._insert(root, point, payload, 0)
+            tree.size += 1
+        tree.root = root
+        return tree
+
+    def _insert(self, node, point, payload, depth):
+        if node is None:
+            return (point, payload, depth % self.dims, None, None)
+        npoint, npayload, axis, left, right = node
+        if point[axis] < npoint[axis]:
+            return (npoint, npayload, axis, self._insert(left, point, payload, depth + 1), right)
+        return (npoint, npayload, axis, left, self._insert(right, point, payload, depth + 1))
+
+    def _build(self, items, depth):
+        if not items:
+            return None
+        axis = depth % self.dims
+        items.sort(key=lambda it: it[0][axis])
+        mid = len(items) // 2
+        point, payload = items[mid]
+        return (point, payload, axis,
+                self._build(items[:mid], depth + 1),
+                self._build(items[mid + 1:], depth + 1))
+
+    def query(self, q, k=1, mask=None, where=None):
+        """
+        Return up to k (distance, payload) pairs nearest to q, closest first.
+        mask: per-dimension 0/1 weights (None = all dims); masked-out dims
+              are ignored in the distance but cannot prune, so RowIndex
+              builds trees over the queried dims instead of masking.
+        where: optional predicate on payload; rejected payloads are skipped.
+        """
+        if self.root is None or k <= 0:
+            return []
+        if mask is None:
+            mask = (1.0,) * self.dims
+        heap = []  # max-heap via negated squared distances: (-d2, seq, payload)
+        seq = 0
+
+        stack = [self.root]
+        # Iterative depth-first search; nearer child pushed last so it pops first.
+        # Far children are re-checked against the current bound when popped.
+        pending = []
+        while stack or pending:
+            if stack:
+                node = stack.pop()
+                bound = 0.0
+            else:
+                bound, node = pending.pop()
+                if len(heap) == k and bound > -heap[0][0]:
+                    continue
+            if node is None:
+                continue
+            point, payload, axis, left, right = node
+
+            if where is None or where(payload):
+                d2 = 0.0
+                for i in range(self.dims):
+                    if mask[i]:
+                        diff = point[i] - q[i]
+                        d2 += diff * diff
+                if len(heap) < k:
+                    heapq.heappush(heap, (-d2, seq, payload))
+                elif d2 < -heap[0][0]:
+                    heapq.heapreplace(heap, (-d2, seq, payload))
+                seq += 1
+
+            diff = q[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            plane = diff * diff if mask[axis] else 0.0
+            if far is not None:
+                pending.append((plane, far))
+            if near is not None:
+                stack.append(near)
+
+        out = sorted(((-nd2, s, p) for nd2, s, p in heap), key=lambda t: (t[0], t[1]))
+        return [(math.sqrt(d2), p) for d2, _, p in out]
+
+
+class RowIndex:
+    """
+    Nearest-neighbour index over standardized numeric columns of dataset rows,
+    partitioned by (district, crop). Partitions for "any district" / "any crop"
+    are also kept so district-only or crop-only queries stay logarithmic.
+    A tree covers one partition and one set of queried features (points are
+    projected onto those dims), built lazily on first use. extended() adds
+    appended rows to a copy of the index without rebuilding its trees.
+    """
+
+    def __init__(self, rows, features=NUMERIC_FEATURES,
+                 district_key="district_name", crop_key="crop"):
+        self.features = tuple(features)
+        self.district_key = district_key
+        self.crop_key = crop_key
+        self.size = len(rows)
+
+        # column statistics for z-score standardization
+        sums = [0.0] * len(self.features)
+        sqs = [0.0] * len(self.features)
+        counts = [0] * len(self.features)
+        for r in rows:
+            for i, f in enumerate(self.features):
+                v = to_float(r.get(f))
+                if v is not None:
+                    sums[i] += v
+                    sqs[i] += v * v
+                    counts[i] += 1
+        self.means, self.stds = [], []
+        for i in range(len(self.features)):
+            n = counts[i]
+            mean = sums[i] / n if n else 0.0
+            var = (sqs[i] / n - mean * mean) if n else 0.0
+            self.means.append(mean)
+            self.stds.append(math.sqrt(var) if var > 1e-12 else 1.0)
+
+        self._members = {}
+        for r in rows:
+            for key in self._partitions(r):
+                self._members.setdefault(key, []).append(r)
+        self._trees = {}    # (partition, dims) -> KDTree
+
+    def _partitions(self, row):
+        d, c = _norm(row.get(self.district_key)), _norm(row.get(self.crop_key))
+        return ((d, c), (d, ""), ("", c), ("", ""))
+
+    def extended(self, new_rows):
+        """
+        A new RowIndex that also covers new_rows (appended dataset rows).
+        Trees already built get the rows inserted (path copying, so this index
+        stays valid for concurrent readers); a tree whose inserted part
+        outgrows its balanced part is dropped and rebuilt on next use.
+        Standardization keeps this index's column statistics.
+        """
+        new_rows = list(new_rows)
+        index = RowIndex.__new__(RowIndex)
+        index.__dict__.update(self.__dict__)
+        index.size = self.size + len(new_rows)
+        index._members = dict(self._members)
+        added = {}
+        for r in new_rows:
+            for key in self._partitions(r):
+                added.setdefault(key, []).append(r)
+        for key, rows in added.items():
+            index._members[key] = self._members.get(key, []) + rows
+        index._trees = {}
+        for (key, dims), tree in self._trees.items():
+            rows = added.get(key)
+            if rows:
+                if tree.size + len(rows) > 2 * tree.built_size:
+                    continue
+                tree = tree.inserted([self._project(r, dims) for r in rows], rows)
+            index._trees[(key, dims)] = tree
+        return index
+
+    def standardize(self, values):
+        """Map {feature: value} to a standardized point; missing -> column mean (0)."""
+        point = []
+        for i, f in enumerate(self.features):
+            v = to_float(values.get(f))
+            point.append(0.0 if v is None else (v - self.means[i]) / self.stds[i])
+        return tuple(point)
+
+    def _project(self, values, dims):
+        point = self.standardize(values)
+        return tuple(point[i] for i in dims)
+
+    def _tree(self, key, dims):
+        tree = self._trees.get((key, dims))
+        if tree is None:
+            members = self._members.get(key, [])
+            tree = KDTree([self._project(r, dims) for r in members], members)
+            tree = self._trees.setdefault((key, dims), tree)   # a concurrent build may have won; trees are immutable
+        return tree
+
+    def _split_query(self, values):
+        """Canonicalize query keywords; return (values, dims) - dims: indices of the queried features."""
+        canon = {}
+        for k, v in values.items():
+            name = FEATURE_ALIASES.get(k.lower(), k.lower())
+            fv = to_float(v)
+            if name in self.features and fv is not None:
+                canon[name] = fv
+        dims = tuple(i for i, f in enumerate(self.features) if f in canon)
+        return canon, dims
+
+    def members(self, district=None, crop=None):
+        """Rows of one (district, crop) partition ("" / None = any), in dataset order."""
+        return self._members.get((_norm(district), _norm(crop)), [])
+
+    def _search(self, key, canon, dims, k, where):
+        if not dims:    # no numeric hint: every member is equally near
+            members = self._members.get(key, [])
+            return [(0.0, r) for r in members if where is None or where(r)][:k]
+        return self._tree(key, dims).query(self._project(canon, dims), k=k, where=where)
+
+    def query(self, district=None, crop=None, k=1, where=None, **values):
+        """
+        k nearest rows within the (district, crop) partition to the given
+        numeric values (e.g. rainfall=350, nitrogen=140). Only features present
+        in the query contribute to the distance. Returns a list of rows.
+        """
+        return [row for _, row in self.query_with_distance(district, crop, k, where, **values)]
+
+    def query_with_distance(self, district=None, crop=None, k=1, where=None, **values):
+        """Like query() but returns (distance, row) pairs."""
+        canon, dims = self._split_query(values)
+        return self._search((_norm(district), _norm(crop)), canon, dims, k, where)
+
+    def query_many(self, queries, k=1, where=None):
+        """
+        Batched query. queries: iterable of dicts with optional "district" /
+        "crop" keys plus numeric feature values. Queries are grouped by
+        partition so each partition's lookups run together.
+        Returns a list of row lists in input order.
+        """
+        queries = list(queries)
+        results = [None] * len(queries)
+        groups = {}
+        for i, q in enumerate(queries):
+            key = (_norm(q.get("district")), _norm(q.get("crop")))
+            groups.setdefault(key, []).append(i)
+        for key, idxs in groups.items():
+            for i in idxs:
+                vals = {f: v for f, v in queries[i].items() if f not in ("district", "crop")}
+                canon, dims = self._split_query(vals)
+                results[i] = [row for _, row in self._search(key, canon, dims, k, where)]
+        return results
+
+
+_index_cache = None  # (rows, RowIndex) - keeps rows alive so identity checks are safe
+
+
+_index_lock = threading.Lock()
+
+
+def _extends(rows, base, index):
+    """True if rows is base plus appended rows (the dataset is append-only)."""
+    n = index.size
+    return len(rows) > n and (n == 0 or (rows[0] is base[0] and rows[n - 1] is base[n - 1]))
+
+
+def has_index(rows):
+    """True if the cached index was built for exactly this rows list."""
+    cached = _index_cache
+    return cached is not None and cached[0] is rows
+
+
+def get_row_index(rows):
+    """
+    Return a RowIndex for this rows list. One (rows, index) pair is cached,
+    matched by list identity: the same snapshot reuses the index. A newer
+    snapshot of the append-only dataset (ingest swaps in rows + new_rows:
+    longer, and its first and last-indexed old rows are the same objects)
+    gets the extra rows inserted instead of a full rebuild.
+    """
+    global _index_cache
+    cached = _index_cache
+    if cached is not None and cached[0] is rows:
+        return cached[1]
+    with _index_lock:   # concurrent callers share one build
+        cached = _index_cache
+        if cached is not None and cached[0] is rows:
+            return cached[1]
+        if cached is not None and _extends(rows, *cached):
+            index = cached[1].extended(rows[cached[1].size:])
+        else:
+            index = RowIndex(rows)
+        _index_cache = (rows, index)
+    return index
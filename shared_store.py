@@ -0,0 +1,489 @@
+# shared_store.py
+# Shared-memory dataset + model for multi-process reply workers.
+#
+# The parent parses Final_Dataset_2.csv (plus the ingest delta log) once into
+# columns (float64 numerics, int32 codes for categoricals) inside one
+# multiprocessing.shared_memory block, together with everything a worker
+# would otherwise derive per row: dataset_connector's normalized rows and
+# label codes, and the model's yield estimates. The yield model is dumped
+# uncompressed to /dev/shm. Workers attach to both: dataset columns are NumPy
+# views on the shared block (zero-copy) and the model's arrays are
+# memory-mapped by joblib, so N workers do not hold N copies and do not
+# re-parse, re-normalize or re-predict anything: dataset_connector, templates
+# and data_loader all read the shared columns. Worker RSS and startup time
+# are reported.
+#
+#   python shared_store.py --workers 4
+
+import argparse
+import os
+import tempfile
+import time
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import get_all_start_methods, get_context, shared_memory
+
+import numpy as np
+
+import dataset_connector
+import ml_connector
+
+NUMERIC_COLUMNS = ("Nitrogen", "Phosphorus", "Potassium", "pH", "Rainfall", "Temperature")
+CATEGORICAL_COLUMNS = ("District_Name", "Soil_Color", "Crop", "Fertilizer", "Link")
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+# Imported once in the forkserver, so forked workers neither re-import them
+# (most of a spawned worker's startup is sklearn/scipy, pulled in by
+# unpickling the model) nor hold private copies of their pages
+PRELOAD_MODULES = ("sklearn.ensemble", "pandas", "dataset_connector", "ml_connector",
+                   "data_loader", "templates")
+DEFAULT_START_METHOD = "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+
+# Derived columns, prefixed so they never clash with CSV columns
+NORM_PREFIX = "norm:"     # dataset_connector.normalize_row() fields (categorical)
+CODE_PREFIX = "code:"     # dataset_connector label codes (int32)
+ESTIMATE_COLUMNS = ("est:pred", "est:low", "est:high", "est:conf")
+
+
+def _fmt(v):
+    """Float back to the CSV string form ('162', '7.9'); NaN -> ''."""
+    if v != v:
+        return ""
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _num(v):
+    """Float back to a Python number as read_csv would give it (162, 7.9); NaN -> None."""
+    if v != v:
+        return None
+    return int(v) if float(v).is_integer() else float(v)
+
+
+def _float_column(rows, col):
+    a = np.full(len(rows), np.nan, dtype=np.float64)
+    for i, r in enumerate(rows):
+        try:
+            a[i] = float(r.get(col, ""))
+        except (TypeError, ValueError):
+            pass
+    return a
+
+
+def _categorical_column(rows, col):
+    """(int32 codes, values) for one string column."""
+    codes, values = {}, []
+    a = np.empty(len(rows), dtype=np.int32)
+    for i, r in enumerate(rows):
+        v = r.get(col) or ""
+        c = codes.get(v)
+        if c is None:
+            c = codes[v] = len(values)
+            values.append(v)
+        a[i] = c
+    return a, values
+
+
+def _predict(rows):
+    """Model (pred, low, high, conf) arrays for rows, or None without a model."""
+    try:
+        return ml_connector.predict_interval_batch(rows)
+    except Exception as e:
+        print("[shared] No yield estimates to share:", e)
+        return None
+
+
+class SharedColumns:
+    """
+    Columnar dataset in a single shared-memory block. Also serves as
+    data_loader's query backend in workers (sqlite_store.SQLiteStore's
+    query / latest / average / append interface) over the column views.
+    """
+
+    def __init__(self, shm, layout, vocab, n_rows, owner, tables=None):
+        self._shm = shm
+        self.layout = layout      # name -> (offset, dtype str, length)
+        self.vocab = vocab        # categorical name -> list of values
+        self.n_rows = n_rows
+        self.tables = tables or {}    # dataset_connector label tables
+        self._owner = owner
+        self.columns = {
+            name: np.ndarray((length,), dtype=np.dtype(dt), buffer=shm.buf, offset=off)
+            for name, (off, dt, length) in layout.items()
+        }
+        self.data_columns = [name for name in layout if ":" not in name]
+        self._by_lower = {c.strip().lower(): c for c in self.data_columns}
+        self._appended = []       # rows ingested in this process (the block is fixed-size)
+
+    @classmethod
+    def from_csv(cls, path=None, numeric=NUMERIC_COLUMNS, categorical=CATEGORICAL_COLUMNS, **kwargs):
+        """The CSV plus its not-yet-compacted delta log (see dataset_ingest.py)."""
+        path = path or dataset_connector.DATASET_PATH
+        if os.path.abspath(path) == os.path.abspath(dataset_connector.DATASET_PATH):
+            delta = dataset_connector.DELTA_PATH
+        else:
+            delta = os.path.splitext(path)[0] + ".delta.csv"
+        rows = dataset_connector.read_rows(path) + dataset_connector.read_rows(delta)
+        return cls.from_rows(rows, numeric, categorical, **kwargs)
+
+    @classmethod
+    def from_rows(cls, rows, numeric=NUMERIC_COLUMNS, categorical=CATEGORICAL_COLUMNS,
+                  localize=True, estimates=True):
+        """
+        Columns for rows; localize adds dataset_connector's normalized rows and
+        label codes, estimates the current model's yield estimates.
+        """
+        n = len(rows)
+        arrays, vocab, tables = {}, {}, {}
+        for col in numeric:
+            arrays[col] = _float_column(rows, col)
+        for col in categorical:
+            arrays[col], vocab[col] = _categorical_column(rows, col)
+        if localize and rows:
+            normalized, codes, tables = dataset_connector.build_localization(rows)
+            for key in normalized[0]:
+                arrays[NORM_PREFIX + key], vocab[NORM_PREFIX + key] = _categorical_column(normalized, key)
+            for field, a in codes.items():
+                arrays[CODE_PREFIX + field] = a
+        est = _predict(rows) if estimates and rows else None
+        if est is not None:
+            for name, a in zip(ESTIMATE_COLUMNS, est):
+                arrays[name] = np.asarray(a, dtype=np.float64)
+
+        layout, offset = {}, 0
+        for name, a in arrays.items():
+            offset = (offset + 7) // 8 * 8   # 8-byte alignment
+            layout[name] = (offset, a.dtype.str, a.size)
+            offset += a.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        store = cls(shm, layout, vocab, n, owner=True, tables=tables)
+        for name, a in arrays.items():
+            store.columns[name][:] = a
+        return store
+
+    def descriptor(self):
+        """Small picklable handle workers use to attach."""
+        return {"name": self._shm.name, "layout": self.layout, "vocab": self.vocab,
+                "n_rows": self.n_rows, "tables": self.tables}
+
+    @classmethod
+    def attach(cls, descriptor):
+        shm = shared_memory.SharedMemory(name=descriptor["name"])
+        return cls(shm, descriptor["layout"], descriptor["vocab"], descriptor["n_rows"],
+                   owner=False, tables=descriptor["tables"])
+
+    @property
+    def nbytes(self):
+        return self._shm.size
+
+    def localization(self):
+        """dataset_connector.build_localization() result as views, or None if not shared."""
+        if not self.tables:
+            return None
+        keys = {name[len(NORM_PREFIX):]: name for name in self.layout if name.startswith(NORM_PREFIX)}
+        codes = {field: self.columns[CODE_PREFIX + field] for field in self.tables}
+        return SharedRows(self, keys), codes, self.tables
+
+    def estimates(self):
+        """(pred, low, high, conf) views, or None if the parent had no model."""
+        if ESTIMATE_COLUMNS[0] not in self.columns:
+            return None
+        return tuple(self.columns[name] for name in ESTIMATE_COLUMNS)
+
+    # ---------- data_loader backend ----------
+    def resolve(self, column):
+        """CSV column name for `column` (case-insensitive), or None."""
+        return self._by_lower.get(str(column).strip().lower())
+
+    def _value(self, col, i):
+        a = self.columns[col]
+        if col in self.vocab:
+            return self.vocab[col][a[i]] or None
+        return _num(a[i])
+
+    def _matches(self, district=None, crop=None, soil=None):
+        """(shared row indices, appended rows) for the filter, in insertion order."""
+        mask = np.ones(self.n_rows, dtype=bool)
+        tests = []
+        for col, value in (("District_Name", district), ("Crop", crop), ("Soil_Color", soil)):
+            if value and col in self.vocab:
+                want = str(value).strip().lower()
+                hits = [c for c, v in enumerate(self.vocab[col]) if v.strip().lower() == want]
+                mask &= np.isin(self.columns[col], hits)
+                tests.append((col, want))
+        extra = [r for r in self._appended
+                 if all(str(r.get(col) or "").strip().lower() == want for col, want in tests)]
+        return np.flatnonzero(mask), extra
+
+    @staticmethod
+    def _extra_value(row, col, numeric):
+        v = row.get(col)
+        if v is None or v == "":
+            return None
+        if numeric:
+            try:
+                return _num(float(v))
+            except (TypeError, ValueError):
+                return None
+        return v
+
+    def query(self, district=None, crop=None, soil=None, columns=None, limit=None):
+        """(column names, rows) for the filtered table in insertion order."""
+        cols = [c for c in (self.resolve(c) for c in (columns or self.data_columns)) if c]
+        idx, extra = self._matches(district, crop, soil)
+        rows = [tuple(self._value(c, i) for c in cols) for i in idx[:limit]]
+        rows += [tuple(self._extra_value(r, c, c not in self.vocab) for c in cols) for r in extra]
+        return cols, rows[:limit] if limit else rows
+
+    def average(self, column, district=None, crop=None, soil=None):
+        col = self.resolve(column)
+        if col is None or col in self.vocab:
+            return None
+        idx, extra = self._matches(district, crop, soil)
+        values = self.columns[col][idx]
+        values = np.concatenate([values[~np.isnan(values)],
+                                 [v for v in (self._extra_value(r, col, True) for r in extra) if v is not None]])
+        return round(float(values.mean()), 2) if values.size else None
+
+    def latest(self, column, district=None, crop=None, soil=None):
+        col = self.resolve(column)
+        if col is None:
+            return None
+        idx, extra = self._matches(district, crop, soil)
+        if extra:
+            return self._extra_value(extra[-1], col, col not in self.vocab)
+        return self._value(col, idx[-1]) if idx.size else None
+
+    def append(self, rows):
+        """Keep ingested rows (see dataset_connector.on_append) next to the shared block."""
+        rows = [{k.strip(): v for k, v in r.items()} for r in rows]
+        self._appended = self._appended + rows
+        return len(rows)
+
+    def close(self):
+        self.columns = {}
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class SharedRow(Mapping):
+    """
+    csv.DictReader-style row (string values) read from the shared columns.
+    keys: row key -> column name; strip: strip categorical values.
+    """
+    __slots__ = ("_store", "_i", "_keys", "_strip")
+
+    def __init__(self, store, i, keys, strip=False):
+        self._store = store
+        self._i = i
+        self._keys = keys
+        self._strip = strip
+
+    def __getitem__(self, key):
+        st = self._store
+        name = self._keys[key]
+        col = st.columns[name]
+        if name in st.vocab:
+            v = st.vocab[name][col[self._i]]
+            return v.strip() if self._strip else v
+        return _fmt(col[self._i])
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class SharedRows(Sequence):
+    """
+    Sequence of SharedRow views; drop-in for dataset_connector's row list
+    (keys=None: the CSV columns), or for templates' with
+    keys=template_keys(store), strip=True. The views are created once, so a
+    row keeps its identity across lookups (templates.find_best_row matches
+    rows by id()).
+    """
+
+    def __init__(self, store, keys=None, strip=False):
+        self._store = store
+        keys = keys if keys is not None else {name: name for name in store.data_columns}
+        self._rows = [SharedRow(store, i, keys, strip) for i in range(store.n_rows)]
+
+    def __getitem__(self, i):
+        return self._rows[i]
+
+    def __len__(self):
+        return len(self._rows)
+
+
+def template_keys(store):
+    """templates' row keys (lowercase, underscored, as _normalize_keys) -> CSV columns."""
+    return {name.strip().lower().replace(" ", "_"): name for name in store.data_columns}
+
+
+def publish_model(path=ml_connector.MODEL_PATH):
+    """Re-dump the model uncompressed into shared memory (tmpfs) for mmap loading."""
+    import joblib
+    model = joblib.load(path)
+    fd, shm_path = tempfile.mkstemp(prefix="crop_model_", suffix=".joblib", dir=SHM_DIR)
+    os.close(fd)
+    joblib.dump(model, shm_path, compress=0)
+    return shm_path
+
+
+# ---------- worker side ----------
+_store = None
+_worker_info = {}
+
+
+def _memory_mb():
+    """
+    (rss_mb, shared_mb) - shared counts every page also mapped by another
+    process (shared memory, the mmap'd model, pages inherited from the
+    forkserver), from /proc/self/smaps_rollup; falls back to peak RSS.
+    """
+    rss = shared = None
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    rss = int(line.split()[1]) / 1024.0
+                elif line.startswith(("Shared_Clean:", "Shared_Dirty:")):
+                    shared = (shared or 0.0) + int(line.split()[1]) / 1024.0
+    except OSError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return round(rss or 0.0, 1), round(shared or 0.0, 1)
+
+
+def attach_worker(descriptor, model_path=None, t_spawn=None):
+    """
+    Worker initializer: mmap-load the shared model, then attach to the shared
+    dataset and install it, with the parent's localization and estimates, as
+    the row source of dataset_connector, templates and data_loader. Nothing
+    is parsed, normalized or predicted here.
+    """
+    global _store, _worker_info
+    import data_loader
+    import templates
+    t0 = time.perf_counter()
+    _store = SharedColumns.attach(descriptor)
+    dataset_connector.use_rows(SharedRows(_store), localization=_store.localization())
+    if model_path:
+        import joblib
+        ml_connector.set_model(joblib.load(model_path, mmap_mode="r"),
+                               encoder=ml_connector.load_encoder(ml_connector.MODEL_PATH))
+        if _store.estimates() is not None:
+            dataset_connector.use_estimates(*_store.estimates())
+    templates.use_rows(SharedRows(_store, template_keys(_store), strip=True))
+    data_loader.use_store(_store)
+    rss, shared = _memory_mb()
+    _worker_info = {
+        "pid": os.getpid(),
+        "attach_s": round(time.perf_counter() - t0, 4),
+        "startup_s": round(time.time() - t_spawn, 3) if t_spawn else None,
+        "rss_mb": rss,
+        "shared_mb": shared,
+    }
+
+
+def worker_info():
+    info = dict(_worker_info)
+    info["rss_mb"], info["shared_mb"] = _memory_mb()
+    return info
+
+
+def _run(func, args, kwargs):
+    return func(*args, **kwargs), os.getpid()
+
+
+def _probe(delay):
+    time.sleep(delay)
+    return worker_info()
+
+
+class WorkerPool:
+    """
+    Process pool whose workers share the parent's dataset and model.
+    submit()/map() run module-level functions; stats() reports per-worker
+    startup time (pool creation -> worker ready, including interpreter
+    start and imports under "spawn") and RSS. Under "forkserver" the
+    PRELOAD_MODULES are imported once in the server.
+    """
+
+    def __init__(self, workers=2, csv_path=None, model_path=ml_connector.MODEL_PATH,
+                 start_method=DEFAULT_START_METHOD):
+        # estimates come from ml_connector's model: only share them for that one
+        self.store = SharedColumns.from_csv(csv_path, estimates=model_path == ml_connector.MODEL_PATH)
+        self.model_path = None
+        if model_path and os.path.exists(model_path):
+            self.model_path = publish_model(model_path)
+        self.workers = workers
+        ctx = get_context(start_method)
+        if start_method == "forkserver":
+            ctx.set_forkserver_preload(list(PRELOAD_MODULES))
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=ctx,
+            initializer=attach_worker,
+            initargs=(self.store.descriptor(), self.model_path, time.time()),
+        )
+
+    def submit(self, func, *args, **kwargs):
+        return self._pool.submit(_run, func, args, kwargs)
+
+    def map(self, func, iterable):
+        return [r for r, _ in self._pool.map(_run, repeat(func), ((x,) for x in iterable), repeat({}))]
+
+    def stats(self, probe_delay=0.05):
+        """One entry per worker (probes until every worker has answered)."""
+        seen = {}
+        for _ in range(4):
+            futs = [self._pool.submit(_probe, probe_delay) for _ in range(self.workers * 2)]
+            for f in futs:
+                info = f.result()
+                seen[info["pid"]] = info
+            if len(seen) >= self.workers:
+                break
+        return sorted(seen.values(), key=lambda d: d["pid"])
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        self.store.close()
+        if self.model_path and os.path.exists(self.model_path):
+            os.remove(self.model_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _demo_reply(query):
+    from voice_assistant import detect_intent, generate_reply
+    return generate_reply(detect_intent(query), "en", query)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared-memory worker pool demo")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    with WorkerPool(workers=args.workers) as pool:
+        print(f"[shared] dataset block: {pool.store.nbytes / 1024:.1f} KiB, "
+              f"{pool.store.n_rows} rows; model: {pool.model_path or 'not found'}")
+        queries = ["Kolhapur wheat fertilizer", "yield of maize in jodhpur", "सातारा पाऊस"]
+        replies = pool.map(_demo_reply, [queries[i % len(queries)] for i in range(args.queries)])
+        print(f"[shared] {len(replies)} replies in {time.perf_counter() - t0:.2f}s")
+        for info in pool.stats():
+            print(f"[shared] worker {info['pid']}: startup {info['startup_s']}s, "
+                  f"attach {info['attach_s']}s, RSS {info['rss_mb']} MB "
+                  f"(shared with other processes {info['shared_mb']} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# sqlite_store.py
+# SQLite storage backend for data_loader (datasets too large for a pandas frame).
+#
+# import_csv() streams the soil-test CSVs (main file + not-yet-compacted delta)
+# into one typed table: numeric columns REAL, categoricals TEXT COLLATE NOCASE
+# (case-insensitive matches still use the indexes). Covering indexes on
+# (District_Name, Crop), (Crop) and (Soil_Color) carry the numeric columns, so
+# filtered averages are answered from the index alone.
+#
+# SQLiteStore gives each thread its own read connection; queries use fixed SQL
+# text with ? parameters, so sqlite3's per-connection statement cache keeps
+# them prepared. Column names are checked against the table schema.
+#
+#   python sqlite_store.py --import              # (re)build Final_Dataset_2.sqlite
+#   python sqlite_store.py --avg Kolhapur Rainfall
+
+import argparse
+import csv
+import os
+import sqlite3
+import threading
+import time
+
+import dataset_connector
+
+TABLE = "soil_tests"
+NUMERIC_COLUMNS = ("Nitrogen", "Phosphorus", "Potassium", "pH", "Rainfall", "Temperature")
+DB_PATH = os.path.splitext(dataset_connector.DATASET_PATH)[0] + ".sqlite"
+
+# index name -> key columns (numeric columns are appended to make them covering)
+INDEXES = {
+    "idx_district_crop": ("District_Name", "Crop"),
+    "idx_crop": ("Crop",),
+    "idx_soil": ("Soil_Color",),
+}
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _to_real(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _sources_signature(paths):
+    """'path:size:mtime;...' for the CSVs the database was built from."""
+    parts = []
+    for p in paths:
+        if os.path.exists(p):
+            st = os.stat(p)
+            parts.append(f"{os.path.basename(p)}:{st.st_size}:{int(st.st_mtime)}")
+    return ";".join(parts)
+
+
+def _create_schema(conn, header):
+    cols = ", ".join(
+        f"{_quote(c)} REAL" if c in NUMERIC_COLUMNS else f"{_quote(c)} TEXT COLLATE NOCASE"
+        for c in header)
+    conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    conn.execute(f"CREATE TABLE {TABLE} (id INTEGER PRIMARY KEY, {cols})")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+
+def _create_indexes(conn, header):
+    numeric = [c for c in NUMERIC_COLUMNS if c in header]
+    for name, keys in INDEXES.items():
+        if all(k in header for k in keys):
+            cols = ", ".join(_quote(c) for c in list(keys) + numeric)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE} ({cols})")
+    conn.execute("ANALYZE")
+
+
+def _insert_sql(header):
+    return (f"INSERT INTO {TABLE} ({', '.join(_quote(c) for c in header)}) "
+            f"VALUES ({', '.join('?' for _ in header)})")
+
+
+def _typed(header, row):
+    return tuple(_to_real(row.get(c)) if c in NUMERIC_COLUMNS else (row.get(c) or "").strip()
+                 for c in header)
+
+
+def import_csv(db_path=DB_PATH, csv_paths=None, batch=5000):
+    """
+    Load the CSVs (default: dataset + delta log) into a fresh table, in one
+    transaction, streaming `batch` rows at a time. Indexes are built after
+    the bulk insert. Returns the number of rows imported.
+    """
+    csv_paths = [p for p in (csv_paths or [dataset_connector.DATASET_PATH, dataset_connector.DELTA_PATH])
+                 if os.path.exists(p)]
+    if not csv_paths:
+        raise FileNotFoundError("No dataset CSV to import")
+    with open(csv_paths[0], "r", encoding="utf-8") as f:
+        header = [c.strip() for c in next(csv.reader(f))]
+
+    t0 = time.perf_counter()
+    tmp = db_path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    n = 0
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        with conn:
+            _create_schema(conn, header)
+            sql = _insert_sql(header)
+            for path in csv_paths:
+                with open(path, "r", encoding="utf-8") as f:
+                    reader = csv.DictReader(f)
+                    reader.fieldnames = [c.strip() for c in reader.fieldnames]
+                    chunk = []
+                    for row in reader:
+                        chunk.append(_typed(header, row))
+                        if len(chunk) >= batch:
+                            conn.executemany(sql, chunk)
+                            n += len(chunk)
+                            chunk = []
+                    conn.executemany(sql, chunk)
+                    n += len(chunk)
+            _create_indexes(conn, header)
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('sources', ?)", (_sources_signature(csv_paths),))
+    finally:
+        conn.close()
+    os.replace(tmp, db_path)
+    print(f"[sqlite] imported {n} rows from {len(csv_paths)} file(s) in "
+          f"{time.perf_counter() - t0:.2f}s -> {db_path}")
+    return n
+
+
+def is_stale(db_path=DB_PATH, csv_paths=None):
+    """True if the database is missing or was built from different CSV contents."""
+    if not os.path.exists(db_path):
+        return True
+    csv_paths = csv_paths or [dataset_connector.DATASET_PATH, dataset_connector.DELTA_PATH]
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'sources'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return True
+    return not row or row[0] != _sources_signature(csv_paths)
+
+
+class SQLiteStore:
+    """
+    Read queries against the imported table. One connection per thread
+    (sqlite3 connections must not be shared across threads); append() uses
+    a separate write connection guarded by a lock.
+    """
+
+    def __init__(self, db_path=DB_PATH, cache_kib=65536, mmap_mib=256):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._pragmas = (f"PRAGMA cache_size=-{int(cache_kib)}", f"PRAGMA mmap_size={int(mmap_mib) << 20}")
+        conn = self._conn()
+        self.columns = [r[1] for r in conn.execute(f"PRAGMA table_info({TABLE})") if r[1] != "id"]
+        self._by_lower = {c.lower(): c for c in self.columns}
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=True, cached_statements=256)
+            for p in self._pragmas:
+                conn.execute(p)
+            conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+        return conn
+
+    def resolve(self, column):
+        """Schema column name for `column` (case-insensitive), or None."""
+        return self._by_lower.get(str(column).strip().lower())
+
+    def _where(self, district=None, crop=None, soil=None):
+        clauses, params = [], []
+        for col, value in (("District_Name", district), ("Crop", crop), ("Soil_Color", soil)):
+            if value and col in self._by_lower.values():
+                clauses.append(f"{_quote(col)} = ?")
+                params.append(str(value).strip())
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, district=None, crop=None, soil=None, columns=None, limit=None):
+        """(column names, rows) for the filtered table in insertion order."""
+        cols = [c for c in (self.resolve(c) for c in (columns or self.columns)) if c]
+        where, params = self._where(district, crop, soil)
+        sql = f"SELECT {', '.join(_quote(c) for c in cols)} FROM {TABLE}{where} ORDER BY id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return cols, self._conn().execute(sql, params).fetchall()
+
+    def average(self, column, district=None, crop=None, soil=None):
+        col = self.resolve(column)
+        if col is None:
+            return None
+        where, params = self._where(district, crop, soil)
+        row = self._conn().execute(f"SELECT AVG({_quote(col)}) FROM {TABLE}{where}", params).fetchone()
+        return None if row[0] is None else round(row[0], 2)
+
+    def latest(self, column, district=None, crop=None, soil=None):
+        col = self.resolve(column)
+        if col is None:
+            return None
+        where, params = self._where(district, crop, soil)
+        row = self._conn().execute(
+            f"SELECT {_quote(col)} FROM {TABLE}{where} ORDER BY id DESC LIMIT 1", params).fetchone()
+        return row[0] if row else None
+
+    def append(self, rows):
+        """Insert ingested rows (see dataset_connector.on_append)."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        with self._write_lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                with conn:
+                    conn.executemany(_insert_sql(self.columns),
+                                     [_typed(self.columns, {k.strip(): v for k, v in r.items()}) for r in rows])
+            finally:
+                conn.close()
+        return len(rows)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(db_path=DB_PATH, rebuild_if_stale=True):
+    """Open (importing first if missing or out of date) the shared SQLiteStore."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if rebuild_if_stale and is_stale(db_path):
+                    import_csv(db_path)
+                _store = SQLiteStore(db_path)
+    return _store
+
+
+def _reset_after_fork():
+    """A forked child must not reuse the parent's connections: open its own on demand."""
+    if _store is not None:
+        _store._local = threading.local()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite backend for data_loader")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--import", dest="do_import", action="store_true",
+                        help="(re)build the database from the dataset CSV and delta log")
+    parser.add_argument("--csv", nargs="*", help="CSV files to import instead of the defaults")
+    parser.add_argument("--avg", nargs=2, metavar=("DISTRICT", "COLUMN"))
+    args = parser.parse_args()
+
+    if args.do_import:
+        import_csv(args.db, args.csv)
+    if args.avg:
+        store = SQLiteStore(args.db)
+        t0 = time.perf_counter()
+        value = store.average(args.avg[1], district=args.avg[0])
+        print(f"[sqlite] AVG({args.avg[1]}) for {args.avg[0]} = {value} "
+              f"({(time.perf_counter() - t0) * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
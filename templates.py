@@ -5,10 +5,15 @@
 import csv
 import random
 import os
-from ml_connector import predict_yield
+import threading
+from dataset_connector import on_append
+from ml_connector import predict_yield_with_interval
+from row_index import get_row_index, has_index, to_float
+from metrics import timed
+from yield_index import get_yield_index, rank_phrase
 
 # ------------------ TEMPLATES ------------------
-# ~216 templates: irrigation, fertilizer, pest, sowing, yield, rainfall
+# ~216 templates: irrigation, fertilizer, pest, sowing, yield, rainfall (+ fertilizer_dose, fertilizer_dose_limit, yield_rank)
 # Languages: en, hi, mr
 
 TEMPLATES = {
@@ -250,6 +255,61 @@ TEMPLATES = {
             "{district} मध्ये तापमान {temperature}°C व पाऊस {rainfall} मिमी.",
             "{district} मध्ये पाऊस {rainfall} मिमी असल्यास खत योजना बदला."
         ]
+    },
+
+    # Filled from fertilizer_optimizer.DoseAdvice.fill_values()
+    "fertilizer_dose": {
+        "en": [
+            "For {crop} in {district}, apply {dose}: expected yield {dose_yield} quintals/acre (+{dose_gain}) for about Rs {dose_cost}/acre.",
+            "Recommended dose for {crop} in {district}: {dose}. Cost about Rs {dose_cost}/acre, yield gain {dose_gain} quintals/acre.",
+            "Based on your soil N {nitrogen}, apply {dose} to {crop}; net benefit about Rs {dose_net}/acre."
+        ],
+        "hi": [
+            "{district} में {crop} के लिए {dose} डालें: अनुमानित उपज {dose_yield} क्विंटल/एकड़ (+{dose_gain}), खर्च लगभग ₹{dose_cost}/एकड़।",
+            "{district} में {crop} के लिए अनुशंसित मात्रा: {dose}। खर्च लगभग ₹{dose_cost}/एकड़, उपज में {dose_gain} क्विंटल/एकड़ की बढ़त।",
+            "मिट्टी में नाइट्रोजन {nitrogen} है; {crop} को {dose} दें, शुद्ध लाभ लगभग ₹{dose_net}/एकड़।"
+        ],
+        "mr": [
+            "{district} मध्ये {crop} साठी {dose} द्या: अपेक्षित उत्पादन {dose_yield} क्विंटल/एकर (+{dose_gain}), खर्च सुमारे ₹{dose_cost}/एकर.",
+            "{district} मध्ये {crop} साठी शिफारस केलेली मात्रा: {dose}. खर्च सुमारे ₹{dose_cost}/एकर, उत्पादनात {dose_gain} क्विंटल/एकर वाढ.",
+            "मातीतील नायट्रोजन {nitrogen} आहे; {crop} ला {dose} द्या, निव्वळ फायदा सुमारे ₹{dose_net}/एकर."
+        ]
+    },
+
+    # DoseAdvice.limited: the dose stops at the search limit (highest nutrient
+    # levels recorded locally), so it is a ceiling, not a computed optimum
+    "fertilizer_dose_limit": {
+        "en": [
+            "For {crop} in {district}, up to {dose} keeps soil nutrients within the levels recorded locally (expected yield {dose_yield} quintals/acre, about Rs {dose_cost}/acre). Do not go beyond it without a soil test.",
+            "{dose} is the most {crop} in {district} should get based on local records; about Rs {dose_cost}/acre. Check with a soil test before applying more."
+        ],
+        "hi": [
+            "{district} में {crop} के लिए अधिकतम {dose} तक डालें - इससे मिट्टी के पोषक तत्व स्थानीय दर्ज स्तर में रहते हैं (अनुमानित उपज {dose_yield} क्विंटल/एकड़, खर्च लगभग ₹{dose_cost}/एकड़)। मिट्टी जाँच के बिना इससे अधिक न दें।",
+            "स्थानीय रिकॉर्ड के अनुसार {district} में {crop} को अधिकतम {dose} दें; खर्च लगभग ₹{dose_cost}/एकड़। अधिक देने से पहले मिट्टी जाँच कराएँ।"
+        ],
+        "mr": [
+            "{district} मध्ये {crop} साठी जास्तीत जास्त {dose} पर्यंत द्या - त्यामुळे मातीतील अन्नद्रव्ये स्थानिक नोंदवलेल्या पातळीत राहतात (अपेक्षित उत्पादन {dose_yield} क्विंटल/एकर, खर्च सुमारे ₹{dose_cost}/एकर). माती परीक्षणाशिवाय यापेक्षा जास्त देऊ नका.",
+            "स्थानिक नोंदींनुसार {district} मध्ये {crop} ला जास्तीत जास्त {dose} द्या; खर्च सुमारे ₹{dose_cost}/एकर. जास्त देण्यापूर्वी माती परीक्षण करा."
+        ]
+    },
+
+    # yield replies when recorded harvests exist for the district + crop (yield_index.py)
+    "yield_rank": {
+        "en": [
+            "Estimated yield for {crop} in {district} is {yield} quintals/acre ({confidence}% confidence), in the {yield_rank} of recorded harvests there.",
+            "{district}: {crop} may yield around {yield} quintals/acre - {yield_rank} locally (typical {yield_iqr}, median {yield_median}).",
+            "Predicted {yield} quintals/acre puts {crop} in {district} in the {yield_rank}; recorded median is {yield_median}."
+        ],
+        "hi": [
+            "{district} में {crop} का अनुमानित उत्पादन {yield} क्विंटल/एकड़ (विश्वसनीयता {confidence}%) है, जो दर्ज फसलों में {yield_rank} में है।",
+            "{district}: {crop} की उपज लगभग {yield} क्विंटल/एकड़ - स्थानीय {yield_rank} (सामान्य {yield_iqr}, माध्यिका {yield_median})।",
+            "{yield} क्विंटल/एकड़ का अनुमान {district} में {crop} को {yield_rank} में रखता है; दर्ज माध्यिका {yield_median} है।"
+        ],
+        "mr": [
+            "{district} मध्ये {crop} चे अपेक्षित उत्पादन {yield} क्विंटल/एकर (विश्वासार्हता {confidence}%), नोंदवलेल्या पिकांच्या {yield_rank} मध्ये.",
+            "{district}: {crop} ची उपज सुमारे {yield} क्विंटल/एकर - स्थानिक {yield_rank} (सामान्य {yield_iqr}, मध्यक {yield_median}).",
+            "{yield} क्विंटल/एकर अंदाजामुळे {district} मधील {crop} {yield_rank} मध्ये येते; नोंदवलेला मध्यक {yield_median} आहे."
+        ]
     }
 }
 
@@ -259,7 +319,80 @@ DEFAULT_DATA_PATH = "Final_Dataset_2.csv"
 
 
 
+# path -> rows snapshot. Snapshots are never mutated: ingest swaps in a new list.
+_snapshots = {}
+_snapshot_lock = threading.Lock()
+_rng_local = threading.local()
+
+
+def get_rng():
+    """Per-thread random.Random (independently seeded), so threads never share RNG state."""
+    rng = getattr(_rng_local, "rng", None)
+    if rng is None:
+        rng = _rng_local.rng = random.Random(int.from_bytes(os.urandom(8), "little"))
+    return rng
+
+
+if hasattr(os, "register_at_fork"):
+    # forked children (zygote.py) must not replay the parent's sequence
+    os.register_at_fork(after_in_child=_rng_local.__dict__.clear)
+
+
 def load_dataset(path=DEFAULT_DATA_PATH, normalize_cols=True):
+    """
+    Cached read_dataset(): parsed once per path (concurrent first callers
+    wait for one parse) and shared as a read-only snapshot.
+    """
+    rows = _snapshots.get(path)
+    if rows is None:
+        import dataset_connector
+        # not between an ingest's delta write and append (see dataset_connector.load_lock)
+        with dataset_connector.load_lock(), _snapshot_lock:
+            rows = _snapshots.get(path)
+            if rows is None:
+                rows = _snapshots[path] = read_dataset(path, normalize_cols)
+    return rows
+
+
+def use_rows(rows, path=DEFAULT_DATA_PATH):
+    """
+    Install an already-loaded snapshot for path (e.g. shared_store.SharedRows
+    with normalized keys in a worker process) instead of parsing the CSV.
+    """
+    with _snapshot_lock:
+        _snapshots[path] = rows
+
+
+@on_append
+def _extend_snapshots(new_rows):
+    """
+    Ingested rows: build extended snapshots of the main dataset, then swap
+    them in. An index built for the old snapshot gets the new rows inserted
+    here, so the first query after an ingest does not pay for it.
+    """
+    import dataset_connector
+    main = os.path.abspath(dataset_connector.DATASET_PATH)
+    extra = [_normalize_keys(r) for r in new_rows]
+    with _snapshot_lock:
+        for path, rows in list(_snapshots.items()):
+            if os.path.abspath(path) == main:
+                _snapshots[path] = extended = list(rows) + extra
+                if has_index(rows):
+                    get_row_index(extended)
+
+
+def _normalize_keys(raw):
+    """Column keys -> simple lowercase names without spaces; values stripped strings."""
+    row = {}
+    for k, v in raw.items():
+        if k is None:
+            continue
+        key_norm = k.strip().lower().replace(" ", "_")
+        row[key_norm] = "" if v is None else str(v).strip()
+    return row
+
+
+def read_dataset(path=DEFAULT_DATA_PATH, normalize_cols=True):
     """
     Load CSV into a list of dicts.
     Normalizes column names (lowercase, no spaces) and keys.
@@ -270,64 +403,58 @@ def load_dataset(path=DEFAULT_DATA_PATH, normalize_cols=True):
     with open(path, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for raw in reader:
-            # Normalize column keys to simple lowercase names without spaces
-            row = {}
-            for k, v in raw.items():
-                if k is None:
-                    continue
-                key = k.strip()
-                key_norm = key.lower().replace(" ", "_")
-                # row[key_norm] = v.strip() if isinstance(v, str) else v
-                if v is None:
-                    row[key_norm] = ""
-                else:
-                    row[key_norm] = str(v).strip()
-            rows.append(row)
+            rows.append(_normalize_keys(raw))
+    # rows ingested since the last compaction (dataset_ingest.py)
+    delta = os.path.splitext(path)[0] + ".delta.csv"
+    if path != delta and os.path.exists(delta):
+        rows += read_dataset(delta, normalize_cols)
     return rows
 
-def find_best_row(data, district=None, crop=None,soil = None,fertilizer = None,rainfall = None,pest  = None,season = None,Temperature = None,nitrogen = None,phosphorous = None):
+@timed("find_best_row")
+def find_best_row(data, district=None, crop=None,soil = None,fertilizer = None,rainfall = None,pest  = None,season = None,Temperature = None,nitrogen = None,phosphorous = None, rng=None):
     """
     Find best matching row by district and crop (case-insensitive).
-    If multiple matches exist, pick one (random) or the most recent if date present.
-    Returns None if no match.
+    Categorical hints (soil, fertilizer, pest, season) filter exactly; numeric
+    hints (rainfall, Temperature, nitrogen, phosphorous) pick the nearest row
+    on standardized values via row_index. Without numeric hints a random
+    candidate is returned. Returns None if no match.
+    District / crop select a row_index partition directly (no scan of the
+    dataset); the categorical hints are checked on the nearest hits, with k
+    widened until one matches or the partition is exhausted.
     """
     if not data:
         return None
-    candidates = data
-    if district:
-        district = district.strip().lower()
-        candidates = [r for r in candidates if r.get("district_name","").strip().lower() == district]
-    if crop:
-        crop = crop.strip().lower()
-        candidates = [r for r in candidates if r.get("crop","").strip().lower() == crop]
-    if soil :
-        soil = soil.strip().lower()
-        candidates = [r for r in candidates if r.get("soil_color","soil").strip().lower()==soil]
-    if fertilizer : 
-        fertilizer = fertilizer.strip().lower()
-        candidates = [r for r in candidates if r.get("fertilizer","").strip().lower()==fertilizer]
-    if rainfall : 
-        rainfall = rainfall.strip().lower()
-        candidates = [r for r in candidates if r.get("rainfall","").strip().lower()==rainfall]
-    if pest : 
-        pest = pest.strip().lower()
-        candidates = [r for r in candidates if r.get("pest","").strip().lower()==pest]
-    if season : 
-        season = season.strip().lower()
-        candidates = [r for r in candidates if r.get("season","").strip().lower()==season]
-    if Temperature : 
-        Temperature = Temperature.strip().lower()
-        candidates = [r for r in candidates if r.get("Temperature","").strip().lower()==Temperature]
-    if nitrogen : 
-        nitrogen= nitrogen.strip().lower()
-        candidates = [r for r in candidates if r.get("nitrogen","").strip().lower()==nitrogen]   
-    if phosphorous:
-        phosphorous = phosphorous.strip().lower()
-        candidates = [r for r in candidates if r.get("phosphorous","").strip().lower()== phosphorous]
+    index = get_row_index(data)
+    filters = [(key, value.strip().lower(), default)
+               for key, value, default in (("soil_color", soil, "soil"), ("fertilizer", fertilizer, ""),
+                                           ("pest", pest, ""), ("season", season, ""))
+               if value]
+
+    def matches(r):
+        return all(r.get(key, default).strip().lower() == value for key, value, default in filters)
+
+    # Numeric hints (rainfall/temperature/N/P) -> nearest neighbour instead of
+    # exact string equality, which almost never matches measured values.
+    numeric = {"rainfall": rainfall, "temperature": Temperature,
+               "nitrogen": nitrogen, "phosphorus": phosphorous}
+    numeric = {k: v for k, v in numeric.items() if to_float(v) is not None}
+    if numeric:
+        k = 1 if not filters else 8
+        while True:
+            hits = index.query(district=district, crop=crop, k=k, **numeric)
+            for r in hits:
+                if matches(r):
+                    return r
+            if len(hits) < k:
+                return None
+            k *= 4
+    candidates = index.members(district, crop)
+    if filters:
+        candidates = [r for r in candidates if matches(r)]
     if not candidates:
         return None
     # Prefer exact match if available, else random choice
-    return random.choice(candidates)
+    return (rng or get_rng()).choice(candidates)
 
 def safe_get(row, keys, default="N/A"):
     """
@@ -411,14 +538,33 @@ def build_fill_values(row, district, crop,soil,fertilizer,rainfall,pest,season,T
     vals["season"] = season_val
 
     yield_val = safe_get(row, ["yield"])
+    confidence = safe_get(row, ["confidence"], default="75")
+    estimated = False
     if yield_val == "N/A" or yield_val.strip() == "":
         try:
-            yield_val = str(predict_yield(row))  # use ML model
+            est = predict_yield_with_interval(row)  # use ML model
+            yield_val = str(est["yield"])
+            confidence = str(est["confidence"])     # from the prediction interval width
         except Exception:
             yield_val = str(estimate_yield(row)) # fallback heuristic
+            estimated = True
     vals["yield"] = yield_val
-    vals["yield"] = yield_val if yield_val != "N/A" else str(estimate_yield(row))
-    vals["confidence"] = safe_get(row, ["confidence"], default="75")
+    vals["confidence"] = confidence
+    # where the yield sits among recorded harvests for this district + crop:
+    # the row's own (English) names - vals may hold localized ones - and only
+    # for a recorded or model yield, never the heuristic fallback
+    rank = None
+    row_district = safe_get(row, ["district_name", "district"])
+    row_crop = safe_get(row, ["crop"])
+    if not estimated and "N/A" not in (row_district, row_crop):
+        try:
+            rank = get_yield_index().describe(row_district, row_crop, float(yield_val))
+        except (OSError, ValueError):
+            rank = None
+    if rank:
+        vals["yield_rank"] = rank_phrase(rank["percentile"], lang)
+        vals["yield_median"] = f"{rank['median']:g}"
+        vals["yield_iqr"] = f"{rank['q1']:g}-{rank['q3']:g}"
     vals["nitrogen"] = safe_get(row, ["nitrogen"])
     
     vals["ph"] = safe_get(row, ["p_h", "ph"])  # sometimes pH normalized differently
@@ -430,25 +576,30 @@ def build_fill_values(row, district, crop,soil,fertilizer,rainfall,pest,season,T
     return vals
     # return vals
 
-def pick_template(intent, lang):
+def pick_template(intent, lang, rng=None):
     """
     Pick a random template string for the given intent and language.
+    rng: random.Random for this request (default: the thread's own).
     """
     intent = intent if intent in TEMPLATES else "irrigation"
     lang = lang if lang in TEMPLATES.get(intent, {}) else "en"
     choices = TEMPLATES[intent][lang]
-    return random.choice(choices)
+    return (rng or get_rng()).choice(choices)
 
+@timed("generate_filled_template")
 def generate_filled_template(intent, lang="en", district=None, crop=None,
                              soil=None, fertilizer=None, rainfall=None,
                              pest=None, season=None, Temperature=None,
                              nitrogen=None, phosphorous=None,
-                             data_path=DEFAULT_DATA_PATH):
+                             data_path=DEFAULT_DATA_PATH, rng=None, row=None):
     """
     High-level helper:
       - loads dataset (CSV) without pandas
       - finds the best matching row for district+crop
       - picks a template and fills placeholders from the row
+    rng: random.Random for this request (default: the calling thread's own)
+    row: dataset row already looked up by the caller (e.g.
+         LocalizedRow.dataset_row()); skips the search
     Returns: filled string
     """
     # Load dataset
@@ -456,7 +607,7 @@ def generate_filled_template(intent, lang="en", district=None, crop=None,
         data = load_dataset(data_path)
     except FileNotFoundError:
         # If dataset not present, just return a template with defaults
-        template = pick_template(intent, lang)
+        template = pick_template(intent, lang, rng)
         return template.format(
             district=district or "your district",
             crop=crop or "your crop",
@@ -474,19 +625,42 @@ def generate_filled_template(intent, lang="en", district=None, crop=None,
         )
 
     # find matching row
-    row = find_best_row(
-        data, district=district, crop=crop, soil=soil,
-        fertilizer=fertilizer, rainfall=rainfall,
-        pest=pest, season=season, Temperature=Temperature,
-        nitrogen=nitrogen, phosphorous=phosphorous
-    )
+    if row is not None:
+        row = _normalize_keys(row)
+    else:
+        row = find_best_row(
+            data, district=district, crop=crop, soil=soil,
+            fertilizer=fertilizer, rainfall=rainfall,
+            pest=pest, season=season, Temperature=Temperature,
+            nitrogen=nitrogen, phosphorous=phosphorous, rng=rng
+        )
 
     vals = build_fill_values(row, district, crop, soil, fertilizer,
                              rainfall, pest, season, Temperature,
                              nitrogen, phosphorous, lang)
+    return render_template(intent, lang, row, vals, rng)
+
 
-    # pick template
-    template = pick_template(intent, lang)
+def render_template(intent, lang, row, vals, rng=None, dose=True):
+    """
+    Pick a template and fill it from build_fill_values() output.
+    dose: True = run the fertilizer optimizer for fertilizer replies, a
+    DoseAdvice = use that one, False/None = plain fertilizer templates.
+    """
+    # pick template (fertilizer: model-optimized dose when the search finds one;
+    # yield: ranked against recorded harvests when there are enough of them)
+    template = pick_template("yield_rank" if intent == "yield" and vals.get("yield_rank") else intent, lang, rng)
+    dose_vals = {}
+    if intent == "fertilizer" and row and dose:
+        try:
+            if dose is True:
+                from fertilizer_optimizer import recommend_dose
+                dose = recommend_dose(row)
+            if dose.doses:
+                template = pick_template("fertilizer_dose_limit" if dose.limited else "fertilizer_dose", lang, rng)
+                dose_vals = dose.fill_values(lang)
+        except Exception as e:
+            print("[templates] dose optimizer unavailable:", e)
     vals = {k: (v if v not in ("N/A", "Unknown", None, "") else "not recorded")
         for k, v in vals.items()}
 
@@ -504,6 +678,10 @@ def generate_filled_template(intent, lang="en", district=None, crop=None,
             temperature=vals.get("temperature", "25"),
             nitrogen=vals.get("nitrogen", "N"),
             ph=vals.get("ph", "7"),
+            yield_rank=vals.get("yield_rank", ""),
+            yield_median=vals.get("yield_median", ""),
+            yield_iqr=vals.get("yield_iqr", ""),
+            **dose_vals,
             **{"yield": vals.get("yield", "20")}
         )
     except KeyError as e:
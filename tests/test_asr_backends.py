@@ -0,0 +1,72 @@
+# test_asr_backends.py
+
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import asr_backends
+from asr_backends import ASRBackend, get_backend, make_backend
+
+
+class _StubWhisperModel:
+    dims = SimpleNamespace(n_mels=80)
+
+    def detect_language(self, mel):
+        return None, {"en": 0.1, "hi": 0.2, "mr": 0.6, "ne": 0.05, "sa": 0.05}
+
+    def transcribe(self, audio, **options):
+        self.options = options
+        return {"text": " पाणी किती ", "language": options.get("language")}
+
+
+@pytest.fixture
+def stub_whisper(monkeypatch):
+    """A whisper module whose load_model() counts loads and returns _StubWhisperModel."""
+    loads = []
+
+    def load_model(size, device="cpu"):
+        loads.append(size)
+        return _StubWhisperModel()
+
+    monkeypatch.setitem(sys.modules, "whisper", SimpleNamespace(
+        load_model=load_model, pad_or_trim=lambda audio: audio,
+        log_mel_spectrogram=lambda audio, n_mels=80: audio))
+    monkeypatch.setattr(asr_backends, "_backends", {})
+    return loads
+
+
+def test_backend_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        ASRBackend()
+
+    class Incomplete(ASRBackend):
+        def load(self):
+            return self
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_make_backend_names():
+    assert make_backend("whisper-int8").name == "whisper-int8"
+    assert make_backend("faster-whisper", beam_size=0).beam_size == 1
+    with pytest.raises(ValueError):
+        make_backend("kaldi")
+
+
+def test_get_backend_loads_once_per_settings(stub_whisper):
+    a = get_backend("whisper", "tiny", beam_size=None)
+    assert get_backend("whisper", "tiny", beam_size=1) is a
+    assert get_backend("whisper", "tiny", beam_size=5) is not a
+    assert stub_whisper == ["tiny", "tiny"]
+
+
+def test_transcribe_detailed_keeps_only_prob_langs(stub_whisper):
+    backend = get_backend("whisper", "tiny")
+    text, lang, probs = backend.transcribe_detailed(np.zeros(16000, dtype=np.float32))
+    assert (text, lang) == ("पाणी किती", "mr")
+    assert set(probs) == set(asr_backends.PROB_LANGS)
+    assert probs["mr"] == pytest.approx(0.6)
+    assert backend.model.options["language"] == "mr"      # detection reused, not re-run
@@ -0,0 +1,40 @@
+# test_audio_capture.py
+
+import numpy as np
+
+from audio_capture import EnergyVAD, FileSource, capture_utterance
+
+SR = 16000
+
+
+def _speech_clip(onset_s=0.0, voiced_s=1.2, tail_s=1.0, seed=0):
+    """Syllable-modulated harmonic 'speech' over a low noise floor."""
+    t = np.arange(int(voiced_s * SR)) / SR
+    voice = 0.3 * np.sin(2 * np.pi * 3 * t) ** 2 * (np.sin(2 * np.pi * 140 * t) + 0.5 * np.sin(2 * np.pi * 280 * t))
+    audio = np.concatenate([np.zeros(int(onset_s * SR)), voice, np.zeros(int(tail_s * SR))])
+    return (audio + np.random.default_rng(seed).normal(0, 0.001, audio.size)).astype(np.float32)
+
+
+def test_speech_at_the_very_start_is_captured():
+    audio, info = capture_utterance(FileSource(audio=_speech_clip(onset_s=0.0)), vad=EnergyVAD())
+    assert info["speech"]
+    assert info["utterance_s"] >= 1.0
+    # the pre-roll keeps the onset: the first samples of the clip are in the utterance
+    assert np.abs(audio[:SR // 10]).max() > 0.05
+
+
+def test_speech_after_silence_is_captured():
+    _, info = capture_utterance(FileSource(audio=_speech_clip(onset_s=0.5)), vad=EnergyVAD())
+    assert info["speech"]
+
+
+def test_noise_alone_is_not_speech():
+    noise = np.random.default_rng(1).normal(0, 0.01, SR * 3).astype(np.float32)
+    _, info = capture_utterance(FileSource(audio=noise), vad=EnergyVAD(), no_speech_timeout=2.5)
+    assert not info["speech"]
+
+
+def test_seeded_floor_skips_calibration():
+    vad = EnergyVAD(noise_db=-60.0)
+    assert vad.is_speech(np.full(480, 0.1, dtype=np.float32))
+    assert vad.noise_db == -60.0
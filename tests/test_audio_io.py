@@ -0,0 +1,39 @@
+# test_audio_io.py
+
+import os
+
+import numpy as np
+import pytest
+
+from audio_io import ASR_SAMPLE_RATE, as_asr_input, resample, to_float32_mono
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_int16_stereo_to_float32_mono():
+    pcm = np.array([[32767, -32768], [16384, 16384], [0, 0]], dtype=np.int16)
+    mono = to_float32_mono(pcm)
+    assert mono.dtype == np.float32 and mono.shape == (3,)
+    np.testing.assert_allclose(mono, [-0.5 / 32768, 0.5, 0.0], atol=1e-6)
+
+
+def test_float32_mono_is_not_copied():
+    audio = np.zeros(16000, dtype=np.float32)
+    assert as_asr_input(audio) is audio
+
+
+def test_resample_keeps_duration_and_pitch():
+    sr = 44100
+    t = np.arange(sr) / sr
+    tone = np.sin(2 * np.pi * 440 * t).astype(np.float32)
+    out = as_asr_input(tone, source_sr=sr)
+    assert out.dtype == np.float32 and out.size == ASR_SAMPLE_RATE
+    peak_hz = np.argmax(np.abs(np.fft.rfft(out))) * ASR_SAMPLE_RATE / out.size
+    assert abs(peak_hz - 440) <= 1
+    assert resample(out, ASR_SAMPLE_RATE) is out
+
+
+def test_load_wav_in_process():
+    pytest.importorskip("soundfile")
+    audio = as_asr_input(os.path.join(ROOT, "input.wav"))
+    assert audio.dtype == np.float32 and audio.ndim == 1 and audio.size
@@ -0,0 +1,47 @@
+# test_audio_preprocess.py
+
+import numpy as np
+
+from audio_preprocess import normalize, preprocess, split_utterances, trim_silence
+
+SR = 16000
+
+
+def _tone(seconds, amp=0.3, hz=220):
+    t = np.arange(int(seconds * SR)) / SR
+    return (amp * np.sin(2 * np.pi * hz * t)).astype(np.float32)
+
+
+def _silence(seconds, seed=0):
+    return np.random.default_rng(seed).normal(0, 0.0005, int(seconds * SR)).astype(np.float32)
+
+
+def test_trim_keeps_speech_and_padding():
+    audio = np.concatenate([_silence(1.0), _tone(0.5), _silence(2.0, seed=1)])
+    trimmed, _ = trim_silence(audio, SR, pad_ms=150)
+    assert 0.5 <= trimmed.size / SR <= 0.5 + 0.3 + 0.04   # speech + both pads (+ frame rounding)
+    assert np.abs(trimmed).max() > 0.29
+
+
+def test_split_at_long_gaps_only():
+    audio = np.concatenate([_silence(0.5), _tone(0.6), _silence(0.2, 1), _tone(0.6),
+                            _silence(1.0, 2), _tone(0.8), _silence(0.5, 3)])
+    parts = split_utterances(audio, SR, min_gap_ms=500)
+    assert len(parts) == 2                     # the 0.2 s pause does not split
+    assert parts[0].size > parts[1].size
+
+
+def test_normalize_peak_and_silence():
+    out = normalize(_tone(0.2, amp=0.05), target_db=-1.0)
+    assert abs(np.abs(out).max() - 10 ** (-1 / 20)) < 1e-3
+    quiet = np.zeros(100, dtype=np.float32)
+    assert normalize(quiet) is quiet
+
+
+def test_preprocess_reports_dropped_audio():
+    audio = np.concatenate([_silence(2.0), _tone(1.0), _silence(2.0, 1)])
+    segments, report = preprocess(audio, SR)
+    assert report["segments"] == 1 and report["input_s"] == 5.0
+    assert report["dropped_s"] > 3.5
+    assert report["output_s"] == round(segments[0].size / SR, 3)
+    assert preprocess(_silence(1.0), SR)[1]["segments"] == 0
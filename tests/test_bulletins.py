@@ -0,0 +1,70 @@
+# test_bulletins.py
+
+import pytest
+
+import bulletins
+import ml_connector
+import templates
+
+HEADER = "District_Name,Soil_Color,Nitrogen,Phosphorus,Potassium,pH,Rainfall,Temperature,Crop,Fertilizer,Yield\n"
+ROWS = ("Pune,Black,120,40,60,7.5,500,25,Rice,Urea,30\n"
+        "Satara,Red,90,30,50,6.8,300,27,Wheat,DAP,18\n"
+        "Kolhapur,Black,100,20,40,7,900,24,Sugarcane,MOP,400\n"
+        "Kolhapur,Black,110,25,45,7.2,950,24,Rice,Urea,32\n")
+
+
+@pytest.fixture
+def small_dataset(tmp_path, monkeypatch):
+    path = tmp_path / "data.csv"
+    path.write_text(HEADER + ROWS, encoding="utf-8")
+    monkeypatch.setattr(templates, "_snapshots", {})
+    templates.use_rows(templates.read_dataset(str(path)))
+
+    def no_model():
+        raise FileNotFoundError("no model")
+
+    monkeypatch.setattr(ml_connector, "load_model", no_model)
+    monkeypatch.setattr(bulletins, "_groups", (None, {}))
+
+
+def _run(out, **kwargs):
+    total, jobs = bulletins.dataset_jobs(langs=("en", "mr"))
+    return bulletins.generate(jobs, str(out), total, batch=5, dose=False, signature="test", **kwargs)
+
+
+@pytest.mark.parametrize("name", ["b.jsonl", "b.csv"])
+def test_resume_writes_the_same_bytes(small_dataset, tmp_path, monkeypatch, name):
+    full, cut = tmp_path / ("full." + name), tmp_path / name
+    assert _run(full) == 4 * len(bulletins.INTENTS) * 2
+
+    real_render = bulletins.render_batch
+    calls = []
+
+    def crash_on_third(start, jobs, seed=0, dose=True):
+        calls.append(start)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return real_render(start, jobs, seed, dose)
+
+    monkeypatch.setattr(bulletins, "render_batch", crash_on_third)
+    with pytest.raises(KeyboardInterrupt):
+        _run(cut)
+    monkeypatch.setattr(bulletins, "render_batch", real_render)
+    with open(cut, "ab") as f:
+        f.write(b"partial batch past the checkpoint")
+
+    assert _run(cut, resume=True) == 4 * len(bulletins.INTENTS) * 2 - 10
+    assert cut.read_bytes() == full.read_bytes()
+
+
+def test_resume_rejects_other_settings(small_dataset, tmp_path):
+    out = tmp_path / "b.jsonl"
+    _run(out)
+    total, jobs = bulletins.dataset_jobs()
+    with pytest.raises(ValueError, match="different settings"):
+        bulletins.generate(jobs, str(out), total, resume=True, signature="other")
+
+
+def test_sms_parts():
+    assert bulletins.sms_parts("a" * 160) == 1 and bulletins.sms_parts("a" * 161) == 2
+    assert bulletins.sms_parts("क" * 70) == 1 and bulletins.sms_parts("क" * 135) == 3
@@ -0,0 +1,113 @@
+# test_cloud_asr.py
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from cloud_asr import CloudASRClient, CloudASRError, HedgedASR, MockASRServer
+
+AUDIO = np.zeros(1600, dtype=np.float32)
+
+
+def _local(delay=0.0, text="local text"):
+    calls = []
+
+    def run(audio):
+        calls.append(time.perf_counter())
+        time.sleep(delay)
+        return text, "hi"
+    run.calls = calls
+    return run
+
+
+@pytest.fixture
+def server():
+    with MockASRServer(latency=0.0) as srv:
+        yield srv
+
+
+def _client(server, **kw):
+    return CloudASRClient(server.url + "/transcribe", provider="http", **kw)
+
+
+def test_keep_alive_reuses_one_connection(server):
+    client = _client(server)
+    for _ in range(3):
+        assert client.transcribe(AUDIO, "hi-IN") == ("Kolhapur wheat fertilizer", "hi-IN")
+    assert client.stats["connections"] == 1
+    assert server.stats == {"requests": 3, "connections": 1}
+
+
+def test_google_provider_needs_a_key(monkeypatch, server):
+    monkeypatch.delenv("GOOGLE_SPEECH_API_KEY", raising=False)
+    with pytest.raises(CloudASRError, match="GOOGLE_SPEECH_API_KEY"):
+        CloudASRClient(provider="google")
+    client = CloudASRClient(server.url + "/recognize", provider="google", key="test-key")
+    assert client.transcribe(AUDIO, "hi-IN")[0] == "Kolhapur wheat fertilizer"
+
+
+def test_retries_then_gives_up_on_5xx(server):
+    server.configure(fail_rate=1.0)
+    client = _client(server, retries=2, backoff=0.01)
+    with pytest.raises(CloudASRError, match="503"):
+        client.transcribe(AUDIO)
+    assert server.stats["requests"] == 3
+    assert client.stats["retries"] == 2
+
+
+def test_deadline_bounds_a_slow_server(server):
+    server.configure(latency=2.0)
+    client = _client(server, read_timeout=5.0, deadline=0.3)
+    t0 = time.perf_counter()
+    with pytest.raises(CloudASRError):
+        client.transcribe(AUDIO)
+    assert time.perf_counter() - t0 < 1.0
+
+
+def test_fast_cloud_wins_without_local(server):
+    local = _local()
+    hedged = HedgedASR(_client(server), local, hedge_after=1.0)
+    assert hedged.transcribe(AUDIO)[2] == "cloud"
+    assert not local.calls
+    hedged.close()
+
+
+def test_slow_cloud_is_hedged_after_the_delay(server):
+    server.configure(latency=1.5)
+    local = _local()
+    hedged = HedgedASR(_client(server, deadline=2.0, read_timeout=2.0), local, hedge_after=0.2)
+    t0 = time.perf_counter()
+    text, _, source = hedged.transcribe(AUDIO)
+    assert (text, source) == ("local text", "local")
+    assert 0.2 <= local.calls[0] - t0 < 0.5
+    hedged.close()
+
+
+def test_failed_cloud_falls_back_immediately(server):
+    server.configure(fail_rate=1.0)
+    local = _local()
+    hedged = HedgedASR(_client(server, retries=0), local, hedge_after=1.0)
+    t0 = time.perf_counter()
+    assert hedged.transcribe(AUDIO)[2] == "local"
+    assert time.perf_counter() - t0 < 0.5
+    hedged.close()
+
+
+def test_hung_cloud_requests_do_not_queue_the_local_leg(server):
+    server.configure(latency=1.5)
+    local = _local()
+    hedged = HedgedASR(_client(server, deadline=2.0, read_timeout=2.0), local,
+                       hedge_after=0.1, max_workers=1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(hedged.transcribe(AUDIO))) for _ in range(3)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # three local runs, none of them waiting for the single busy cloud worker
+    assert [r[2] for r in results] == ["local"] * 3
+    assert time.perf_counter() - t0 < 1.0
+    hedged.close()
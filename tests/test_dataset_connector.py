@@ -0,0 +1,95 @@
+# test_dataset_connector.py
+
+import numpy as np
+
+import dataset_connector
+from dataset_connector import LocalizedRow, append_rows, load_dataset, use_rows
+
+
+def _row(district, crop):
+    return {"District_Name": district, "Soil_Color": "Black", "Nitrogen": "100", "Phosphorus": "40",
+            "Potassium": "60", "pH": "7", "Rainfall": "500", "Temperature": "25",
+            "Crop": crop, "Fertilizer": "Urea", "Link": ""}
+
+
+def test_append_swaps_new_lists(monkeypatch):
+    for name in ("_dataset_cache", "_localization"):
+        monkeypatch.setattr(dataset_connector, name, getattr(dataset_connector, name))   # restored after
+    monkeypatch.setattr(dataset_connector, "_append_listeners", [])
+    use_rows([_row("Pune", "Rice"), _row("Satara", "Wheat")])
+    rows = load_dataset()
+    norm_rows, codes, tables = dataset_connector._localization
+
+    assert append_rows([_row("Kolhapur", "Jowar")]) == 1
+
+    # lists a reader already holds are left as they were
+    assert len(rows) == len(norm_rows) == len(codes["district"]) == 2
+    assert len(load_dataset()) == len(dataset_connector._localization[0]) == 3
+    assert LocalizedRow(2, "mr")["district"] == "कोल्हापूर"
+    assert LocalizedRow(0)["district"] == "Pune"
+
+
+def test_model_estimates_are_lazy_and_cached_per_model(monkeypatch):
+    import ml_connector
+    for name in ("_dataset_cache", "_localization", "_estimates"):
+        monkeypatch.setattr(dataset_connector, name, getattr(dataset_connector, name))
+    models = [object()]
+    calls = []
+
+    def predict(rows):
+        calls.append(len(rows))
+        n = len(rows)
+        return np.full(n, 42.0), np.full(n, 40.0), np.full(n, 44.0), np.full(n, 95)
+
+    monkeypatch.setattr(ml_connector, "get_model_and_encoder", lambda: (models[0], None))
+    monkeypatch.setattr(ml_connector, "predict_interval_batch", predict)
+    use_rows([_row("Pune", "Rice"), _row("Satara", "Wheat"), _row("Kolhapur", "Jowar")])
+    assert calls == []                       # loading the dataset predicts nothing
+
+    row = LocalizedRow(1)
+    assert (row["yield"], row["yield_range"], row["confidence"]) == ("42.00 quintals/acre", "40.00-44.00", "95")
+    assert calls == [1]                      # only the looked-up row, once
+    models[0] = object()                     # another model installed
+    assert row["confidence"] == "95" and calls == [1, 1]
+
+
+def test_heuristic_yield_without_a_model(monkeypatch):
+    import ml_connector
+    for name in ("_dataset_cache", "_localization", "_estimates"):
+        monkeypatch.setattr(dataset_connector, name, getattr(dataset_connector, name))
+
+    def no_model():
+        raise FileNotFoundError("no model")
+
+    monkeypatch.setattr(ml_connector, "get_model_and_encoder", no_model)
+    use_rows([_row("Pune", "Rice")])
+    assert LocalizedRow(0)["yield"].endswith("quintals/acre")
+    assert LocalizedRow(0)["confidence"] in ("High", "Medium", "Low")
+
+
+def test_label_table_codes_and_missing_translations():
+    from dataset_connector import LabelTable
+    table = LabelTable("fertilizer")
+    assert table.encode("Urea") == table.encode("Urea") == 0
+    assert table.encode("19:19:19 NPK") == 1
+    assert table.encode("Neem Cake") == 2
+    assert table.labels[0] == ("Urea", "यूरिया", "युरिया")
+    assert table.labels[1][2] == "19:19:19 एनपीके"       # grade numbers kept, suffix localized
+    assert table.labels[2] == ("Neem Cake",) * 3 and table.missing == {"Neem Cake"}
+
+
+def test_localized_row_views(monkeypatch):
+    for name in ("_dataset_cache", "_localization", "_estimates"):
+        monkeypatch.setattr(dataset_connector, name, getattr(dataset_connector, name))
+    monkeypatch.setattr(dataset_connector, "_current_model", lambda: None)
+    row = _row("Satara", "Sugarcane")
+    use_rows([row])
+
+    en = LocalizedRow(0)
+    hi = en.with_lang("hi")
+    assert (en["crop"], hi["crop"], hi.with_lang("mr")["crop"]) == ("Sugarcane", "गन्ना", "ऊस")
+    assert hi["nitrogen"] == "100"                         # non-categorical: the normalized value
+    assert list(hi) == list(dataset_connector.normalize_row(row))
+    assert hi.dataset_row() is row
+    assert dataset_connector.localize_row(hi, "en")["soil"] == "Black"
+    assert dataset_connector.coverage_report() == {}
@@ -0,0 +1,106 @@
+# test_dataset_ingest.py
+
+import os
+import threading
+
+import pytest
+
+import data_loader
+import dataset_connector
+import templates
+from dataset_ingest import DatasetIngestor
+
+HEADER = "District_Name,Soil_Color,Nitrogen,Crop\n"
+NEW_ROW = {"District_Name": "Kolhapur", "Soil_Color": "Black", "Nitrogen": "95", "Crop": "Jowar"}
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    """A small main CSV installed as the process dataset (paths and caches restored after)."""
+    main = tmp_path / "data.csv"
+    main.write_bytes((HEADER + "Pune,Black,120,Rice\nSatara,Red,90,Wheat\n").encode())
+    monkeypatch.setattr(dataset_connector, "DATASET_PATH", str(main))
+    monkeypatch.setattr(dataset_connector, "DELTA_PATH", str(tmp_path / "data.delta.csv"))
+    for name in ("_dataset_cache", "_localization", "_estimates"):
+        monkeypatch.setattr(dataset_connector, name, getattr(dataset_connector, name))
+    monkeypatch.setattr(dataset_connector, "_dataset_cache", [])
+    monkeypatch.setattr(data_loader, "df", None)
+    monkeypatch.setattr(data_loader, "DATA_PATH", str(main))
+    monkeypatch.setattr(templates, "_snapshots", {})
+    return main
+
+
+def _count(rows, district):
+    return sum(1 for r in rows if r["District_Name"] == district)
+
+
+def test_ingested_row_is_visible_once(dataset):
+    templates.load_dataset(str(dataset))
+    ing = DatasetIngestor()
+    assert ing.ingest([NEW_ROW, {"District_Name": "", "Crop": "Rice"}])[0] == 1
+
+    assert _count(dataset_connector.load_dataset(), "Kolhapur") == 1
+    assert ing.snapshot().n_rows == 3
+    assert dataset_connector.read_rows(dataset_connector.DELTA_PATH)[0]["Crop"] == "Jowar"
+    best = templates.find_best_row(templates.load_dataset(str(dataset)), district="kolhapur", crop="jowar")
+    assert best is not None and best["nitrogen"] == "95"
+
+
+def test_first_load_during_ingest_does_not_double_count(dataset, monkeypatch):
+    ing = DatasetIngestor()
+    real_append = dataset_connector.append_rows
+    readers = []
+
+    def append_with_concurrent_reader(rows):
+        # the delta row is on disk now: a reader loading here must wait for the append
+        readers.append(threading.Thread(target=data_loader.get_frame))
+        readers[0].start()
+        readers[0].join(0.2)
+        return real_append(rows)
+
+    monkeypatch.setattr(dataset_connector, "append_rows", append_with_concurrent_reader)
+    ing.ingest([NEW_ROW])
+    monkeypatch.setattr(dataset_connector, "append_rows", real_append)
+    readers[0].join()
+    assert (data_loader.get_frame()["District_Name"] == "Kolhapur").sum() == 1
+
+
+def test_compact_folds_the_delta_into_the_main_csv(dataset):
+    ing = DatasetIngestor()
+    ing.ingest([NEW_ROW])
+    assert ing.compact() == 1
+
+    assert not os.path.exists(dataset_connector.DELTA_PATH)
+    data = dataset.read_bytes()
+    assert b"\r" not in data                      # LF rows, like the main CSV
+    assert data.endswith(b"Kolhapur,Black,95,Jowar\n")
+    assert _count(dataset_connector.load_dataset(), "Kolhapur") == 1
+
+
+def test_compact_after_missing_trailing_newline(dataset):
+    dataset.write_bytes((HEADER + "Pune,Black,120,Rice").encode())
+    ing = DatasetIngestor()
+    ing.ingest([NEW_ROW])
+    ing.compact()
+    assert dataset.read_bytes().splitlines()[-2:] == [b"Pune,Black,120,Rice", b"Kolhapur,Black,95,Jowar"]
+
+
+def test_recover_finishes_an_interrupted_compaction(dataset):
+    compacting = dataset.parent / "data.delta.csv.compacting"
+    compacting.write_bytes((HEADER + "Sangli,Black,80,Jowar\n").encode())
+    os.utime(dataset, (1_000_000, 1_000_000))     # crash before the main CSV was replaced
+
+    DatasetIngestor()
+    assert not compacting.exists()
+    assert dataset.read_bytes().endswith(b"Sangli,Black,80,Jowar\n")
+    assert _count(dataset_connector.load_dataset(), "Sangli") == 1
+
+
+def test_recover_drops_an_already_merged_compaction(dataset):
+    compacting = dataset.parent / "data.delta.csv.compacting"
+    compacting.write_bytes((HEADER + "Satara,Red,90,Wheat\n").encode())
+    os.utime(compacting, (1_000_000, 1_000_000))  # crash after the replace, before the cleanup
+
+    DatasetIngestor()
+    assert not compacting.exists()
+    assert _count(dataset_connector.load_dataset(), "Satara") == 1
@@ -0,0 +1,60 @@
+# test_entity_index.py
+
+import random
+
+from entity_index import EntityIndex, bounded_distance, fold
+
+ENTRIES = [("district", "Kolhapur", ["कोल्हापूर"]), ("district", "Pune", ["पुणे"]),
+           ("district", "Satara", ["सातारा"]), ("crop", "Soybean", ["सोयाबीन"]),
+           ("crop", "Rice", ["धान"]), ("crop", "Wheat", ["गहू"])]
+
+
+def _index():
+    return EntityIndex.build(ENTRIES, stopwords=["what", "water"])
+
+
+def test_misrecognized_names_match():
+    found = _index().find_all("Kolapur soyabin khat")
+    assert found["district"].canonical == "Kolhapur" and found["district"].distance == 1
+    assert found["crop"].canonical == "Soybean" and found["crop"].span == "soyabin"
+
+
+def test_devanagari_suffix_and_vowel_length():
+    idx = _index()
+    m = idx.find("कोल्हापुरमध्ये पाऊस", "district")      # short u and a case suffix
+    assert m.canonical == "Kolhapur" and m.distance == 0
+    assert idx.find("सोयाबिन", "crop").canonical == "Soybean"
+
+
+def test_short_names_and_stopwords_match_exactly_only():
+    idx = _index()
+    assert idx.find("Pune", "district").canonical == "Pune"
+    assert idx.find("Puna", "district") is None            # 4 letters: no edits allowed
+    assert idx.find("what about rain", "district") is None
+
+
+def _levenshtein(a, b):
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def test_bounded_distance_agrees_with_levenshtein():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = "".join(rng.choice("abc") for _ in range(rng.randint(1, 8)))
+        b = "".join(rng.choice("abc") for _ in range(rng.randint(0, 10)))
+        k = rng.randint(0, 3)
+        assert bounded_distance(a, b, k) == min(_levenshtein(a, b), k + 1)
+        best_prefix = min(_levenshtein(a, b[:j]) for j in range(len(b) + 1))
+        assert bounded_distance(a, b, k, prefix=True) == min(best_prefix, k + 1)
+
+
+def test_fold():
+    assert fold("Kolhaapur") == fold("kolhapur")
+    assert fold("Soybean") == "soybin"
+    assert fold("कोल्हापूर") == fold("कोल्हापुर")
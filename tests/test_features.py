@@ -0,0 +1,49 @@
+# test_features.py
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from features import FeatureEncoder, SchemaError
+
+ROWS = [
+    {"District_Name": "Pune", "Crop": "Rice", "Fertilizer": "Urea", "Soil_color": "Black",
+     "Nitrogen": "120", "Phosphorus": "40", "Potassium": "60", "pH": "7", "Rainfall": "500", "Temperature": "25"},
+    {"District_Name": "Satara", "Crop": "Wheat", "Fertilizer": "DAP", "Soil_color": "Red",
+     "Nitrogen": "80", "Phosphorus": "", "Potassium": "40", "pH": "6.5", "Rainfall": "300", "Temperature": "22"},
+]
+
+
+def test_key_spellings_encode_alike():
+    enc = FeatureEncoder.fit(ROWS)
+    template_row = {"district": "Pune", "crop": "Rice", "fertilizer": "Urea", "soil": "Black",
+                    "nitrogen": "120", "phosphorous": "40", "potassium": "60", "ph": "7",
+                    "rainfall": "500", "temperature": "25"}
+    np.testing.assert_array_equal(enc.transform(template_row), enc.transform(ROWS[:1]))
+
+
+def test_missing_numeric_is_imputed_and_unknown_category_is_zero():
+    enc = FeatureEncoder.fit(ROWS)
+    X = enc.transform([dict(ROWS[1], District_Name="Nagpur")])
+    assert X[0, enc.feature_names.index("Phosphorus")] == 40.0        # training mean
+    assert X[0, enc.feature_names.index("District_Name=Pune")] == 0
+    assert X[0, enc.feature_names.index("District_Name=Satara")] == 0
+    assert enc.category_codes(X, "District_Name")[0] == -1
+
+
+def test_check_rejects_a_changed_schema(tmp_path):
+    enc = FeatureEncoder.fit(ROWS)
+    model = LinearRegression().fit(enc.transform(ROWS), [10.0, 8.0])
+    enc.check(model)
+
+    grown = FeatureEncoder.fit(ROWS + [dict(ROWS[0], Crop="Maize")])   # one more crop column
+    assert grown.schema_hash() != enc.schema_hash()
+    with pytest.raises(SchemaError):
+        grown.check(model)
+
+    enc.save(tmp_path / "enc.json")
+    assert FeatureEncoder.load(tmp_path / "enc.json").schema_hash() == enc.schema_hash()
+    saved = enc.to_dict()
+    saved["feature_names"] = saved["feature_names"][::-1]
+    with pytest.raises(SchemaError):
+        FeatureEncoder.from_dict(saved)
@@ -0,0 +1,46 @@
+# test_fertilizer_optimizer.py
+
+import numpy as np
+import pytest
+
+import ml_connector
+from dataset_connector import load_dataset
+from features import FeatureEncoder
+from fertilizer_optimizer import ACRE_TO_HA, NUTRIENT_CONTENT, DoseOptimizer, nutrient_limits
+
+
+class LinearYield:
+    """Yield that keeps rising with N, P and K: the case that pinned doses to max_dose."""
+
+    def predict(self, X):
+        return 40.0 + X[:, :3] @ np.array([0.3, 0.2, 0.1])
+
+
+@pytest.fixture
+def linear_model(monkeypatch):
+    encoder = FeatureEncoder.fit(load_dataset())
+    monkeypatch.setattr(ml_connector, "get_model_and_encoder", lambda: (LinearYield(), encoder))
+
+
+def _row(district, crop):
+    return next(r for r in load_dataset() if r["District_Name"] == district and r["Crop"] == crop)
+
+
+def test_dose_is_not_pinned_to_max_dose(linear_model):
+    row = _row("Kolhapur", "Wheat")
+    opt = DoseOptimizer(max_dose=150.0)
+    advice = opt.optimize(row, budget_ms=float("inf"))
+
+    assert advice.doses
+    assert all(d < opt.max_dose for d in advice.doses.values())
+    # soil N/P/K after the dose stays within what is recorded for the crop locally
+    added = sum(np.array(NUTRIENT_CONTENT[p]) * ACRE_TO_HA / 100.0 * d for p, d in advice.doses.items())
+    soil = np.array([float(row[c]) for c in ("Nitrogen", "Phosphorus", "Potassium")])
+    assert np.all(soil + added <= np.maximum(nutrient_limits("Wheat", "Kolhapur"), soil) + 1e-6)
+    # the model would take more: reported as a limit, not an optimum
+    assert advice.limited
+
+
+def test_max_dose_boundary_is_reported(linear_model):
+    advice = DoseOptimizer(max_dose=5.0).optimize(_row("Kolhapur", "Wheat"), budget_ms=float("inf"))
+    assert any(name.endswith("max dose") for name in advice.limited)
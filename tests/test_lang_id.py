@@ -0,0 +1,26 @@
+# test_lang_id.py
+
+import pytest
+
+from lang_id import LanguageIdentifier
+
+
+@pytest.fixture(scope="module")
+def identifier():
+    from voice_assistant import get_language_identifier
+    return get_language_identifier()      # lexicon from the template bank + keywords
+
+
+def test_marathi_question_particle_ka(identifier):
+    assert "का" not in identifier.lexicon
+    assert identifier.identify("पाणी किती लागेल का")[0] == "mr"
+    # only "का" to go on: the ASR's probabilities decide, not a Hindi marker
+    assert identifier.identify("पीक येईल का", asr_probs={"mr": 0.7, "hi": 0.3}) == ("mr", "asr")
+
+
+def test_hindi_genitive_ka_still_hindi(identifier):
+    assert identifier.identify("गेहूं का उत्पादन कितना होगा")[0] == "hi"
+
+
+def test_script_fast_path():
+    assert LanguageIdentifier().identify("how much rain in Pune") == ("en", "script")
@@ -0,0 +1,56 @@
+# test_loadtest.py
+
+import time
+
+import pytest
+
+import loadtest
+
+
+@pytest.fixture
+def stub_handler(monkeypatch):
+    """handle() sleeping 20 ms (items with text "bad" raise); no worker warm-up."""
+    def handle(item):
+        if item["text"] == "bad":
+            raise RuntimeError("reply failed")
+        time.sleep(0.02)
+        return 0.02, 0.0
+
+    monkeypatch.setattr(loadtest, "handle", handle)
+    monkeypatch.setattr(loadtest, "init_worker", lambda *a: None)
+
+
+def _items(*texts):
+    return [{"text": t, "lang": "en", "audio": None, "duration_s": 0.0} for t in texts]
+
+
+def test_closed_loop_level(stub_handler):
+    lv = loadtest.run_level(_items("a", "b"), concurrency=2, duration=0.5, warmup=0)
+    assert lv["mode"] == "closed" and lv["errors"] == 0
+    assert 20 <= lv["completed"] <= 52                # two clients, back-to-back 20 ms requests
+    assert 19 <= lv["latency_ms"]["p50"] <= lv["latency_ms"]["p99"] <= lv["latency_ms"]["max"]
+    assert lv["throughput_rps"] == pytest.approx(lv["completed"] / lv["wall_s"], rel=0.02)
+
+
+def test_open_loop_counts_errors(stub_handler):
+    lv = loadtest.run_level(_items("a", "bad"), concurrency=4, duration=0.5, rate=40, warmup=0)
+    assert lv["mode"] == "open" and lv["rate_rps"] == 40
+    assert lv["errors"] > 0 and lv["completed"] > 0
+    assert lv["latency_ms"]["p50"] >= 19              # measured from the scheduled arrival
+
+
+def test_scaling_and_slo():
+    def level(c, rps, p99, errors=0):
+        return {"concurrency": c, "rate_rps": None, "throughput_rps": rps, "errors": errors,
+                "latency_ms": {"p99": p99}}
+    levels = [level(1, 10, 120), level(2, 18, 150), level(4, 20, 400), level(8, 20, 150, errors=3)]
+    assert loadtest.scaling_efficiency(levels) == {1: 1.0, 2: 0.9, 4: 0.5, 8: 0.25}
+    assert loadtest.max_concurrency_within(levels, slo_ms=200) == 2
+
+
+def test_corpus_text_file(tmp_path):
+    path = tmp_path / "corpus.txt"
+    path.write_text("hi\tसातारा में बारिश\n\nKolhapur wheat\n", encoding="utf-8")
+    items = loadtest.load_corpus(str(path))
+    assert [(it["lang"], it["text"]) for it in items] == [("hi", "सातारा में बारिश"), (None, "Kolhapur wheat")]
+    assert items[0]["audio"] is None and items[0]["duration_s"] == 0.0
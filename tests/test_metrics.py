@@ -0,0 +1,69 @@
+# test_metrics.py
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import Registry, collect_spans, merge_spans, span, timed
+
+
+@timed("child_step")
+def _child_step():
+    return 1
+
+
+def _child_work(n):
+    """Runs in a worker process; returns (result, spans) like voice_assistant._asr_worker."""
+    with collect_spans() as spans, span("child"):
+        total = sum(_child_step() for _ in range(n))
+    return total, spans
+
+
+def test_spans_from_a_worker_process_are_merged(tmp_path):
+    reg = Registry()
+    reg.set_jsonl(str(tmp_path / "spans.jsonl"))
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        total, spans = pool.submit(_child_work, 3).result()
+    merge_spans(spans, registry=reg, process="asr")
+    reg.set_jsonl(None)
+
+    summary = reg.summary()
+    assert total == 3
+    assert summary["child_step"]["count"] == 3 and summary["child"]["count"] == 1
+    events = [json.loads(line) for line in (tmp_path / "spans.jsonl").read_text().splitlines()]
+    assert [e["stage"] for e in events] == ["child_step"] * 3 + ["child"]
+    assert all(e["process"] == "asr" for e in events)
+
+
+def test_collect_spans_only_sees_its_own_block():
+    reg = Registry()
+    with span("before", registry=reg):
+        pass
+    with collect_spans() as spans:
+        with span("inside", registry=reg):
+            pass
+    assert [s[0] for s in spans] == ["inside"]
+
+
+def test_prometheus_histogram_is_cumulative():
+    reg = Registry()
+    for seconds in (0.0004, 0.003, 0.003, 2.0):
+        reg.observe("asr", seconds)
+    reg.observe("asr", 0.05, error=True)
+    lines = reg.to_prometheus().splitlines()
+
+    assert "# TYPE crop_assistant_stage_seconds histogram" in lines
+    buckets = [l for l in lines if l.startswith("crop_assistant_stage_seconds_bucket")]
+    counts = [int(l.rsplit(" ", 1)[1]) for l in buckets]
+    assert counts == sorted(counts)                       # cumulative
+    assert 'crop_assistant_stage_seconds_bucket{stage="asr",le="0.0005"} 1' in lines
+    assert 'crop_assistant_stage_seconds_bucket{stage="asr",le="0.005"} 3' in lines
+    assert 'crop_assistant_stage_seconds_bucket{stage="asr",le="+Inf"} 5' in lines
+    assert 'crop_assistant_stage_seconds_count{stage="asr"} 5' in lines
+    assert 'crop_assistant_stage_seconds_sum{stage="asr"} 2.056400' in lines
+    assert 'crop_assistant_stage_errors_total{stage="asr"} 1' in lines
+
+
+def test_predict_spans_have_distinct_names():
+    import ml_connector
+    names = {f.__code__.co_name for f in (ml_connector.predict_yield, ml_connector.predict_yield_with_interval)}
+    assert names == {"timed[predict_yield]", "timed[predict_yield_interval]"}
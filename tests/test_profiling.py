@@ -0,0 +1,56 @@
+# test_profiling.py
+
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import pstats
+
+from profiling import collapsed_stacks
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _layered_stats(layers=30, width=4, tt=0.001):
+    """cProfile-shaped stats of a fully connected layered call graph (width**layers paths)."""
+    stats = {("m.py", 1, "main"): (1, 1, tt, tt * (layers * width + 1), {})}
+    for depth in range(layers):
+        for i in range(width):
+            callers = ({("m.py", 1, "main"): (1, 1, tt, 0.0)} if depth == 0 else
+                       {("m.py", depth, f"f{j}"): (1, 1, tt / width, 0.0) for j in range(width)})
+            stats[("m.py", depth + 1, f"f{i}")] = (1, 1, tt, tt * (layers - depth), callers)
+    # edge cumulative time: an even split of the callee's
+    for key, (cc, nc, t, ct, callers) in stats.items():
+        for c in callers:
+            callers[c] = (1, 1, t / len(callers), ct / len(callers))
+    return SimpleNamespace(stats=stats)
+
+
+def test_collapsed_stacks_is_bounded_on_dense_graphs():
+    st = _layered_stats()
+    t0 = time.perf_counter()
+    stacks = list(collapsed_stacks(st, root="stage"))
+    assert time.perf_counter() - t0 < 10
+    assert stacks and all(s.startswith("stage;main") for s, _ in stacks)
+    total_us = sum(us for _, us in stacks)
+    expected_us = sum(v[2] for v in st.stats.values()) * 1e6
+    assert abs(total_us - expected_us) <= 0.01 * expected_us
+
+
+def test_profile_of_a_cold_call_writes_collapsed_stacks(tmp_path):
+    code = (
+        "from profiling import profile\n"
+        "import templates\n"
+        f"with profile({str(tmp_path)!r}, trace_memory=False, verbose=False):\n"
+        "    templates.generate_filled_template('yield', lang='hi', district='Satara')\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, timeout=180,
+                   stdout=subprocess.DEVNULL)
+    base = tmp_path / "generate_filled_template"
+    lines = (base.with_suffix(".collapsed")).read_text(encoding="utf-8").splitlines()
+    assert lines
+    total_s = sum(int(line.rsplit(" ", 1)[1]) for line in lines) / 1e6
+    st = pstats.Stats(str(base.with_suffix(".pstats")))
+    assert abs(total_s - st.total_tt) <= 0.02 * st.total_tt + 0.01
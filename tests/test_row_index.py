@@ -0,0 +1,91 @@
+# test_row_index.py
+
+import math
+import random
+
+import pytest
+
+import row_index
+from row_index import RowIndex, get_row_index
+from templates import find_best_row
+
+FEATURES = ("rainfall", "temperature", "nitrogen")
+
+
+def _rows(n, seed=0):
+    rng = random.Random(seed)
+    return [{"district_name": rng.choice(["Pune", "Satara", "Kolhapur"]),
+             "crop": rng.choice(["Wheat", "Rice", "Jowar"]),
+             "soil_color": rng.choice(["Black", "Red"]),
+             "rainfall": str(rng.randint(100, 1500)),
+             "temperature": str(rng.randint(15, 40)),
+             "nitrogen": str(rng.randint(40, 250))} for _ in range(n)]
+
+
+def _brute_force(index, rows, district=None, crop=None, k=1, **values):
+    """Distances the index should return, from a linear scan."""
+    canon, dims = index._split_query(values)
+    q = index._project(canon, dims)
+    out = []
+    for r in rows:
+        if district and r["district_name"].lower() != district.lower():
+            continue
+        if crop and r["crop"].lower() != crop.lower():
+            continue
+        p = index._project(r, dims)
+        out.append(math.sqrt(sum((a - b) ** 2 for a, b in zip(p, q))))
+    return sorted(out)[:k]
+
+
+@pytest.mark.parametrize("query", [
+    dict(rainfall=600),
+    dict(rainfall=300, nitrogen=120),
+    dict(district="Satara", crop="Wheat", temperature=22, nitrogen=90, rainfall=800),
+    dict(crop="Rice", temperature=35),
+    dict(district="Pune", rainfall=1200, k=5),
+])
+def test_nearest_equals_brute_force(query):
+    rows = _rows(2000)
+    index = RowIndex(rows)
+    query = dict(query)
+    k, district, crop = query.pop("k", 1), query.pop("district", None), query.pop("crop", None)
+    got = [d for d, _ in index.query_with_distance(district, crop, k=k, **query)]
+    assert got == pytest.approx(_brute_force(index, rows, district, crop, k=k, **query))
+
+
+def test_extended_index_matches_a_fresh_build():
+    rows = _rows(1500, seed=1)
+    base = RowIndex(rows[:1000])
+    base.query(district="Pune", crop="Wheat", rainfall=700)    # build some trees first
+    base.query(rainfall=700, nitrogen=100)
+    grown = base.extended(rows[1000:])
+    fresh = RowIndex(rows)
+    fresh.means, fresh.stds = base.means, base.stds            # extended() keeps the base statistics
+    for q in (dict(district="Pune", crop="Wheat", rainfall=400),
+              dict(rainfall=1400, nitrogen=60), dict(crop="Jowar", temperature=18)):
+        assert grown.query(k=3, **q) == fresh.query(k=3, **q)
+    assert len(base.members()) == 1000 and len(grown.members()) == 1500
+
+
+def test_get_row_index_extends_appended_snapshots(monkeypatch):
+    monkeypatch.setattr(row_index, "_index_cache", None)
+    rows = _rows(500, seed=2)
+    first = get_row_index(rows)
+    assert get_row_index(rows) is first
+    grown_rows = rows + _rows(20, seed=3)
+    grown = get_row_index(grown_rows)
+    assert grown is not first and grown.size == 520
+    assert grown.means == first.means           # extended, not rebuilt
+    assert RowIndex(grown_rows).means != first.means
+
+
+def test_find_best_row_filters_hits_by_category():
+    rows = _rows(3000, seed=4)
+    got = find_best_row(rows, district="Kolhapur", crop="Rice", soil="Red", rainfall="650", nitrogen="110")
+    index = get_row_index(rows)
+    best = min((r for r in rows if (r["district_name"], r["crop"], r["soil_color"]) == ("Kolhapur", "Rice", "Red")),
+               key=lambda r: _brute_force(index, [r], rainfall=650, nitrogen=110)[0])
+    assert _brute_force(index, [got], rainfall=650, nitrogen=110) == \
+        pytest.approx(_brute_force(index, [best], rainfall=650, nitrogen=110))
+    assert (got["district_name"], got["crop"], got["soil_color"]) == ("Kolhapur", "Rice", "Red")
+    assert find_best_row(rows, district="Kolhapur", soil="Sandy", rainfall="650") is None
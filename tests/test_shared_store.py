@@ -0,0 +1,70 @@
+# test_shared_store.py
+
+import pandas as pd
+import pytest
+
+import data_loader
+import dataset_connector
+import shared_store
+import templates
+from dataset_connector import LocalizedRow
+
+HEADER = "District_Name,Soil_Color,Nitrogen,Phosphorus,Potassium,pH,Rainfall,Temperature,Crop,Fertilizer,Link\n"
+ROWS = ("Pune,Black,120,40,60,7.5,500,25,Rice,Urea,\n"
+        "Satara,Red,90,30,50,6.8,300,27,Wheat,DAP,http://a\n"
+        "pune,Black,110,35,55,7,450,26.5,Jowar,Urea,\n")
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text(HEADER + ROWS, encoding="utf-8")
+    (tmp_path / "data.delta.csv").write_text(HEADER + "Kolhapur,Black,100,20,40,7,900,24,Rice,MOP,\n",
+                                             encoding="utf-8")
+    st = shared_store.SharedColumns.from_csv(str(path), estimates=False)
+    yield st
+    st.close()
+
+
+def test_from_csv_reads_the_delta_log(store):
+    assert store.n_rows == 4
+    assert shared_store.SharedRows(store)[3]["District_Name"] == "Kolhapur"
+
+
+def test_queries_match_the_pandas_frame(store, tmp_path):
+    frame = pd.concat([pd.read_csv(tmp_path / "data.csv"), pd.read_csv(tmp_path / "data.delta.csv")],
+                      ignore_index=True)
+    for district in ("pune", "Satara", "nowhere"):
+        expected = frame[frame["District_Name"].str.lower() == district.lower()]
+        cols, rows = store.query(district=district)
+        got = pd.DataFrame.from_records(rows, columns=cols)
+        assert len(got) == len(expected)
+        assert got["Nitrogen"].tolist() == expected["Nitrogen"].tolist()
+        assert store.average("rainfall", district=district) == (
+            round(expected["Rainfall"].mean(), 2) if len(expected) else None)
+        assert store.latest("crop", district=district) == (
+            expected.iloc[-1]["Crop"] if len(expected) else None)
+
+    store.append([{"District_Name": "Pune", "Crop": "Maize", "Rainfall": "100"}])
+    assert store.latest("Crop", district="pune") == "Maize"
+    assert store.average("Rainfall", district="pune") == round((500 + 450 + 100) / 3, 2)
+
+
+def test_worker_uses_the_parents_localization(store, monkeypatch):
+    for module, names in ((dataset_connector, ("_dataset_cache", "_localization", "_estimates")),
+                          (data_loader, ("_store",)), (shared_store, ("_store", "_worker_info"))):
+        for name in names:
+            monkeypatch.setattr(module, name, getattr(module, name))
+    monkeypatch.setattr(data_loader, "_store", None)
+    monkeypatch.setattr(templates, "_snapshots", {})
+
+    def no_normalize(row):
+        raise AssertionError("worker normalized a row")
+
+    monkeypatch.setattr(dataset_connector, "normalize_row", no_normalize)
+    shared_store.attach_worker(store.descriptor())
+
+    assert LocalizedRow(3, "mr")["district"] == "कोल्हापूर"
+    assert LocalizedRow(1)["season"] == "Zaid"
+    assert dataset_connector.load_dataset()[1]["Link"] == "http://a"
+    assert data_loader.get_latest_value("Satara", "Fertilizer") == "DAP"
@@ -0,0 +1,57 @@
+# test_sqlite_store.py
+
+import pandas as pd
+import pytest
+
+import data_loader
+import dataset_connector
+import sqlite_store
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    db = str(tmp_path_factory.mktemp("sqlite") / "data.sqlite")
+    sqlite_store.import_csv(db, [dataset_connector.DATASET_PATH])
+    return sqlite_store.SQLiteStore(db)
+
+
+@pytest.fixture
+def frame(monkeypatch):
+    df = pd.read_csv(dataset_connector.DATASET_PATH)
+    df.columns = [c.strip() for c in df.columns]
+    monkeypatch.setattr(data_loader, "df", df)
+    monkeypatch.setattr(data_loader, "_store", None)
+    return df
+
+
+def _answers(district, crop):
+    rows = data_loader.get_crop_data(district=district, crop=crop)
+    return (len(rows), rows["Nitrogen"].astype(float).tolist(),
+            data_loader.get_average(district, "Rainfall"),
+            data_loader.get_latest_value(district, "Fertilizer"))
+
+
+def test_queries_match_the_pandas_backend(store, frame, monkeypatch):
+    districts = frame["District_Name"].dropna().unique()[:3]
+    cases = [(d, c) for d in districts for c in frame.loc[frame["District_Name"] == d, "Crop"].unique()[:2]]
+    cases += [(districts[0].lower(), None), ("Nowhere", None)]
+
+    expected = [_answers(d, c) for d, c in cases]
+    monkeypatch.setattr(data_loader, "_store", store)
+    got = [_answers(d, c) for d, c in cases]
+
+    for (n, nitrogen, avg, latest), (n2, nitrogen2, avg2, latest2) in zip(expected, got):
+        assert (n2, nitrogen2, latest2) == (n, nitrogen, latest)
+        assert (avg2 is None) if avg is None else avg2 == pytest.approx(avg)
+
+
+def test_staleness_follows_the_sources(tmp_path):
+    csv_path = tmp_path / "data.csv"
+    csv_path.write_text("District_Name,Crop,Nitrogen\nPune,Rice,120\n", encoding="utf-8")
+    db = str(tmp_path / "data.sqlite")
+    assert sqlite_store.is_stale(db, [str(csv_path)])
+    sqlite_store.import_csv(db, [str(csv_path)])
+    assert not sqlite_store.is_stale(db, [str(csv_path)])
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("Satara,Wheat,90\n")
+    assert sqlite_store.is_stale(db, [str(csv_path)])
@@ -0,0 +1,20 @@
+# test_templates.py
+
+from templates import build_fill_values
+
+
+def _fill(row, district, crop, lang):
+    return build_fill_values(row, district, crop, None, None, None, None, None, None, None, None, lang)
+
+
+def test_rank_uses_the_row_names_not_the_localized_ones():
+    row = {"district_name": "Kolhapur", "crop": "Wheat", "yield": "80"}
+    vals = _fill(row, "कोल्हापुर", "गेहूं", "hi")
+    assert vals["district"] == "कोल्हापुर"
+    assert "yield_rank" in vals
+
+
+def test_heuristic_fallback_yield_is_not_ranked():
+    vals = _fill(None, "Kolhapur", "Wheat", "en")
+    assert vals["yield"] == "25"
+    assert "yield_rank" not in vals
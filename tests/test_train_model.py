@@ -0,0 +1,32 @@
+# test_train_model.py
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+
+from train_model import grow_forest
+
+
+def _data(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(size=(n, 4))
+    y = 10 * X[:, 0] + 5 * X[:, 1] ** 2 + rng.normal(scale=1.0, size=n)
+    return X, y
+
+
+def test_random_forest_stops_on_oob_error():
+    X, y = _data()
+    model, curve = grow_forest(RandomForestRegressor(random_state=0, max_depth=6), X, y,
+                               step=10, max_trees=400, patience=2)
+    assert type(model) is RandomForestRegressor and not model.warm_start
+    assert model.n_estimators < 400 and len(model.estimators_) == model.n_estimators
+    assert curve[-1][0] == model.n_estimators + 2 * 10     # stopped after `patience` stale steps
+    assert model.predict(X[:3]).shape == (3,)
+
+
+def test_extra_trees_stop_on_held_out_error():
+    X, y = _data(seed=1)
+    model, curve = grow_forest(ExtraTreesRegressor(random_state=0, max_depth=6), X, y,
+                               step=10, max_trees=400)
+    assert type(model) is ExtraTreesRegressor
+    assert model.n_estimators < 400 and len(curve) >= 3
+    assert model.n_features_in_ == 4       # refit on all rows
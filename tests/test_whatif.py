@@ -0,0 +1,60 @@
+# test_whatif.py
+
+import numpy as np
+import pytest
+
+import ml_connector
+import whatif
+from features import FeatureEncoder
+
+BASE = {"District_Name": "Pune", "Crop": "Rice", "Fertilizer": "Urea", "Soil_color": "Black",
+        "Nitrogen": "100", "Phosphorus": "40", "Potassium": "60", "pH": "7", "Rainfall": "500",
+        "Temperature": "25"}
+
+
+class LinearModel:
+    """yield = w . x over the encoded row (numeric weights only)."""
+
+    def __init__(self, encoder):
+        self.w = np.zeros(encoder.n_features)
+        self.w[encoder.numeric.index("Rainfall")] = 0.01
+        self.w[encoder.numeric.index("Nitrogen")] = 0.05
+        self.w[encoder.numeric.index("Temperature")] = -0.2
+
+    def predict(self, X):
+        return X @ self.w
+
+
+@pytest.fixture
+def model(monkeypatch):
+    encoder = FeatureEncoder.fit([BASE, dict(BASE, Crop="Wheat", District_Name="Satara")])
+    model = LinearModel(encoder)
+    monkeypatch.setattr(ml_connector, "get_model_and_encoder", lambda: (model, encoder))
+    return model, encoder
+
+
+def test_grid_sweep_matches_per_row_encoding(model):
+    m, encoder = model
+    res = whatif.sweep(BASE, {"rainfall": (-0.5, 0.5, 5), "N": (0.0, 1.0, 3)}, relative=True, chunk=4)
+    assert res.n == 15 and res.surface.shape == (5, 3)
+    np.testing.assert_allclose(res.axes[0], 500 * (1 + np.linspace(-0.5, 0.5, 5)))
+    for (rain, n), y in zip(res.values, res.yields):
+        row = dict(BASE, Rainfall=str(rain), Nitrogen=str(n))
+        assert y == pytest.approx(m.predict(encoder.transform([row]))[0])
+    assert res.base_yield == pytest.approx(500 * 0.01 + 100 * 0.05 - 25 * 0.2)
+    assert res.marginal["Rainfall"]["slope"] == pytest.approx(0.01)
+    assert res.marginal["Nitrogen"]["slope"] == pytest.approx(0.05)
+    assert res.best() == {"Rainfall": 750.0, "Nitrogen": 200.0, "yield": 7.5 + 10 - 5}
+
+
+def test_lhs_covers_every_stratum(model):
+    res = whatif.sweep(BASE, {"temperature": (20, 30), "rain": (100, 900)}, mode="lhs", samples=50)
+    for j, (lo, hi) in enumerate([(20, 30), (100, 900)]):
+        strata = np.floor((res.values[:, j] - lo) / (hi - lo) * 50).astype(int)
+        assert sorted(strata) == list(range(50))
+    assert res.marginal["Temperature"]["slope"] == pytest.approx(-0.2)
+
+
+def test_unknown_feature():
+    with pytest.raises(KeyError):
+        whatif.feature_name("humidity")
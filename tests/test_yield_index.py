@@ -0,0 +1,57 @@
+# test_yield_index.py
+
+import numpy as np
+
+from yield_index import YieldIndex, rank_phrase
+
+
+def _groups(rng):
+    groups = {}
+    for d in ("pune", "satara", "kolhapur"):
+        for c in ("rice", "wheat"):
+            # rounded, so groups have ties; yields overlap between groups
+            groups[(d, c)] = list(np.round(rng.gamma(4.0, 8.0, rng.integers(1, 40)), 1))
+    return groups
+
+
+def _brute_rank(values, y):
+    values = np.asarray(values)
+    return 100.0 * ((values < y).sum() + 0.5 * (values == y).sum()) / len(values)
+
+
+def test_rank_batch_matches_a_brute_force_rank():
+    rng = np.random.default_rng(0)
+    groups = _groups(rng)
+    idx = YieldIndex(groups)
+    keys = list(groups) + [("nowhere", "rice")]
+    picks = rng.integers(0, len(keys), 2000)
+    districts = [keys[i][0].title() for i in picks]              # case and spaces are ignored
+    crops = [" " + keys[i][1] for i in picks]
+    observed = [rng.choice(groups[keys[i]]) if keys[i] in groups and rng.random() < 0.5 else None
+                for i in picks]
+    yields = [y if y is not None else rng.uniform(-20, 200) for y in observed]   # ties and out of range
+
+    got = idx.rank_batch(districts, crops, yields)
+    expected = [_brute_rank(groups[keys[i]], y) if keys[i] in groups else np.nan
+                for i, y in zip(picks, yields)]
+    np.testing.assert_allclose(got, expected, equal_nan=True)
+    for d, c, y, r in zip(districts[:50], crops[:50], yields[:50], got[:50]):
+        dist = idx.get(d, c)
+        assert (dist is None and np.isnan(r)) or dist.percentile_rank(y) == r
+
+
+def test_describe_quartiles_match_numpy():
+    values = [12.0, 30.5, 18.0, 22.0, 30.5, 41.0, 15.5, 27.0, 19.0, 25.0, 33.0]
+    idx = YieldIndex({("satara", "wheat"): values})
+    out = idx.describe("Satara", "Wheat", 30.5)
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    assert (out["q1"], out["median"], out["q3"]) == (round(q1, 2), round(med, 2), round(q3, 2))
+    assert out["percentile"] == round(_brute_rank(values, 30.5), 1) and out["n"] == 11
+    assert idx.describe("Satara", "Wheat", min_n=12) is None
+
+
+def test_rank_phrase():
+    assert rank_phrase(81.0) == "top 20%"
+    assert rank_phrase(12.0) == "bottom 15%"
+    assert rank_phrase(50.0, "mr") == "मधल्या श्रेणी"
+    assert rank_phrase(99.9) == "top 5%"
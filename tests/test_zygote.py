@@ -0,0 +1,83 @@
+# test_zygote.py
+
+import multiprocessing as mp
+import os
+import signal
+import socket
+import time
+
+import pytest
+
+import voice_assistant
+import zygote
+
+
+def test_messages_are_length_prefixed_utf8():
+    a, b = socket.socketpair()
+    with a, b:
+        zygote.send_msg(a, {"text": "कोल्हापूर गहू", "n": 1})
+        assert zygote.recv_msg(b) == {"text": "कोल्हापूर गहू", "n": 1}
+        a.sendall(b"\x00\x00\x00\x10{}")              # header promises 16 bytes, sender goes away
+        a.shutdown(socket.SHUT_WR)
+        with pytest.raises(ConnectionError):
+            zygote.recv_msg(b)
+
+
+def _serve(path, workers):
+    os.setpgrp()            # its children can be killed as a group if shutdown fails
+    zygote.ZygoteServer(path, workers=workers).start().serve_forever()
+
+
+def _join(server):
+    server.join(10)
+    if server.is_alive():
+        os.killpg(server.pid, signal.SIGKILL)     # do not leave pytest waiting on it at exit
+        server.join()
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_request_round_trip(tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(zygote, "warm", lambda asr_options=None: {})
+    monkeypatch.setattr(voice_assistant, "answer_query",
+                        lambda text, lang, probs=None: (text, lang or "en", "fertilizer", "reply: " + text))
+    path = str(tmp_path / "z.sock")
+    server = mp.get_context("fork").Process(target=_serve, args=(path, workers))
+    server.start()
+    try:
+        deadline = time.time() + 10
+        while not os.path.exists(path):
+            assert time.time() < deadline and server.is_alive()
+            time.sleep(0.02)
+
+        resp = zygote.ask("Kolhapur wheat fertilizer", lang="mr", socket_path=path, timeout=10)
+        assert (resp["reply"], resp["lang"], resp["intent"]) == ("reply: Kolhapur wheat fertilizer", "mr", "fertilizer")
+        assert resp["pid"] not in (os.getpid(), server.pid)      # answered by a forked child
+        assert zygote.ask(file="input.wav", socket_path=path, timeout=10) == {
+            "error": "server started with --no_asr; send text instead"}
+        assert zygote.ask("   ", socket_path=path, timeout=10) == {"error": "No speech recognised."}
+    finally:
+        os.kill(server.pid, signal.SIGTERM)
+        _join(server)
+    assert server.exitcode == 0 and not os.path.exists(path)
+
+
+def _serve_stopped_mid_fork(path):
+    real_fork = os.fork
+
+    def fork():
+        pid = real_fork()
+        if pid:
+            os.kill(os.getpid(), signal.SIGTERM)    # before the server has recorded the child
+        return pid
+
+    os.fork = fork          # this is the server's own (forked) process
+    _serve(path, 1)
+
+
+def test_stop_during_fork_still_reaches_the_child(tmp_path, monkeypatch):
+    monkeypatch.setattr(zygote, "warm", lambda asr_options=None: {})
+    path = str(tmp_path / "z.sock")
+    server = mp.get_context("fork").Process(target=_serve_stopped_mid_fork, args=(path,))
+    server.start()
+    _join(server)
+    assert server.exitcode == 0 and not os.path.exists(path)
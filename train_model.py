@@ -0,0 +1,276 @@
+# train_model.py
+# Trains the yield model that ml_connector loads (best_model.joblib).
+#
+#   python train_model.py                 # search all candidates, save the best
+#   python train_model.py --jobs 4 --folds 5 --candidates hgb rf
+#
+# The feature matrix (numeric NPK / pH / rainfall / temperature + one-hot
+# district / crop / fertilizer / soil colour, see features.FeatureEncoder) is
+# built once and cached under .cache/ keyed by the CSV's content hash. Each
+# candidate family runs a cross-validated grid search in parallel across cores; gradient boosting uses
+# early stopping, and the forests are then grown tree block by tree block
+# until the out-of-bag (random forest) or held-out (extra trees) error stops
+# improving (grow_forest). Writes the model, its feature encoder (used as-is by
+# ml_connector.predict_yield), per-crop out-of-fold residual quantiles (for
+# prediction intervals) and a JSON manifest, and prints training wall-clock
+# and inference latency per candidate.
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+
+from features import ENCODER_VERSION, FeatureEncoder, encoder_path, residuals_path
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Final_Dataset_with_Yield.csv")
+MODEL_PATH = "best_model.joblib"
+CACHE_DIR = ".cache"
+
+TARGET = "Yield"
+
+# Forest early stopping (grow_forest): trees added per step, cap, and how
+# many steps without a relative RMSE gain of FOREST_TOL end the growth
+FOREST_STEP = 25
+FOREST_MAX_TREES = 500
+FOREST_PATIENCE = 2
+FOREST_TOL = 0.002
+
+
+def _sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def build_features(path=DATA_PATH, encoding="onehot"):
+    """CSV -> (X float64, y float64, FeatureEncoder fitted on the file)."""
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [r for r in csv.DictReader(f) if (r.get(TARGET) or "").strip()]
+    encoder = FeatureEncoder.fit(rows, encoding=encoding)
+    X = encoder.transform(rows)
+    y = np.array([float(r[TARGET]) for r in rows], dtype=np.float64)
+    return X, y, encoder
+
+
+def load_features(path=DATA_PATH, cache_dir=CACHE_DIR, encoding="onehot"):
+    """build_features() with an on-disk cache keyed by the CSV content hash and encoding."""
+    key = f"{_sha1(path)[:16]}_{encoding}_v{ENCODER_VERSION}"
+    npz = os.path.join(cache_dir, f"features_{key}.npz")
+    meta = os.path.join(cache_dir, f"features_{key}.json")
+    if os.path.exists(npz) and os.path.exists(meta):
+        data = np.load(npz)
+        print(f"[train] feature cache hit: {npz}")
+        return data["X"], data["y"], FeatureEncoder.load(meta)
+    t0 = time.perf_counter()
+    X, y, encoder = build_features(path, encoding)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(npz, X=X, y=y)
+    encoder.save(meta)
+    print(f"[train] built features {X.shape} in {time.perf_counter() - t0:.2f}s -> {npz}")
+    return X, y, encoder
+
+
+def candidates(seed=0):
+    """name -> (estimator, param grid)."""
+    from sklearn.ensemble import (ExtraTreesRegressor, HistGradientBoostingRegressor,
+                                  RandomForestRegressor)
+    from sklearn.linear_model import Ridge
+    return {
+        "ridge": (Ridge(), {"alpha": [0.1, 1.0, 10.0]}),
+        # tree counts are not searched: grow_forest() picks them after the search
+        "rf": (RandomForestRegressor(n_estimators=100, random_state=seed, n_jobs=1),
+               {"max_depth": [None, 16], "min_samples_leaf": [1, 3]}),
+        "extra": (ExtraTreesRegressor(n_estimators=100, random_state=seed, n_jobs=1),
+                  {"max_depth": [None, 16], "min_samples_leaf": [1, 3]}),
+        "hgb": (HistGradientBoostingRegressor(random_state=seed, early_stopping=True,
+                                              validation_fraction=0.15, n_iter_no_change=20,
+                                              max_iter=1000),
+                {"learning_rate": [0.05, 0.1], "max_leaf_nodes": [15, 31], "l2_regularization": [0.0, 1.0]}),
+    }
+
+
+def grow_forest(forest, X, y, step=FOREST_STEP, max_trees=FOREST_MAX_TREES,
+                patience=FOREST_PATIENCE, tol=FOREST_TOL, validation_fraction=0.15, seed=0):
+    """
+    Early stopping for a random / extra trees forest: refit `forest`'s
+    settings with warm_start, `step` trees at a time, scoring each step on
+    the out-of-bag predictions (bootstrap forests) or on a held-out
+    validation_fraction of the rows (refit on all rows at the end). Stops
+    after `patience` steps without a relative RMSE gain of `tol`, or at
+    max_trees. Returns (forest with the best tree count, [(trees, rmse)]).
+    """
+    from sklearn.base import clone
+    from sklearn.model_selection import train_test_split
+
+    oob = bool(getattr(forest, "bootstrap", False))
+    if oob:
+        X_fit, y_fit = X, y
+    else:
+        X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=validation_fraction,
+                                                      random_state=seed)
+    model = clone(forest).set_params(warm_start=True, oob_score=oob, n_estimators=0)
+    curve, best, stale = [], None, 0
+    while model.n_estimators < max_trees and stale < patience:
+        model.set_params(n_estimators=min(model.n_estimators + step, max_trees))
+        with warnings.catch_warnings():
+            # early steps leave a few rows with no out-of-bag tree yet (NaN, skipped below)
+            warnings.filterwarnings("ignore", message="Some inputs do not have OOB scores")
+            model.fit(X_fit, y_fit)
+        if oob:
+            err = y_fit - model.oob_prediction_
+            rmse = float(np.sqrt(np.nanmean(err * err)))
+        else:
+            rmse = float(np.sqrt(np.mean((y_val - model.predict(X_val)) ** 2)))
+        curve.append((model.n_estimators, round(rmse, 4)))
+        if best is None or rmse < best[1] * (1 - tol):
+            best, stale = (model.n_estimators, rmse), 0
+        else:
+            stale += 1
+
+    trees = best[0]
+    if oob:
+        model.estimators_ = model.estimators_[:trees]     # drop the unhelpful tail
+        model.set_params(n_estimators=trees, warm_start=False)
+    else:
+        model = clone(forest).set_params(n_estimators=trees).fit(X, y)
+    return model, curve
+
+
+def inference_latency(model, X, repeats=200, batch=256):
+    """(single-row ms, per-row us in a batch of `batch`)."""
+    one = X[:1]
+    model.predict(one)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        model.predict(one)
+    single_ms = (time.perf_counter() - t0) / repeats * 1000
+    xb = X[:batch]
+    t0 = time.perf_counter()
+    for _ in range(10):
+        model.predict(xb)
+    batch_us = (time.perf_counter() - t0) / (10 * len(xb)) * 1e6
+    return single_ms, batch_us
+
+
+def train(data_path=DATA_PATH, model_path=MODEL_PATH, folds=5, jobs=-1, names=None, seed=0,
+          encoding="onehot"):
+    import joblib
+    from sklearn.model_selection import GridSearchCV, KFold
+
+    X, y, encoder = load_features(data_path, encoding=encoding)
+    cv = KFold(n_splits=folds, shuffle=True, random_state=seed)
+    results = []
+    for name, (est, grid) in candidates(seed).items():
+        if names and name not in names:
+            continue
+        t0 = time.perf_counter()
+        search = GridSearchCV(est, grid, cv=cv, n_jobs=jobs, refit=True,
+                              scoring="neg_root_mean_squared_error")
+        search.fit(X, y)
+        model = search.best_estimator_
+        if name in ("rf", "extra"):
+            model, curve = grow_forest(model, X, y, seed=seed)
+        wall = time.perf_counter() - t0
+        single_ms, batch_us = inference_latency(model, X)
+        res = {
+            "name": name,
+            "rmse": round(-search.best_score_, 3),
+            "params": search.best_params_,
+            "train_wall_s": round(wall, 2),
+            "fits": len(search.cv_results_["params"]) * folds,
+            "predict_single_ms": round(single_ms, 3),
+            "predict_batch_us_per_row": round(batch_us, 2),
+        }
+        if name == "hgb":
+            res["iterations"] = int(model.n_iter_)
+        elif name in ("rf", "extra"):
+            res["trees"] = int(model.n_estimators)
+            res["growth_rmse"] = curve
+        results.append((res, model))
+        print(f"[train] {name:<6} rmse={res['rmse']:<8} wall={res['train_wall_s']}s "
+              f"fits={res['fits']} predict={res['predict_single_ms']}ms/row "
+              f"({res['predict_batch_us_per_row']}us/row batched) {res['params']}"
+              + (f" trees={res['trees']}" if "trees" in res else ""))
+
+    if not results:
+        raise SystemExit("No candidates selected.")
+    best, model = min(results, key=lambda r: r[0]["rmse"])
+    encoder.check(model)
+    joblib.dump(model, model_path)
+    encoder.save(encoder_path(model_path))
+    residual_quantiles(model, X, y, encoder, cv, jobs, model_path)
+    manifest = {
+        "model": os.path.basename(model_path),
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "data": os.path.basename(data_path),
+        "data_sha1": _sha1(data_path),
+        "target": TARGET,
+        "encoder": os.path.basename(encoder_path(model_path)),
+        "residuals": os.path.basename(residuals_path(model_path)),
+        "schema_hash": encoder.schema_hash(),
+        "feature_names": encoder.feature_names,
+        "best": best,
+        "candidates": [r for r, _ in results],
+    }
+    with open(manifest_path(model_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    print(f"[train] best={best['name']} rmse={best['rmse']} -> {model_path}")
+    return manifest
+
+
+RESIDUAL_LEVELS = (0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.975)
+
+
+def residual_quantiles(model, X, y, encoder, cv, jobs, model_path=MODEL_PATH):
+    """
+    Out-of-fold residual quantiles per crop (and overall), used by
+    ml_connector for prediction intervals of non-ensemble models.
+    """
+    from sklearn.base import clone
+    from sklearn.model_selection import cross_val_predict
+
+    oof = cross_val_predict(clone(model), X, y, cv=cv, n_jobs=jobs)
+    resid = y - oof
+    codes = encoder.category_codes(X, "Crop")
+    crops = {}
+    for i, crop in enumerate(encoder.categories.get("Crop", [])):
+        r = resid[codes == i]
+        if r.size >= 10:
+            crops[crop] = [round(float(q), 4) for q in np.quantile(r, RESIDUAL_LEVELS)]
+    data = {
+        "levels": list(RESIDUAL_LEVELS),
+        "global": [round(float(q), 4) for q in np.quantile(resid, RESIDUAL_LEVELS)],
+        "crops": crops,
+    }
+    with open(residuals_path(model_path), "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    return data
+
+
+def manifest_path(model_path=MODEL_PATH):
+    return os.path.splitext(model_path)[0] + ".manifest.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the yield model")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--out", default=MODEL_PATH)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel CV fits (-1 = all cores)")
+    parser.add_argument("--candidates", nargs="*", help="subset of: ridge rf extra hgb")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--encoding", choices=["onehot", "ordinal"], default="onehot")
+    args = parser.parse_args()
+    train(args.data, args.out, folds=args.folds, jobs=args.jobs, names=args.candidates,
+          seed=args.seed, encoding=args.encoding)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,8 @@ Features:
 - Checks for common filename conflicts (e.g., string.py).
 - Verifies ffmpeg is available.
 - Records audio using sounddevice (if available) or accepts a WAV file.
-- Uses OpenAI Whisper for ASR (model size default = tiny).
+- Uses OpenAI Whisper for ASR (model size default = tiny); --asr_backend selects
+  an int8-quantized CPU engine (see asr_backends.py, asr_bench.py).
 - Simple keyword-based intent detection (Marathi/Hindi-friendly).
 - Offline TTS using pyttsx3 (no internet required).
 - Clear error messages and guidance.
@@ -18,10 +19,14 @@ import sys
 import argparse
 import shutil
 import subprocess
+import threading
 import time
-import re
 from templates import generate_filled_template
-from dataset_connector import load_dataset, lookup_dataset,localize_row
+from dataset_connector import load_dataset, lookup_dataset,localize_row, on_append
+from metrics import REGISTRY, collect_spans, export, format_summary, merge_spans, span, timed
+from lang_id import AMBIGUOUS_WORDS, HINDI_MARKERS, MARATHI_MARKERS, LanguageIdentifier, normalize_lang
+from entity_index import EntityIndex
+from templates import TEMPLATES
 
 
 DEFAULT_WAV = "input.wav"
@@ -57,6 +62,10 @@ SEASON_LOCALIZATION = {
     "Zaid": ["zaid", "जायद", "जायड"]
 }
 
+# Query words that must never be fuzzy-matched to a district or crop name
+ENTITY_STOPWORDS = ["what", "which", "where", "when", "water", "weather", "price", "rate", "need",
+                    "much", "many", "will", "should", "crop", "yield", "soil", "seed", "kitna", "kitni"]
+
 # ---------- HELPERS ----------
 def abort(msg):
     print("\nERROR:", msg)
@@ -115,36 +124,104 @@ def ensure_python_packages():
     return True
 
 
-def record_audio(filename=DEFAULT_WAV, duration=6, fs=16000):
+@timed("record_audio")
+def record_audio(filename=None, duration=6, fs=16000):
+    """
+    Record a fixed-length clip and return it as a float32 16 kHz array for ASR.
+    The WAV is only written when `filename` is given (for debugging/replay).
+    """
     try:
         import sounddevice as sd
-        import soundfile as sf
     except Exception as e:
-        abort("sounddevice/soundfile not available. Error: " + str(e))
+        abort("sounddevice not available. Error: " + str(e))
 
     print(f"[record] Recording for {duration}s ... speak now.")
     try:
-        rec = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='int16')
+        rec = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='float32')
         sd.wait()
-        sf.write(filename, rec, fs)
+        audio = rec[:, 0]
+    except Exception as e:
+        abort("Recording failed: " + str(e))
+    if filename:
+        save_wav(filename, audio, fs)
+    return audio
+
+def save_wav(filename, audio, fs=16000):
+    try:
+        import soundfile as sf
+        sf.write(filename, audio, fs)
         print("[record] Saved audio to:", filename)
-        return filename
+    except Exception as e:
+        print("[record] Could not save WAV:", e)
+
+@timed("record_audio")
+def record_audio_streaming(filename=None, max_duration=15, fs=16000,
+                           trailing_silence=0.8, vad="energy", replay=None):
+    """
+    Capture one utterance in small frames and stop on trailing silence
+    instead of recording a fixed duration. `replay` replays a WAV file
+    through the same path (no microphone needed).
+    Returns a float32 16 kHz array, or None if no speech was heard.
+    """
+    try:
+        from audio_capture import (FileSource, MicrophoneSource, capture_utterance, make_vad,
+                                   remember_noise_floor)
+        from audio_io import as_asr_input, load_audio
+    except Exception as e:
+        abort("numpy/soundfile not available. Error: " + str(e))
+
+    try:
+        source = FileSource(audio=load_audio(replay, sr=fs), fs=fs) if replay else MicrophoneSource(fs=fs)
+    except Exception as e:
+        abort("Could not open audio source: " + str(e))
+
+    if not replay:
+        print(f"[record] Listening (max {max_duration}s) ... speak now.")
+    # live mic: start from the last utterance's noise floor instead of recalibrating
+    detector = make_vad(vad, fs=source.fs, reuse_noise=not replay)
+    try:
+        audio, info = capture_utterance(source, vad=detector, max_duration=max_duration,
+                                        trailing_silence=trailing_silence)
     except Exception as e:
         abort("Recording failed: " + str(e))
-def transcribe_with_google(lang="hi-IN", timeout=6):
+    if not replay:
+        remember_noise_floor(detector)
+    print(f"[record] Utterance {info['utterance_s']}s (heard {info['heard_s']}s)")
+    if not info["speech"]:
+        return None
+    if filename:
+        save_wav(filename, audio, source.fs)
+    return as_asr_input(audio, source_sr=source.fs)
+_google_mic = {}   # speech_recognition Recognizer / Microphone, kept across calls
+
+@timed("transcribe_with_google")
+def transcribe_with_google(lang="hi-IN", timeout=6, request_timeout=8.0, phrase_limit=15):
+    """
+    Record from the mic and send it to Google's speech API. The Recognizer and
+    Microphone are created once; ambient-noise calibration runs on the first
+    call and again only after audio_capture.NOISE_TTL_S (the recognizer's
+    dynamic threshold tracks the room in between). request_timeout bounds the
+    HTTP request.
+    """
     try:
         import speech_recognition as sr
     except Exception:
         print("[asr] speech_recognition not installed.")
         return "", None
+    from audio_capture import NOISE_TTL_S
 
-    recognizer = sr.Recognizer()
-    mic = sr.Microphone()
+    if not _google_mic:
+        _google_mic.update(recognizer=sr.Recognizer(), mic=sr.Microphone(), calibrated=None)
+    recognizer, mic = _google_mic["recognizer"], _google_mic["mic"]
+    recognizer.operation_timeout = request_timeout
     print(f"[asr] Recording for Google ASR ({lang}) ...")
     with mic as source:
-        recognizer.adjust_for_ambient_noise(source)
+        calibrated = _google_mic["calibrated"]
+        if calibrated is None or time.monotonic() - calibrated > NOISE_TTL_S:
+            recognizer.adjust_for_ambient_noise(source, duration=0.5)
+            _google_mic["calibrated"] = time.monotonic()
         try:
-            audio = recognizer.listen(source, timeout=timeout)
+            audio = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_limit)
         except Exception as e:
             print("[asr] Google ASR recording failed:", e)
             return "", None
@@ -155,26 +232,126 @@ def transcribe_with_google(lang="hi-IN", timeout=6):
     except Exception as e:
         print("[asr] Google ASR error:", e)
         return "", None
-def transcribe_with_whisper(audio_path, model_size="small"):
+
+_cloud_asr = None
+_cloud_disabled = False
+
+def get_cloud_asr(url, provider="google", hedge_after=1.5, deadline=8.0, **asr_options):
+    """
+    Build the hedged cloud transcriber once per process (cloud_asr.HedgedASR):
+    the cloud request gets `hedge_after` seconds before local Whisper
+    (asr_options: model_size / backend / threads / beam_size) starts too.
+    Returns None when the cloud backend cannot be used (e.g. no API key).
+    """
+    global _cloud_asr, _cloud_disabled
+    if _cloud_asr is None and not _cloud_disabled:
+        with _cache_lock:
+            if _cloud_asr is None and not _cloud_disabled:
+                from cloud_asr import GOOGLE_URL, CloudASRClient, CloudASRError, HedgedASR
+                try:
+                    client = CloudASRClient(GOOGLE_URL if url == "google" else url, provider,
+                                            read_timeout=deadline, deadline=deadline)
+                except (CloudASRError, ValueError) as e:
+                    print(f"[asr] Cloud ASR disabled ({e}); using local Whisper only")
+                    _cloud_disabled = True
+                    return None
+                _cloud_asr = HedgedASR(client, lambda audio: transcribe_with_whisper(audio, **asr_options),
+                                       hedge_after=hedge_after)
+    return _cloud_asr
+
+@timed("transcribe_cloud")
+def transcribe_with_cloud(audio, lang="hi-IN", **cloud_options):
+    """audio (array, path or segment list) -> (text, lang) via get_cloud_asr(**cloud_options)."""
+    import numpy as np
+    from audio_io import as_asr_input
+    segments = [as_asr_input(a) for a in audio] if isinstance(audio, list) else [as_asr_input(audio)]
+    if not segments:
+        return "", None
+    hedged = get_cloud_asr(**cloud_options)
+    if hedged is None:
+        asr_options = {k: v for k, v in cloud_options.items()
+                       if k not in ("url", "provider", "hedge_after", "deadline")}
+        return transcribe_with_whisper(segments, **asr_options)
     try:
-        import whisper
-    except Exception:
-        abort("Whisper not installed. Install with: pip install openai-whisper")
+        text, out_lang, source = hedged.transcribe(np.concatenate(segments), lang)
+    except Exception as e:
+        print("[asr] Cloud and local ASR both failed:", e)
+        return "", None
+    print(f"[asr] Transcript from {source} ASR")
+    return text, out_lang
+@timed("preprocess")
+def preprocess_for_asr(audio, split=False):
+    """
+    Trim leading/trailing silence and peak-normalize before Whisper
+    (optionally split into utterances). Returns a list of float32 segments.
+    """
+    try:
+        from audio_io import as_asr_input
+        from audio_preprocess import preprocess
+        segments, report = preprocess(as_asr_input(audio), sr=16000, split=split)
+    except Exception as e:
+        print("[pre] Preprocessing skipped:", e)
+        return [audio]
+    print(f"[pre] {report['input_s']}s -> {report['output_s']}s "
+          f"(dropped {report['dropped_s']}s, {report['segments']} segment(s))")
+    return segments
+
+def get_asr_backend(model_size, backend="whisper", threads=None, beam_size=1):
+    """Load an ASR backend (see asr_backends.BACKENDS) once per process and reuse it."""
+    from asr_backends import get_backend
+    return get_backend(backend, model_size, threads, beam_size)
+
+@timed("transcribe_with_whisper")
+def transcribe_with_whisper(audio, model_size="small", backend="whisper", threads=None, beam_size=1,
+                            with_probs=False):
+    """
+    audio: path to an audio file, a float32 16 kHz array, or a list of
+    such arrays (utterance segments, transcribed in order and joined).
+    Files are decoded in-process (audio_io); whisper only shells out to
+    ffmpeg when given a path, so it always receives an array here.
+    backend / threads / beam_size select the engine (asr_backends).
+    Returns (text, lang), or (text, lang, lang_probs) with with_probs=True.
+    """
+    try:
+        from audio_io import as_asr_input
+    except Exception as e:
+        abort("Audio decoding unavailable: " + str(e))
 
-    print("[asr] Loading Whisper model:", model_size)
     try:
-        model = whisper.load_model(model_size)
+        segments = [as_asr_input(a) for a in audio] if isinstance(audio, list) else [as_asr_input(audio)]
+    except Exception as e:
+        abort("Could not decode audio: " + str(e))
+    if not segments:
+        return ("", None, None) if with_probs else ("", None)
+
+    try:
+        engine = get_asr_backend(model_size, backend, threads, beam_size)
+    except ImportError:
+        abort(f"ASR backend '{backend}' not installed. Install with: "
+              + ("pip install faster-whisper" if backend == "faster-whisper" else "pip install openai-whisper"))
     except Exception as e:
         abort("Failed to load Whisper model: " + str(e))
 
     print("[asr] Transcribing ...")
     try:
-        result = model.transcribe(audio_path, fp16=False)
-        text = result.get("text", "").strip()
-        lang = result.get("language", None)
-        return text, lang or None
+        result = _transcribe_segments(engine, segments)
     except Exception as e:
         abort("Whisper transcription failed: " + str(e))
+    return result if with_probs else result[:2]
+
+def _transcribe_segments(engine, segments):
+    """-> (text, lang, lang_probs); probabilities are averaged over segments by length."""
+    texts, lang, probs, weight = [], None, {}, 0
+    for seg in segments:
+        text, seg_lang, seg_probs = engine.transcribe_detailed(seg)
+        texts.append(text)
+        lang = lang or seg_lang
+        if seg_probs:
+            for code, p in seg_probs.items():
+                probs[code] = probs.get(code, 0.0) + p * len(seg)
+            weight += len(seg)
+    probs = {code: p / weight for code, p in probs.items()} if weight else None
+    return " ".join(t for t in texts if t), lang or None, probs
 INTENT_KEYWORDS = {
     "irrigation": ["irrigation", "पानी", "सिंचाई", "पाणी"],
     "fertilizer": ["fertilizer", "खत", "खाद", "खते"],
@@ -182,6 +359,7 @@ INTENT_KEYWORDS = {
     "rainfall": ["rainfall", "बारिश", "वर्षा", "पाऊस"],
     "pest": ["pest", "कीट", "कीडे", "माहू", "किडे"]
 }
+@timed("detect_intent")
 def detect_intent(text):
     if not text:
         return "unknown"
@@ -216,7 +394,7 @@ def detect_district(text):
         for a in aliases:
             if a.lower() in t:
                 return eng.capitalize()
-    return None
+    return _fuzzy_entity(text, "district")
 
 
 def detect_crop(text):
@@ -225,7 +403,20 @@ def detect_crop(text):
         for a in aliases:
             if a.lower() in t:
                 return eng
-    return None
+    return _fuzzy_entity(text, "crop")
+
+def _fuzzy_entity(text, kind):
+    """Near-miss fallback ("Kolapur", "सातरा", "soyabin") via the entity index."""
+    try:
+        m = get_entity_index().find(text, kind)
+    except Exception as e:
+        print("[fuzzy] index unavailable:", e)
+        return None
+    if m is None:
+        return None
+    if m.distance:
+        print(f"[fuzzy] {kind} {m.span!r} -> {m.canonical} ({m.distance} edit(s))")
+    return m.canonical
 
 def detect_season(text):
     t = text.lower()
@@ -235,13 +426,20 @@ def detect_season(text):
                 return eng
     return "Unknown"
 _known_lists_cache = None
+_entity_index = None
+_cache_lock = threading.Lock()   # one-time builds / swaps of the module caches below
 
 def _build_known_lists():
     global _known_lists_cache
-    if _known_lists_cache is not None:
+    cache = _known_lists_cache
+    if cache is not None:
+        return cache
+    with _cache_lock:
+        if _known_lists_cache is None:
+            _known_lists_cache = _scan_known_lists(load_dataset())
         return _known_lists_cache
 
-    rows = load_dataset()
+def _scan_known_lists(rows):
     districts, crops = [], []
     for r in rows:
         dn = r.get("District_Name") or r.get("district_name") or r.get("district")
@@ -252,8 +450,48 @@ def _build_known_lists():
             crops.append(cp.strip())
     districts.sort(key=lambda s: -len(s))
     crops.sort(key=lambda s: -len(s))
-    _known_lists_cache = {"districts": districts, "crops": crops}
-    return _known_lists_cache
+    return {"districts": districts, "crops": crops}
+
+@on_append
+def _extend_known_lists(new_rows):
+    """Merge newly ingested districts/crops; swap in a new dict (readers keep the old one)."""
+    global _known_lists_cache, _entity_index
+    with _cache_lock:
+        if _known_lists_cache is not None:
+            _known_lists_cache = _merge_known_lists(_known_lists_cache, new_rows)
+            _entity_index = None    # rebuilt on next use with the new names
+
+def _merge_known_lists(cache, new_rows):
+    districts = list(cache["districts"])
+    crops = list(cache["crops"])
+    for r in new_rows:
+        dn = (r.get("District_Name") or "").strip()
+        cp = (r.get("Crop") or "").strip()
+        if dn and dn.lower() not in (d.lower() for d in districts):
+            districts.append(dn)
+        if cp and cp.lower() not in (c.lower() for c in crops):
+            crops.append(cp)
+    districts.sort(key=lambda s: -len(s))
+    crops.sort(key=lambda s: -len(s))
+    return {"districts": districts, "crops": crops}
+
+def get_entity_index():
+    """Fuzzy index over the localization aliases plus every district/crop in the dataset."""
+    global _entity_index
+    idx = _entity_index
+    if idx is None:
+        known = _build_known_lists()
+        with _cache_lock:
+            if _entity_index is None:
+                entries = [("district", eng, aliases) for eng, aliases in DISTRICT_LOCALIZATION.items()]
+                entries += [("crop", eng, aliases) for eng, aliases in CROP_LOCALIZATION.items()]
+                entries += [("district", d, ()) for d in known["districts"]]
+                entries += [("crop", c, ()) for c in known["crops"]]
+                stop = [w for kws in list(INTENT_KEYWORDS.values()) + list(KEYWORDS.values()) for w in kws]
+                stop += list(MARATHI_MARKERS + HINDI_MARKERS + AMBIGUOUS_WORDS) + ENTITY_STOPWORDS
+                _entity_index = EntityIndex.build(entries, stopwords=stop)
+            idx = _entity_index
+    return idx
 
 def extract_district_and_crop_from_text(user_text):
     """
@@ -307,16 +545,9 @@ def extract_district_and_crop_from_text(user_text):
     return None, None
 
 
+@timed("generate_reply")
 def generate_reply(intent, lang_code=None, user_text=None):
-    lang = "en"
-    if lang_code:
-        l = str(lang_code).lower()
-        if l.startswith("mr") or "mr" in l:
-            lang = "mr"
-        elif l.startswith("hi") or "hi" in l:
-            lang = "hi"
-        elif l.startswith("en") or "en" in l:
-            lang = "en"
+    lang = normalize_lang(lang_code)
 
     district, crop = None, None
     if user_text:
@@ -325,9 +556,8 @@ def generate_reply(intent, lang_code=None, user_text=None):
     season = detect_season(user_text) if user_text else "General"
 
     try:
-        row = lookup_dataset(intent, district=district, crop=crop)
-        if row:
-            row_local = localize_row(row, lang)
+        row_local = lookup_dataset(intent, district=district, crop=crop, lang=lang)
+        if row_local:
             district_for_tpl = row_local.get("district", district) or "your district"
             crop_for_tpl = row_local.get("crop", crop) or "your crop"
             season_for_tpl = row_local.get("season", season)
@@ -338,13 +568,16 @@ def generate_reply(intent, lang_code=None, user_text=None):
             if not rainfall_for_tpl or rainfall_for_tpl in ("N/A", "Unknown", "0"):
                 rainfall_for_tpl = "not recorded"
 
+            # fill from the row found above (the localized names and the
+            # inferred season would not match the dataset in a new search)
             reply = generate_filled_template(
                 intent,
                 lang=lang,
                 district=district_for_tpl,
                 crop=crop_for_tpl,
                 season=season_for_tpl,
-                rainfall=rainfall_for_tpl
+                rainfall=rainfall_for_tpl,
+                row=row_local.dataset_row()
             )
             
             return reply
@@ -365,6 +598,7 @@ def generate_reply(intent, lang_code=None, user_text=None):
             return "माफ़ कीजिये — मैं समझ नहीं पाया।"
         else:
             return "Sorry — I didn't understand."
+@timed("speak_offline")
 def speak_offline(text):
     try:
         import pyttsx3
@@ -374,67 +608,242 @@ def speak_offline(text):
     except Exception as e:
         print("[tts] Failed:", e)
 
+_lang_identifier = None
+
+def get_language_identifier():
+    """Build the en/hi/mr identifier once (lexicon from TEMPLATES + keyword lists)."""
+    global _lang_identifier
+    if _lang_identifier is None:
+        with _cache_lock:
+            if _lang_identifier is None:
+                words = [w for kws in list(INTENT_KEYWORDS.values()) + list(KEYWORDS.values()) for w in kws]
+                _lang_identifier = LanguageIdentifier(TEMPLATES, words)
+    return _lang_identifier
+
+@timed("language_detect")
+def resolve_language(text, lang, lang_probs=None):
+    """
+    Script fast path + Marathi/Hindi lexicon; the ASR's language
+    probabilities (or its single guess) only break ties.
+    """
+    detected, source = get_language_identifier().identify(text, asr_lang=lang, asr_probs=lang_probs)
+    if detected != normalize_lang(lang, None):
+        print(f"[lang-fix] {lang} → {detected} ({source})")
+    return detected
+
+def answer_query(text, lang, lang_probs=None):
+    """Transcript -> (text, lang, intent, reply); everything between ASR and TTS."""
+    lang = resolve_language(text, lang, lang_probs)
+
+    print("\n--- TRANSCRIPTION ---")
+    print(text)
+    print("--- /TRANSCRIPTION ---\n")
+    print("[info] Detected language:", lang)
+
+    intent = detect_intent(text or "")
+    print("[info] Detected intent:", intent)
+    reply = generate_reply(intent, lang_code=lang, user_text=text)
+    print("[reply]", reply)
+    return text, lang, intent, reply
+
+# ---------- KIOSK PIPELINE ----------
+_kiosk_asr = {"model_size": "tiny"}
+_kiosk_cloud = {}
+_kiosk_pre = {"preprocess": True, "split": False}
+
+def _asr_worker_init(model_size, backend="whisper", threads=None, beam_size=1, cloud=None,
+                     preprocess=True, split=False):
+    """Runs once per ASR worker process: load the ASR backend before the first query."""
+    _kiosk_asr.update(model_size=model_size, backend=backend, threads=threads, beam_size=beam_size)
+    _kiosk_pre.update(preprocess=preprocess, split=split)
+    get_asr_backend(**_kiosk_asr)
+    if cloud:
+        _kiosk_cloud.update(cloud)
+        get_cloud_asr(**{k: v for k, v in cloud.items() if k != "lang"}, **_kiosk_asr)
+
+def _asr_worker(audio):
+    """
+    ASR stage (runs in a worker process): float32 audio -> ((text, lang,
+    lang_probs), spans). The spans timed here are returned for the parent
+    to merge into its registry (metrics.merge_spans).
+    """
+    with collect_spans() as spans, span("asr"):
+        if _kiosk_pre["preprocess"]:
+            segments = preprocess_for_asr(audio, split=_kiosk_pre["split"])
+        else:
+            segments = [audio]
+        if _kiosk_cloud:
+            result = (*transcribe_with_cloud(segments, **_kiosk_cloud, **_kiosk_asr), None)
+        else:
+            result = _transcribe_segments(get_asr_backend(**_kiosk_asr), segments)
+    return result, spans
+
+def _cloud_options(args):
+    """--cloud_asr flags -> kwargs for get_cloud_asr / transcribe_with_cloud (None if unset)."""
+    if not args.cloud_asr:
+        return None
+    return {"url": args.cloud_asr, "provider": args.cloud_provider, "lang": args.cloud_lang,
+            "hedge_after": args.hedge_after, "deadline": args.cloud_timeout}
+
+def run_kiosk(args):
+    """
+    Continuous kiosk loop as a pipeline: capture -> ASR (process) -> reply -> TTS.
+    Each stage has its own worker and a bounded input queue, so the mic keeps
+    listening for query N+1 while reply N is being spoken.
+    """
+    from pipeline import SKIP, Stage, format_stats, run_pipeline
+
+    remaining = [args.max_queries or -1]
+
+    def capture():
+        while remaining[0] != 0:
+            audio = record_audio_streaming(max_duration=max(args.duration, 15),
+                                           trailing_silence=args.silence, vad=args.vad)
+            if audio is not None:
+                remaining[0] -= 1
+                return audio
+        return None
+
+    def understand(asr_output):
+        (text, lang, lang_probs), spans = asr_output
+        merge_spans(spans, process="asr")
+        if not text.strip():
+            print("[kiosk] No speech recognised.")
+            return SKIP
+        return answer_query(text, lang, lang_probs)[3]
+
+    stages = [
+        Stage("asr", _asr_worker, kind="process", maxsize=args.queue_size,
+              initializer=_asr_worker_init,
+              initargs=(args.model, args.asr_backend, args.threads, args.beam_size, _cloud_options(args),
+                        not args.no_preprocess, args.split)),
+        Stage("reply", understand, maxsize=args.queue_size),
+        Stage("tts", speak_offline, maxsize=args.queue_size),
+    ]
+    def on_stats(st):
+        print("[pipeline]", format_stats(st))
+        if args.metrics_dir:
+            export(args.metrics_dir)
+
+    run_pipeline(capture, stages, on_stats=on_stats, stats_every=args.stats_every)
+
+def report_metrics(metrics_dir=None):
+    """Print per-stage latency percentiles; export them if a directory is set."""
+    summary = export(metrics_dir) if metrics_dir else REGISTRY.summary()
+    if summary:
+        print("\n[metrics]\n" + format_summary(summary))
+
 def main():
-    
-    
     parser = argparse.ArgumentParser()
     parser.add_argument("--record", action="store_true")
     parser.add_argument("--duration", type=float, default=6.0)
+    parser.add_argument("--stream", action="store_true",
+                        help="stop recording on trailing silence (VAD) instead of --duration")
+    parser.add_argument("--silence", type=float, default=0.8,
+                        help="trailing silence (s) that ends an utterance in --stream mode")
+    parser.add_argument("--vad", choices=["energy", "webrtc"], default="energy")
+    parser.add_argument("--replay", type=str,
+                        help="replay a WAV through the --stream capture path")
     parser.add_argument("--file", type=str)
     parser.add_argument("--model", type=str, default="tiny")
+    parser.add_argument("--asr_backend", choices=["whisper", "whisper-int8", "faster-whisper"],
+                        default="whisper",
+                        help="ASR engine: PyTorch fp32, PyTorch int8 (dynamic quantization) or CTranslate2 int8")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="intra-op CPU threads for the ASR engine (default: library default)")
+    parser.add_argument("--beam_size", type=int, default=1,
+                        help="1 = greedy decoding, >1 = beam search (slower, sometimes more accurate)")
     parser.add_argument("--use_google", action="store_true")
+    parser.add_argument("--cloud_asr", type=str,
+                        help="remote ASR endpoint URL ('google' = Google's speech API, key from "
+                             "$GOOGLE_SPEECH_API_KEY), hedged with local Whisper")
+    parser.add_argument("--cloud_provider", choices=["google", "http"], default="google",
+                        help="remote protocol: Google speech API, or POST WAV -> JSON {text, lang}")
+    parser.add_argument("--cloud_lang", type=str, default="hi-IN", help="language hint sent to the remote ASR")
+    parser.add_argument("--hedge_after", type=float, default=1.5,
+                        help="seconds to wait for the remote ASR before local Whisper starts too")
+    parser.add_argument("--cloud_timeout", type=float, default=8.0,
+                        help="overall deadline (s) for a remote ASR request, retries included")
+    parser.add_argument("--no_preprocess", action="store_true",
+                        help="skip silence trimming / normalization before Whisper")
+    parser.add_argument("--split", action="store_true",
+                        help="split long recordings into utterances before Whisper")
+    parser.add_argument("--kiosk", action="store_true",
+                        help="continuous pipelined loop (capture/ASR/reply/TTS overlap)")
+    parser.add_argument("--max_queries", type=int, default=0,
+                        help="stop the kiosk loop after N utterances (0 = forever)")
+    parser.add_argument("--queue_size", type=int, default=2,
+                        help="bounded queue depth per kiosk pipeline stage")
+    parser.add_argument("--stats_every", type=float, default=30.0,
+                        help="seconds between kiosk queue-depth reports")
+    parser.add_argument("--metrics_dir", type=str,
+                        help="write per-stage spans (spans.jsonl), metrics.prom and summary.json here")
+    parser.add_argument("--profile", action="store_true",
+                        help="cProfile + tracemalloc per stage (pstats, collapsed stacks, allocations)")
+    parser.add_argument("--profile_dir", type=str, default="profile")
+    parser.add_argument("--save_wav", action="store_true",
+                        help=f"also write recordings to {DEFAULT_WAV}")
     args = parser.parse_args()
 
+    if args.profile:
+        from profiling import profile
+        with profile(args.profile_dir):
+            return run(args)
+    return run(args)
+
+def run(args):
     check_for_stdlib_conflicts()
     if not check_ffmpeg():
-        abort("ffmpeg required.")
+        print("  -> Continuing: audio is decoded in-process; only formats soundfile can't read need ffmpeg.")
     ensure_python_packages()
-
-    if args.record:
-        audio_path = record_audio(filename=DEFAULT_WAV, duration=args.duration)
+    if args.metrics_dir:
+        os.makedirs(args.metrics_dir, exist_ok=True)
+        REGISTRY.set_jsonl(os.path.join(args.metrics_dir, "spans.jsonl"))
+
+    if args.kiosk:
+        run_kiosk(args)
+        report_metrics(args.metrics_dir)
+        print("[done]")
+        return
+
+    wav_out = DEFAULT_WAV if args.save_wav else None
+    if args.stream or args.replay:
+        audio = record_audio_streaming(filename=wav_out, max_duration=max(args.duration, 15),
+                                       trailing_silence=args.silence, vad=args.vad,
+                                       replay=args.replay)
+        if audio is None:
+            abort("No speech detected.")
+    elif args.record:
+        audio = record_audio(filename=wav_out, duration=args.duration)
     elif args.file:
         if not os.path.exists(args.file):
             abort(f"File not found: {args.file}")
-        audio_path = args.file
+        audio = args.file
     else:
-        audio_path = record_audio(filename=DEFAULT_WAV, duration=args.duration)
+        audio = record_audio(filename=wav_out, duration=args.duration)
 
-    text, lang = "", None
+    text, lang, lang_probs = "", None, None
     if args.use_google:
         text, lang = transcribe_with_google(lang="hi-IN")
     if not text:
-        text, lang = transcribe_with_whisper(audio_path, model_size=args.model)
+        if not args.no_preprocess:
+            audio = preprocess_for_asr(audio, split=args.split)
+        asr_options = dict(model_size=args.model, backend=args.asr_backend,
+                           threads=args.threads, beam_size=args.beam_size)
+        cloud = _cloud_options(args)
+        if cloud:
+            text, lang = transcribe_with_cloud(audio, **cloud, **asr_options)
+        else:
+            text, lang, lang_probs = transcribe_with_whisper(audio, with_probs=True, **asr_options)
     if not text.strip():
         print("📝 No speech. Type your query:")
         text = input("You: ")
-        if re.search("[a-zA-Z]", text):
-            lang = "en"
-        elif re.search("[\u0900-\u097F]", text):
-            lang = "hi"
-        else:
-            lang = "hi"
-
-    try:
-        from langdetect import detect
-        detected_lang = detect(text)
-        if detected_lang != lang:
-            print(f"[lang-fix] Overriding {lang} → {detected_lang}")
-            lang = detected_lang
-    except Exception:
-        pass
+        lang, lang_probs = None, None
 
-    print("\n--- TRANSCRIPTION ---")
-    print(text)
-    print("--- /TRANSCRIPTION ---\n")
-    print("[info] Detected language:", lang)
-
-    intent = detect_intent(text or "")
-    print("[info] Detected intent:", intent)
-    reply = generate_reply(intent, lang_code=lang, user_text=text)
-    print("[reply]", reply)
+    text, lang, intent, reply = answer_query(text, lang, lang_probs)
     speak_offline(reply)
-   
 
+    report_metrics(args.metrics_dir)
     print("[done]")
 
 if __name__ == "__main__":
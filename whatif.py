@@ -0,0 +1,202 @@
+# whatif.py
+# Vectorized what-if / sensitivity sweeps on the yield model.
+#
+# A base row (from dataset_connector.lookup_dataset) is encoded once; scenario
+# values for rainfall, temperature, N, P, K and pH are written straight into
+# the numeric columns of a reused chunk buffer, so scoring tens of thousands
+# of scenarios costs a few batched model calls and no per-row encoding.
+#
+#   res = sweep(base_row, {"rainfall": (-0.3, 0.1), "nitrogen": (0, 0.5)}, relative=True)
+#   res.surface            # yields on the grid, shape (steps, steps)
+#   res.marginal["Rainfall"]["slope"]   # quintals/acre per mm, other inputs averaged
+#
+#   python whatif.py Kolhapur Wheat --mode lhs --samples 50000
+
+import argparse
+import time
+
+import numpy as np
+
+import ml_connector
+from dataset_connector import lookup_dataset
+from features import FIELD_ALIASES
+
+SWEEP_FEATURES = ("Rainfall", "Temperature", "Nitrogen", "Phosphorus", "Potassium", "pH")
+_ALIASES = {a.lower(): col for col in SWEEP_FEATURES for a in FIELD_ALIASES[col]}
+_ALIASES.update({"n": "Nitrogen", "p": "Phosphorus", "k": "Potassium", "temp": "Temperature", "rain": "Rainfall"})
+
+
+def feature_name(key):
+    """'rainfall' / 'N' / 'phosphorous' ... -> encoder column name."""
+    col = _ALIASES.get(str(key).strip().lower())
+    if col is None:
+        raise KeyError(f"Not a sweepable feature: {key!r} (choose from {', '.join(SWEEP_FEATURES)})")
+    return col
+
+
+class SweepResult:
+    """
+    features: swept columns, in matrix order. values: (n, k) scenario matrix.
+    yields: (n,) predictions. base: {column: base value}; base_yield: float.
+    axes / surface: grid levels per feature and yields reshaped to the grid
+    (grid mode only). marginal: column -> {"levels", "mean_yield", "slope"}.
+    """
+
+    def __init__(self, features, values, yields, base, base_yield, axes=None):
+        self.features = features
+        self.values = values
+        self.yields = yields
+        self.base = base
+        self.base_yield = base_yield
+        self.axes = axes
+        self.surface = yields.reshape([len(a) for a in axes]) if axes is not None else None
+        self.marginal = marginal_effects(values, yields, features, axes)
+
+    @property
+    def n(self):
+        return len(self.yields)
+
+    def best(self):
+        """{column: value, ..., "yield": y} for the highest-yield scenario."""
+        i = int(self.yields.argmax())
+        out = {f: round(float(v), 2) for f, v in zip(self.features, self.values[i])}
+        out["yield"] = round(float(self.yields[i]), 2)
+        return out
+
+
+def marginal_effects(values, yields, features, axes=None, bins=10):
+    """
+    Per feature: mean yield at each level (grid) or in each of `bins` equal
+    bins (sampled designs), and the slope from a joint linear fit of yield on
+    all swept features (per-unit effect with the others held at their mean).
+    """
+    n, k = values.shape
+    centered = values - values.mean(axis=0)
+    coef = np.linalg.lstsq(np.column_stack([centered, np.ones(n)]), yields, rcond=None)[0][:k]
+    out = {}
+    for j, f in enumerate(features):
+        col = values[:, j]
+        if axes is not None:
+            levels = np.asarray(axes[j])
+            idx = np.searchsorted(levels, col)
+        else:
+            edges = np.linspace(col.min(), col.max(), bins + 1)
+            idx = np.clip(np.searchsorted(edges, col, side="right") - 1, 0, bins - 1)
+            levels = (edges[:-1] + edges[1:]) / 2
+        counts = np.bincount(idx, minlength=len(levels))
+        sums = np.bincount(idx, weights=yields, minlength=len(levels))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_yield = sums / counts
+        out[f] = {"levels": levels, "mean_yield": mean_yield, "slope": float(coef[j])}
+    return out
+
+
+def _axis(spec, base, steps, relative):
+    """(lo, hi) / (lo, hi, steps) tuple, or a list/array of explicit levels -> 1-D float array."""
+    if isinstance(spec, tuple):
+        lo, hi = float(spec[0]), float(spec[1])
+        n = int(spec[2]) if len(spec) == 3 else steps
+        levels = np.linspace(lo, hi, n)
+    else:
+        levels = np.asarray(spec, dtype=np.float64).ravel()
+    return base * (1.0 + levels) if relative else levels
+
+
+def grid_design(axes, start, stop):
+    """Rows start..stop of the Cartesian product of `axes` (C order), without building all of it."""
+    flat = np.arange(start, stop)
+    idx = np.unravel_index(flat, [len(a) for a in axes])
+    return np.column_stack([np.asarray(a)[i] for a, i in zip(axes, idx)])
+
+
+def lhs_design(bounds, samples, seed=0):
+    """Latin-hypercube sample: (samples, k), one point per stratum in every dimension."""
+    rng = np.random.default_rng(seed)
+    k = len(bounds)
+    u = (rng.permuted(np.tile(np.arange(samples), (k, 1)), axis=1).T + rng.random((samples, k))) / samples
+    lo = np.array([b[0] for b in bounds])
+    hi = np.array([b[1] for b in bounds])
+    return lo + u * (hi - lo)
+
+
+def sweep(base_row, ranges, mode="grid", steps=9, samples=10000, relative=False,
+          chunk=8192, seed=0):
+    """
+    base_row: dataset row / mapping (any key spelling the encoder accepts).
+    ranges: {feature: (lo, hi) | (lo, hi, steps) | [levels]}; with relative=True
+    the numbers are fractional changes from the base (-0.2 = 20% lower).
+    mode: "grid" (Cartesian product) or "lhs" (Latin hypercube, `samples` points).
+    Scenarios are scored `chunk` at a time in one reused buffer.
+    """
+    model, encoder = ml_connector.get_model_and_encoder()
+    x_base = encoder.transform([base_row])[0]
+    features = [feature_name(k) for k in ranges]
+    cols = [encoder.numeric.index(f) for f in features]
+    base = {f: float(x_base[c]) for f, c in zip(features, cols)}
+
+    if mode == "grid":
+        axes = [np.sort(_axis(spec, base[f], steps, relative)) for f, spec in zip(features, ranges.values())]
+        n = int(np.prod([len(a) for a in axes]))
+        design = lambda a, b: grid_design(axes, a, b)
+    elif mode == "lhs":
+        axes = None
+        bounds = [_axis(spec, base[f], 2, relative)[[0, -1]] for f, spec in zip(features, ranges.values())]
+        bounds = [(min(b), max(b)) for b in bounds]
+        points = lhs_design(bounds, samples, seed)
+        n = samples
+        design = lambda a, b: points[a:b]
+    else:
+        raise ValueError(f"Unknown sweep mode {mode!r} (grid or lhs)")
+
+    values = np.empty((n, len(features)), dtype=np.float64)
+    yields = np.empty(n, dtype=np.float64)
+    buf = np.empty((min(chunk, n), len(x_base)), dtype=np.float64)
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        block = design(start, stop)
+        X = buf[:stop - start]
+        X[:] = x_base
+        X[:, cols] = block
+        values[start:stop] = block
+        yields[start:stop] = model.predict(X)
+
+    base_yield = float(model.predict(x_base[None, :])[0])
+    return SweepResult(features, values, yields, base, base_yield, axes)
+
+
+def what_if(district, crop, changes, relative=True):
+    """
+    One scenario against the dataset baseline, e.g.
+    what_if("Kolhapur", "Wheat", {"rainfall": -0.2}) -> (base_yield, new_yield).
+    """
+    row = lookup_dataset("yield", district, crop, lang="en")
+    res = sweep(row, {k: [v] for k, v in changes.items()}, relative=relative)
+    return round(res.base_yield, 2), round(float(res.yields[0]), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="What-if yield sweep")
+    parser.add_argument("district")
+    parser.add_argument("crop")
+    parser.add_argument("--mode", choices=["grid", "lhs"], default="grid")
+    parser.add_argument("--steps", type=int, default=6, help="grid levels per feature")
+    parser.add_argument("--samples", type=int, default=20000, help="Latin-hypercube points")
+    parser.add_argument("--span", type=float, default=0.3, help="+/- fractional range around the base row")
+    args = parser.parse_args()
+
+    row = lookup_dataset("yield", args.district, args.crop, lang="en")
+    ranges = {f: (-args.span, args.span) for f in SWEEP_FEATURES}
+    ml_connector.load_model()
+    t0 = time.perf_counter()
+    res = sweep(row, ranges, mode=args.mode, steps=args.steps, samples=args.samples, relative=True)
+    dt = time.perf_counter() - t0
+    print(f"[whatif] {res.n} scenarios in {dt * 1000:.1f} ms; base yield {res.base_yield:.2f}")
+    for f, m in res.marginal.items():
+        lo, hi = np.nanmin(m["mean_yield"]), np.nanmax(m["mean_yield"])
+        print(f"  {f:<12} base {res.base[f]:>8.2f}  slope {m['slope']:+.4f}/unit  "
+              f"mean yield {lo:.2f}..{hi:.2f}")
+    print("[whatif] best scenario:", res.best())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# yield_index.py
+# Observed-yield distributions per (district, crop) from Final_Dataset_with_Yield.csv.
+#
+# Built once per process: every group's yields sorted in a Python list (for
+# bisect on single lookups) and, for batches, one NumPy array of all groups
+# sorted by (group, yield). A batch of predictions is ranked with a single
+# searchsorted on the composite key group * span + yield. Quartiles are
+# precomputed, so a lookup is two bisects.
+#
+#   idx = get_yield_index()
+#   idx.describe("Satara", "Wheat", 45.2)
+#   # -> {"percentile": 81.0, "median": 38.4, "q1": 33.1, "q3": 42.7, "iqr": 9.6, "n": 120}
+#   rank_phrase(81.0, "en")   # -> "top 20%"
+#
+#   python yield_index.py Satara Wheat 45.2
+
+import argparse
+import csv
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+YIELD_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Final_Dataset_with_Yield.csv")
+MIN_OBSERVATIONS = 10      # fewer recorded harvests than this: no rank is reported
+
+
+def _quantile(values, q):
+    """Linear-interpolated quantile of a sorted list (numpy's default method)."""
+    pos = (len(values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+class YieldDistribution:
+    """Sorted observed yields for one group, with precomputed quartiles."""
+
+    def __init__(self, values):
+        self.values = sorted(values)
+        self.n = len(self.values)
+        self.q1, self.median, self.q3 = (_quantile(self.values, q) for q in (0.25, 0.5, 0.75))
+
+    @property
+    def iqr(self):
+        return self.q3 - self.q1
+
+    def percentile_rank(self, y):
+        """% of observed yields below y (ties count half)."""
+        return 100.0 * (bisect_left(self.values, y) + bisect_right(self.values, y)) / (2 * self.n)
+
+
+class YieldIndex:
+    """
+    (district, crop) -> YieldDistribution, case-insensitive. describe() for
+    one yield, rank_batch() for arrays of (district, crop, yield).
+    """
+
+    def __init__(self, groups):
+        self.groups = {k: YieldDistribution(v) for k, v in groups.items() if v}
+        # batch structure: codes in insertion order, one sorted composite-key array
+        self._codes = {k: i for i, k in enumerate(self.groups)}
+        all_values = [y for d in self.groups.values() for y in d.values]
+        self._lo = min(all_values) if all_values else 0.0
+        self._span = (max(all_values) - self._lo + 1.0) if all_values else 1.0
+        self._keys = np.concatenate([i * self._span + (np.asarray(d.values) - self._lo)
+                                     for i, d in enumerate(self.groups.values())]) if all_values else np.empty(0)
+        sizes = np.array([d.n for d in self.groups.values()], dtype=np.int64)
+        self._offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]) if len(sizes) else sizes
+        self._sizes = sizes
+
+    @classmethod
+    def from_csv(cls, path=YIELD_DATA_PATH, district_col="District_Name", crop_col="Crop", yield_col="Yield"):
+        groups = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            reader.fieldnames = [c.strip() for c in reader.fieldnames]
+            for r in reader:
+                try:
+                    y = float(r[yield_col])
+                except (TypeError, ValueError):
+                    continue
+                if y != y:
+                    continue
+                key = (r[district_col].strip().lower(), r[crop_col].strip().lower())
+                groups.setdefault(key, []).append(y)
+        return cls(groups)
+
+    def get(self, district, crop):
+        if not district or not crop:
+            return None
+        return self.groups.get((str(district).strip().lower(), str(crop).strip().lower()))
+
+    def describe(self, district, crop, y=None, min_n=MIN_OBSERVATIONS):
+        """{"percentile" (if y given), "median", "q1", "q3", "iqr", "n"} or None if too few observations."""
+        dist = self.get(district, crop)
+        if dist is None or dist.n < min_n:
+            return None
+        out = {"median": round(dist.median, 2), "q1": round(dist.q1, 2), "q3": round(dist.q3, 2),
+               "iqr": round(dist.iqr, 2), "n": dist.n}
+        if y is not None:
+            out["percentile"] = round(dist.percentile_rank(float(y)), 1)
+        return out
+
+    def rank_batch(self, districts, crops, yields):
+        """
+        Percentile ranks for arrays of districts, crops and yields (NaN where
+        the group is unknown), via one searchsorted on the composite keys.
+        """
+        yields = np.asarray(yields, dtype=np.float64)
+        codes = np.array([self._codes.get((str(d).strip().lower(), str(c).strip().lower()), -1)
+                          for d, c in zip(districts, crops)], dtype=np.int64)
+        known = codes >= 0
+        out = np.full(len(yields), np.nan)
+        if not known.any():
+            return out
+        c = codes[known]
+        # clip into the group's own key segment; values outside it rank 0 / 100 either way
+        v = np.clip(yields[known] - self._lo, -0.5, self._span - 0.5)
+        keys = c * self._span + v
+        left = np.searchsorted(self._keys, keys, side="left") - self._offsets[c]
+        right = np.searchsorted(self._keys, keys, side="right") - self._offsets[c]
+        left = np.clip(left, 0, self._sizes[c])
+        right = np.clip(right, 0, self._sizes[c])
+        out[known] = 100.0 * (left + right) / (2 * self._sizes[c])
+        return out
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_yield_index(path=YIELD_DATA_PATH):
+    """Build the index once per process (concurrent first callers wait for one build)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = YieldIndex.from_csv(path)
+    return _index
+
+
+RANK_WORDS = {
+    "en": ("top {p}%", "bottom {p}%", "middle range"),
+    "hi": ("शीर्ष {p}%", "निचले {p}%", "मध्य श्रेणी"),
+    "mr": ("सर्वोच्च {p}%", "तळाच्या {p}%", "मधल्या श्रेणी"),
+}
+
+
+def rank_phrase(percentile, lang="en", step=5):
+    """81 -> "top 20%", 12 -> "bottom 15%", 40-60 -> "middle range" (rounded up to `step`)."""
+    top, bottom, middle = RANK_WORDS.get(lang, RANK_WORDS["en"])
+    if 40.0 <= percentile <= 60.0:
+        return middle
+    share = 100.0 - percentile if percentile > 50.0 else percentile
+    p = max(step, int(-(-share // step) * step))
+    return (top if percentile > 50.0 else bottom).format(p=p)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Observed-yield percentile lookup")
+    parser.add_argument("district")
+    parser.add_argument("crop")
+    parser.add_argument("yield_", metavar="yield", type=float)
+    parser.add_argument("--path", default=YIELD_DATA_PATH)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    idx = get_yield_index(args.path)
+    print(f"[yield-index] {len(idx.groups)} groups in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    info = idx.describe(args.district, args.crop, args.yield_)
+    if info is None:
+        print(f"[yield-index] fewer than {MIN_OBSERVATIONS} recorded yields for {args.crop} in {args.district}")
+        return
+    print(f"[yield-index] {args.yield_:g} q/acre for {args.crop} in {args.district}: "
+          f"{rank_phrase(info['percentile'])} (percentile {info['percentile']}), median {info['median']}, "
+          f"IQR {info['q1']}-{info['q3']} (n={info['n']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# zygote.py
+# Pre-forking "zygote" server: import and warm everything once, fork per request.
+#
+# The server process imports voice_assistant (and with it the dataset, the
+# template bank, the yield model, the language identifier) and loads the
+# Whisper backend, runs one warm reply, then freezes the heap (gc.freeze) so
+# children do not dirty the shared pages by collecting it. Each request is
+# served by a fork()ed copy-on-write child (or, with --workers N, by N
+# pre-forked children that accept in a loop), so a client pays only for its
+# own ASR + reply.
+#
+# The parent never runs torch inference: an OpenMP pool started before
+# fork() is not usable in the children. Models are loaded, not exercised.
+#
+#   python zygote.py --serve --model tiny               # leave running
+#   python zygote.py --text "Kolhapur wheat fertilizer"
+#   python zygote.py --file input.wav
+#
+# Protocol (Unix socket): 4-byte big-endian length + UTF-8 JSON, one request
+# and one response per connection.
+
+import argparse
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+
+SOCKET_PATH = os.environ.get("ZYGOTE_SOCKET", "/tmp/voice_assistant_zygote.sock")
+WARM_QUERIES = ("Kolhapur wheat yield", "Kolhapur wheat fertilizer")
+
+
+# ---------- protocol ----------
+
+def send_msg(sock, obj):
+    data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(data)) + data)
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed mid-message")
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_msg(sock):
+    (n,) = struct.unpack(">I", _recv_exact(sock, 4))
+    return json.loads(_recv_exact(sock, n).decode("utf-8"))
+
+
+# ---------- server ----------
+
+def warm(asr_options=None):
+    """Import and load everything a request needs; returns {step: seconds}."""
+    steps = {}
+
+    def step(name, fn):
+        t0 = time.perf_counter()
+        fn()
+        steps[name] = round(time.perf_counter() - t0, 3)
+
+    step("imports", lambda: __import__("voice_assistant"))
+    import ml_connector
+    import templates
+    import voice_assistant as va
+    from dataset_connector import load_dataset, warm_estimates
+    from yield_index import get_yield_index
+
+    step("model", ml_connector.load_model)
+    step("dataset", load_dataset)
+    step("estimates", warm_estimates)      # forked children inherit every row's prediction
+    step("templates", templates.load_dataset)
+    step("known_lists", va._build_known_lists)
+    step("lang_id", va.get_language_identifier)
+    step("entity_index", va.get_entity_index)
+    step("yield_index", get_yield_index)
+    step("warm_reply", lambda: [va.generate_reply(va.detect_intent(q), "en", q) for q in WARM_QUERIES])
+    if asr_options:
+        step("asr", lambda: va.get_asr_backend(**asr_options))
+    return steps
+
+
+def handle_request(req, asr_options=None):
+    """One request dict -> response dict (runs in a forked child)."""
+    import voice_assistant as va
+    t0 = time.perf_counter()
+    text, lang, lang_probs = req.get("text") or "", req.get("lang"), None
+    asr_ms = 0.0
+    if req.get("file"):
+        if not asr_options:
+            return {"error": "server started with --no_asr; send text instead"}
+        audio = va.preprocess_for_asr(req["file"], split=req.get("split", False))
+        text, lang, lang_probs = va.transcribe_with_whisper(audio, with_probs=True, **asr_options)
+        asr_ms = (time.perf_counter() - t0) * 1000
+    if not text.strip():
+        return {"error": "No speech recognised."}
+    text, lang, intent, reply = va.answer_query(text, lang, lang_probs)
+    return {"text": text, "lang": lang, "intent": intent, "reply": reply, "pid": os.getpid(),
+            "asr_ms": round(asr_ms, 1), "total_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+def _serve_connection(conn, asr_options):
+    try:
+        req = recv_msg(conn)
+        try:
+            resp = handle_request(req, asr_options)
+        except SystemExit:          # voice_assistant.abort()
+            resp = {"error": "request aborted (see server log)"}
+        except Exception as e:
+            resp = {"error": f"{type(e).__name__}: {e}"}
+        send_msg(conn, resp)
+    except (ConnectionError, OSError, ValueError) as e:
+        print("[zygote] connection error:", e)
+    finally:
+        conn.close()
+
+
+class ZygoteServer:
+    """
+    workers=0: fork one child per connection (at most max_children at once).
+    workers=N: pre-fork N children that accept() on the shared socket and are
+    replaced after max_requests requests (or if they die).
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH, asr_options=None, workers=0, max_children=8,
+                 max_requests=500):
+        self.socket_path = socket_path
+        self.asr_options = asr_options
+        self.workers = workers
+        self.max_children = max_children
+        self.max_requests = max_requests
+        self.children = set()
+        self._stop = False
+        self._sock = None
+
+    def start(self):
+        t0 = time.perf_counter()
+        steps = warm(self.asr_options)
+        import gc
+        gc.collect()
+        gc.freeze()     # warm objects move to the permanent generation: no COW from GC passes
+        from shared_store import _memory_mb
+        rss, _ = _memory_mb()
+        print(f"[zygote] warm in {time.perf_counter() - t0:.2f}s "
+              f"({', '.join(f'{k} {v}s' for k, v in steps.items())}); RSS {rss} MB")
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.socket_path)
+        self._sock.listen(64)
+        print(f"[zygote] listening on {self.socket_path} "
+              f"({f'{self.workers} pre-forked workers' if self.workers else 'fork per request'})")
+        return self
+
+    def _fork(self, target):
+        sys.stdout.flush()
+        # held until the pid is in self.children, so a stop signal reaches every child
+        stop_signals = {signal.SIGTERM, signal.SIGINT}
+        signal.pthread_sigmask(signal.SIG_BLOCK, stop_signals)
+        try:
+            pid = os.fork()
+        except OSError:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, stop_signals)
+            raise
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, stop_signals)
+            code = 0
+            try:
+                target()
+            except BaseException as e:
+                print("[zygote] child failed:", e)
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        self.children.add(pid)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, stop_signals)
+        return pid
+
+    def _reap(self, block=False):
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            except InterruptedError:
+                continue
+            if pid == 0:
+                return
+            self.children.discard(pid)
+            if block:
+                return
+
+    def _worker_loop(self):
+        self._sock.settimeout(None)
+        for _ in range(self.max_requests):
+            conn, _ = self._sock.accept()
+            _serve_connection(conn, self.asr_options)
+
+    def _per_request(self, conn):
+        def child():
+            self._sock.close()
+            _serve_connection(conn, self.asr_options)
+        self._fork(child)
+        conn.close()
+
+    def serve_forever(self):
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        try:
+            if self.workers:
+                while not self._stop:
+                    while len(self.children) < self.workers and not self._stop:
+                        self._fork(self._worker_loop)
+                    self._reap(block=True)      # a worker retired or died: replace it
+            else:
+                self._sock.settimeout(1.0)
+                while not self._stop:
+                    self._reap()
+                    while len(self.children) >= self.max_children:
+                        self._reap(block=True)
+                    try:
+                        conn, _ = self._sock.accept()
+                    except (socket.timeout, InterruptedError):
+                        continue
+                    self._per_request(conn)
+        finally:
+            self.close()
+
+    def _on_signal(self, signum, frame):
+        self._stop = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        while self.children:
+            self._reap(block=True)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        print("[zygote] stopped")
+
+
+# ---------- client ----------
+
+def ask(text=None, file=None, lang=None, socket_path=SOCKET_PATH, timeout=300.0, **options):
+    """Send one query (text or an audio file path) to a running zygote; returns the response dict."""
+    req = dict(options, lang=lang)
+    if file:
+        req["file"] = os.path.abspath(file)
+    else:
+        req["text"] = text
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(socket_path)
+        send_msg(s, req)
+        return recv_msg(s)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-forking zygote server / client for voice_assistant")
+    parser.add_argument("--serve", action="store_true", help="warm up and serve on --socket")
+    parser.add_argument("--socket", type=str, default=SOCKET_PATH)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="pre-fork N long-lived workers (default: fork per request)")
+    parser.add_argument("--max_children", type=int, default=8, help="concurrent per-request children")
+    parser.add_argument("--model", type=str, default="tiny")
+    parser.add_argument("--asr_backend", choices=["whisper", "whisper-int8", "faster-whisper"], default="whisper")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--beam_size", type=int, default=1)
+    parser.add_argument("--no_asr", action="store_true", help="text-only server (skip loading Whisper)")
+    parser.add_argument("--text", type=str, help="client: query text")
+    parser.add_argument("--file", type=str, help="client: WAV/audio file to transcribe and answer")
+    parser.add_argument("--lang", type=str, help="client: language hint (en/hi/mr)")
+    parser.add_argument("--split", action="store_true", help="client: split long recordings into utterances")
+    args = parser.parse_args()
+
+    if args.serve:
+        asr = None if args.no_asr else {"model_size": args.model, "backend": args.asr_backend,
+                                        "threads": args.threads, "beam_size": args.beam_size}
+        ZygoteServer(args.socket, asr, workers=args.workers, max_children=args.max_children).start().serve_forever()
+        return
+
+    if not (args.text or args.file):
+        parser.error("give --serve, or --text / --file to query a running server")
+    t0 = time.perf_counter()
+    try:
+        resp = ask(args.text, args.file, args.lang, args.socket, split=args.split)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"[zygote] no server on {args.socket} - start one with: python zygote.py --serve")
+        sys.exit(2)
+    wall = (time.perf_counter() - t0) * 1000
+    if resp.get("error"):
+        print("[zygote] error:", resp["error"])
+        sys.exit(1)
+    print("[reply]", resp["reply"])
+    print(f"[zygote] {resp['intent']}/{resp['lang']} in {wall:.0f} ms "
+          f"(server {resp['total_ms']} ms, asr {resp['asr_ms']} ms, pid {resp['pid']})")
+
+
+if __name__ == "__main__":
+    main()